@@ -0,0 +1,146 @@
+"""Concurrent throughput of the repository backends.
+
+Compares the old behaviour (blocking psycopg2 calls made directly on the event
+loop) with the threadpool-backed psycopg2 backend and the asyncpg backend.
+
+Against a real database (uses the same postgres-* environment variables as
+the service):
+
+    python -m benchmarks.bench_async_repository --requests 2000 --concurrency 50
+
+Without a database, --simulate-latency replaces the driver with a fake whose
+round trips take the given number of milliseconds:
+
+    python -m benchmarks.bench_async_repository --simulate-latency 5
+"""
+
+import argparse
+import asyncio
+import time
+
+from src.models.location_model import LocationData
+from src.repositories.async_location_repository import (
+    AsyncLocationRepository,
+    ThreadedLocationRepository,
+)
+from src.services.location_service import LocationService
+
+
+class BlockingOnLoopRepository:
+    """The pre-async code path: psycopg2 called straight from the event loop."""
+
+    def __init__(self, repository):
+        self.repository = repository
+
+    async def create_location(self, *args):
+        return self.repository.create_location(*args)
+
+    async def update_response_time(self, *args):
+        return self.repository.update_response_time(*args)
+
+    async def get_location(self, *args):
+        return self.repository.get_location(*args)
+
+
+class SimulatedBlockingRepository:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def create_location(self, *args):
+        time.sleep(self.latency)
+        return True
+
+    def update_response_time(self, *args):
+        time.sleep(self.latency)
+        return True
+
+    def get_location(self, request_id):
+        time.sleep(self.latency)
+        return None
+
+
+class SimulatedAsyncRepository:
+    def __init__(self, latency):
+        self.latency = latency
+
+    async def create_location(self, *args):
+        await asyncio.sleep(self.latency)
+        return True
+
+    async def update_response_time(self, *args):
+        await asyncio.sleep(self.latency)
+        return True
+
+    async def get_location(self, request_id):
+        await asyncio.sleep(self.latency)
+        return None
+
+
+async def _loop_lag_probe(stop: asyncio.Event, interval: float = 0.005):
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+
+async def run(service: LocationService, requests: int, concurrency: int) -> dict:
+    data = LocationData(city="Istanbul", latitude=41.0082, longitude=28.9784)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await service.submit_location(data)
+
+    stop = asyncio.Event()
+    probe = asyncio.create_task(_loop_lag_probe(stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    return {
+        "requests_per_sec": requests / elapsed,
+        "elapsed_sec": elapsed,
+        "max_loop_lag_ms": (await probe) * 1000,
+    }
+
+
+def build_backends(simulate_latency):
+    if simulate_latency is not None:
+        latency = simulate_latency / 1000
+        blocking = SimulatedBlockingRepository(latency)
+        return {
+            "blocking (before)": BlockingOnLoopRepository(blocking),
+            "psycopg2 threadpool": ThreadedLocationRepository(blocking),
+            "asyncpg": SimulatedAsyncRepository(latency),
+        }
+
+    from src.repositories.location_repository import LocationRepository
+
+    blocking = LocationRepository()
+    return {
+        "blocking (before)": BlockingOnLoopRepository(blocking),
+        "psycopg2 threadpool": ThreadedLocationRepository(blocking),
+        "asyncpg": AsyncLocationRepository(),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--simulate-latency", type=float, default=None,
+                        help="fake round-trip latency in ms instead of a real database")
+    args = parser.parse_args()
+
+    for name, repository in build_backends(args.simulate_latency).items():
+        service = LocationService(repository=repository)
+        result = await run(service, args.requests, args.concurrency)
+        print(f"{name:22s} {result['requests_per_sec']:10.1f} req/s  "
+              f"elapsed {result['elapsed_sec']:.2f}s  "
+              f"max loop lag {result['max_loop_lag_ms']:.1f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
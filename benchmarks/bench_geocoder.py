@@ -0,0 +1,71 @@
+"""Reverse geocoding latency, single lookups and bulk batches.
+
+Uses the bundled gazetteer, or --synthetic N random cities to approximate a
+full GeoNames extract (cities1000 has ~150k entries):
+
+    python -m benchmarks.bench_geocoder --synthetic 150000
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+import numpy as np
+
+from src.services.geocoder import ReverseGeocoder, load_gazetteer
+
+try:
+    # Keep the import out of the tree build timing
+    import scipy.spatial  # noqa: F401
+except ImportError:
+    pass
+
+
+def synthetic_gazetteer(size: int, rng):
+    names = [f"city-{i}" for i in range(size)]
+    coordinates = np.array([(rng.uniform(-60, 70), rng.uniform(-180, 180)) for _ in range(size)])
+    return names, ["XX"] * size, coordinates
+
+
+def measure(geocoder, points, batch: int):
+    latencies = []
+    for lat, lon in points[:2000]:
+        start = time.perf_counter()
+        geocoder.lookup(lat, lon)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    latitudes = [lat for lat, _ in points]
+    longitudes = [lon for _, lon in points]
+    start = time.perf_counter()
+    for offset in range(0, len(points), batch):
+        geocoder.lookup_many(latitudes[offset:offset + batch], longitudes[offset:offset + batch])
+    per_record = (time.perf_counter() - start) / len(points)
+    return (statistics.median(latencies), latencies[int(len(latencies) * 0.99)], per_record)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--synthetic", type=int, default=0, help="random gazetteer size, 0 = bundled")
+    parser.add_argument("--points", type=int, default=100000)
+    parser.add_argument("--batch", type=int, default=1000, help="records per bulk chunk")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    gazetteer = synthetic_gazetteer(args.synthetic, rng) if args.synthetic else load_gazetteer()
+    start = time.perf_counter()
+    geocoder = ReverseGeocoder(*gazetteer)
+    build = time.perf_counter() - start
+    points = [(rng.uniform(-60, 70), rng.uniform(-180, 180)) for _ in range(args.points)]
+
+    print(f"{len(geocoder)} cities, tree built in {build * 1000:.1f} ms")
+    print(f"{'':14} {'single p50':>12} {'single p99':>12} {'batched/rec':>12}")
+    for label, tree in (("kd-tree", geocoder._tree), ("numpy scan", None)):
+        geocoder._tree = tree
+        p50, p99, per_record = measure(geocoder, points, args.batch)
+        print(f"{label:14} {p50 * 1e6:9.1f} us {p99 * 1e6:9.1f} us {per_record * 1e6:9.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Geofence matching: grid index vs. testing every fence.
+
+Registers --fences random radius and box fences in a GeofenceIndex,
+then times matching stored locations against them:
+
+    python -m benchmarks.bench_geofence --fences 50000 --events 20000
+"""
+
+import argparse
+import random
+import time
+
+from src.services.geofence import GeofenceIndex, parse_fence
+
+# Fences and events share a box around Istanbul, so the index is dense
+LAT_RANGE = (40.5, 41.5)
+LON_RANGE = (28.0, 30.0)
+
+
+def random_spec(rng, max_radius):
+    lat, lon = rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)
+    if rng.random() < 0.5:
+        return {"type": "circle", "lat": lat, "lon": lon, "radius": rng.uniform(50, max_radius)}
+    size = rng.uniform(0.0005, max_radius / 111000)
+    return {"type": "box", "min_lat": lat, "min_lon": lon, "max_lat": lat + size, "max_lon": lon + size}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fences", type=int, default=50000)
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--max-radius", type=float, default=2000, help="largest fence radius in metres")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    fences = [parse_fence(random_spec(rng, args.max_radius)) for _ in range(args.fences)]
+    index = GeofenceIndex()
+    start = time.perf_counter()
+    for fence in fences:
+        index.add(fence)
+    build = time.perf_counter() - start
+    points = [(rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)) for _ in range(args.events)]
+
+    scanned = points[:max(1, args.events // 100)]
+    start = time.perf_counter()
+    scan_hits = 0
+    for lat, lon in scanned:
+        scan_hits += sum(1 for fence in fences if fence.contains(lat, lon))
+    scan = (time.perf_counter() - start) / len(scanned)
+
+    start = time.perf_counter()
+    index_hits = 0
+    for lat, lon in points:
+        index_hits += len(index.match(lat, lon))
+    indexed = (time.perf_counter() - start) / len(points)
+
+    assert sum(len(index.match(lat, lon)) for lat, lon in scanned) == scan_hits
+    print(f"{args.fences} fences indexed in {build * 1000:.0f} ms, "
+          f"{index_hits / len(points):.1f} matching fences per event")
+    print(f"every fence   {scan * 1e6:10.1f} us/event")
+    print(f"grid index    {indexed * 1e6:10.1f} us/event")
+
+
+if __name__ == "__main__":
+    main()
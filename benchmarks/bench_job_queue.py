@@ -0,0 +1,102 @@
+"""Job queue throughput against a real database.
+
+Inserts --jobs received rows, then drains them with --processes worker
+processes running --workers claim loops each, and checks that no job was
+processed twice. Uses the same postgres-* environment variables as the
+service:
+
+    python -m benchmarks.bench_job_queue --jobs 100000 --processes 4 --workers 2 --batch 100
+"""
+
+import argparse
+import asyncio
+import io
+import multiprocessing
+import time
+import uuid
+
+
+def load_jobs(count: int):
+    import psycopg2
+    from src.database.connection import get_db_config
+    from src.database.migrations import run_migrations
+
+    run_migrations()
+    conn = psycopg2.connect(**get_db_config())
+    try:
+        buffer = io.StringIO()
+        for _ in range(count):
+            buffer.write(f"{uuid.uuid4()}\tjob-bench\treceived\t41.0\t29.0\n")
+        buffer.seek(0)
+        with conn.cursor() as cursor:
+            cursor.copy_expert("COPY requests (id, location, status, latitude, longitude) FROM STDIN", buffer)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def drain(backend: str, workers: int, batch: int, results):
+    from src.repositories.async_location_repository import create_location_repository
+    from src.services.job_worker import JobWorker
+
+    processed = []
+
+    async def processor(jobs):
+        processed.extend(job.request_id for job in jobs)
+        return [None] * len(jobs)
+
+    async def loop(worker):
+        # Stop after a few empty claims in a row
+        idle = 0
+        while idle < 3:
+            if await worker.run_once():
+                idle = 0
+            else:
+                idle += 1
+                await asyncio.sleep(0.05)
+
+    async def main():
+        repository = create_location_repository(backend=backend)
+        worker = JobWorker(repository, processor=processor, batch_size=batch)
+        start = time.time()
+        await asyncio.gather(*(loop(worker) for _ in range(workers)))
+        # Leave out the idle polls at the end
+        return start, time.time() - 3 * 0.05
+
+    start, end = asyncio.run(main())
+    results.put((processed, start, end))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=100000)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=2, help="claim loops per process")
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--backend", choices=("psycopg2", "asyncpg"), default="asyncpg")
+    args = parser.parse_args()
+
+    load_jobs(args.jobs)
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [context.Process(target=drain, args=(args.backend, args.workers, args.batch, results))
+                 for _ in range(args.processes)]
+    for process in processes:
+        process.start()
+    reports = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    # Measured inside the workers, so interpreter start-up is not included
+    processed = [ids for ids, _, _ in reports]
+    elapsed = max(end for _, _, end in reports) - min(start for _, start, _ in reports)
+
+    total = sum(len(ids) for ids in processed)
+    unique = len(set().union(*map(set, processed)))
+    print(f"{args.processes} processes x {args.workers} loops, batch {args.batch}, {args.backend}")
+    print(f"processed {total} jobs in {elapsed:.2f} s: {total / elapsed:,.0f} jobs/s")
+    print(f"per process: {[len(ids) for ids in processed]}")
+    print(f"processed more than once: {total - unique}")
+
+
+if __name__ == "__main__":
+    main()
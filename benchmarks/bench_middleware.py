@@ -0,0 +1,107 @@
+"""Per-request overhead of RequestLoggingMiddleware vs a BaseHTTPMiddleware.
+
+Calls a one-route ASGI app directly, without a server or socket, with no
+middleware, with the previous @app.middleware("http") implementation and
+with the pure ASGI RequestLoggingMiddleware, and reports what each adds per
+request:
+
+    python -m benchmarks.bench_middleware --requests 5000
+"""
+
+import argparse
+import asyncio
+import logging
+from time import perf_counter, time
+
+from fastapi import FastAPI, Request
+
+from src.observability.middleware import RequestLoggingMiddleware, REQUEST_COUNT, REQUEST_LATENCY
+
+SCOPE = {
+    "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+    "method": "GET", "scheme": "http", "path": "/ok", "raw_path": b"/ok",
+    "root_path": "", "query_string": b"", "headers": [(b"host", b"test")],
+    "client": ("127.0.0.1", 1234), "server": ("test", 80),
+}
+
+
+def build_app(middleware=None):
+    app = FastAPI()
+
+    @app.get("/ok")
+    async def ok():
+        return {"ok": True}
+
+    if middleware is not None:
+        app.add_middleware(middleware)
+    return app
+
+
+def base_http_log_requests(app):
+    """The previous @app.middleware("http") implementation, for comparison."""
+    logger = logging.getLogger("bench")
+
+    @app.middleware("http")
+    async def log_requests(request: Request, call_next):
+        start_time = time()
+        method = request.method
+        endpoint = request.url.path
+        logger.info("Incoming request", extra={
+            "method": method, "endpoint": endpoint, "client_ip": request.client.host
+        })
+        response = await call_next(request)
+        duration = time() - start_time
+        REQUEST_COUNT.labels(method=method, endpoint=endpoint, status=response.status_code).inc()
+        REQUEST_LATENCY.labels(method=method, endpoint=endpoint).observe(duration)
+        logger.info("Request completed", extra={
+            "method": method, "endpoint": endpoint,
+            "status_code": response.status_code, "duration": duration
+        })
+        return response
+
+    return app
+
+
+async def time_requests(app, requests: int) -> float:
+    never = asyncio.Event()
+
+    def make_receive():
+        sent = False
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            # Like a real server, block until the client goes away
+            await never.wait()
+
+        return receive
+
+    async def send(message):
+        pass
+
+    await app(dict(SCOPE), make_receive(), send)  # warm up
+    start = perf_counter()
+    for _ in range(requests):
+        await app(dict(SCOPE), make_receive(), send)
+    return (perf_counter() - start) / requests
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    baseline = await time_requests(build_app(), args.requests)
+    base_http = await time_requests(base_http_log_requests(build_app()), args.requests)
+    pure_asgi = await time_requests(build_app(RequestLoggingMiddleware), args.requests)
+
+    print(f"{args.requests} requests, per-request time")
+    print(f"no middleware       {baseline * 1e6:8.1f}us")
+    print(f"BaseHTTPMiddleware  {base_http * 1e6:8.1f}us  (+{(base_http - baseline) * 1e6:.1f}us)")
+    print(f"pure ASGI           {pure_asgi * 1e6:8.1f}us  (+{(pure_asgi - baseline) * 1e6:.1f}us)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,160 @@
+"""Nearby query latency: geohash range scans vs. a full haversine scan.
+
+Against a real database (uses the same postgres-* environment variables as
+the service). Loads --rows random points into the requests table once; rows
+created by a previous run are reused:
+
+    python -m benchmarks.bench_nearby --rows 1000000 --queries 200 --radius 2000
+
+Without a database, --in-memory runs the same pruning over a sorted list of
+geohashes (standing in for the btree index) against a linear scan:
+
+    python -m benchmarks.bench_nearby --in-memory --rows 1000000
+"""
+
+import argparse
+import asyncio
+import bisect
+import io
+import random
+import time
+import uuid
+
+from src.services.geo import (
+    covering_prefixes,
+    format_location,
+    geohash_encode,
+    haversine_m,
+    prefix_ranges,
+)
+
+# Points are spread over a box around Istanbul so queries find neighbours
+LAT_RANGE = (40.5, 41.5)
+LON_RANGE = (28.0, 30.0)
+BENCH_STATUS = "bench"
+
+
+def random_point(rng):
+    return rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)
+
+
+def run_in_memory(rows: int, queries: int, radius: float, seed: int):
+    rng = random.Random(seed)
+    points = [random_point(rng) for _ in range(rows)]
+    indexed = sorted((geohash_encode(lat, lon), lat, lon) for lat, lon in points)
+    keys = [entry[0] for entry in indexed]
+    centres = [random_point(rng) for _ in range(queries)]
+
+    start = time.perf_counter()
+    scan_hits = 0
+    for lat, lon in centres:
+        scan_hits += sum(1 for p_lat, p_lon in points if haversine_m(lat, lon, p_lat, p_lon) <= radius)
+    scan = (time.perf_counter() - start) / queries
+
+    start = time.perf_counter()
+    index_hits = 0
+    candidates = 0
+    for lat, lon in centres:
+        for lo, hi in prefix_ranges(covering_prefixes(lat, lon, radius)):
+            for _, p_lat, p_lon in indexed[bisect.bisect_left(keys, lo):bisect.bisect_left(keys, hi)]:
+                candidates += 1
+                if haversine_m(lat, lon, p_lat, p_lon) <= radius:
+                    index_hits += 1
+    pruned = (time.perf_counter() - start) / queries
+
+    assert scan_hits == index_hits, "pruned search must find exactly the same points"
+    print(f"rows {rows}, radius {radius:.0f}m, {index_hits / queries:.1f} hits/query, "
+          f"{candidates / queries:.1f} candidates/query")
+    print(f"full scan       {scan * 1000:10.2f} ms/query")
+    print(f"geohash ranges  {pruned * 1000:10.2f} ms/query")
+
+
+def load_rows(conn, rows: int, seed: int):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT count(*) FROM requests WHERE status = %s", (BENCH_STATUS,))
+        existing = cursor.fetchone()[0]
+        missing = rows - existing
+        if missing <= 0:
+            return
+        print(f"loading {missing} rows...")
+        rng = random.Random(seed + existing)
+        batch = 100000
+        for offset in range(0, missing, batch):
+            buffer = io.StringIO()
+            for _ in range(min(batch, missing - offset)):
+                lat, lon = random_point(rng)
+                buffer.write(f"{uuid.uuid4()}\t{format_location('Bench', lat, lon)}\t{BENCH_STATUS}\t"
+                             f"Bench\t{lat}\t{lon}\t{geohash_encode(lat, lon)}\n")
+            buffer.seek(0)
+            cursor.copy_expert(
+                "COPY requests (id, location, status, city, latitude, longitude, geohash) FROM STDIN",
+                buffer
+            )
+            conn.commit()
+        cursor.execute("ANALYZE requests")
+        conn.commit()
+
+
+async def run_database(rows: int, queries: int, radius: float, seed: int):
+    from src.database.connection import DatabaseConnection
+    from src.database.migrations import run_migrations
+    from src.repositories.location_repository import HAVERSINE_SQL
+    from src.services.location_service import LocationService
+
+    run_migrations()
+    db = DatabaseConnection.get_instance()
+    conn = db.get_connection()
+    try:
+        load_rows(conn, rows, seed)
+    finally:
+        db.return_connection(conn)
+
+    service = LocationService(status_cache=None)
+    rng = random.Random(seed + 1)
+    centres = [random_point(rng) for _ in range(queries)]
+
+    start = time.perf_counter()
+    hits = 0
+    for lat, lon in centres:
+        hits += len(await service.find_nearby(lat, lon, radius, limit=100000))
+    indexed = (time.perf_counter() - start) / queries
+
+    distance = HAVERSINE_SQL.format(lat="%(lat)s", lon="%(lon)s")
+    conn = db.get_connection()
+    try:
+        with conn.cursor() as cursor:
+            start = time.perf_counter()
+            for lat, lon in centres[:max(1, queries // 10)]:
+                cursor.execute(
+                    f"SELECT count(*) FROM requests WHERE {distance} <= %(radius)s",
+                    {"lat": lat, "lon": lon, "radius": radius}
+                )
+                cursor.fetchone()
+            scan = (time.perf_counter() - start) / max(1, queries // 10)
+            conn.rollback()
+    finally:
+        db.return_connection(conn)
+
+    print(f"rows >= {rows}, radius {radius:.0f}m, {hits / queries:.1f} hits/query")
+    print(f"full scan       {scan * 1000:10.2f} ms/query")
+    print(f"geohash ranges  {indexed * 1000:10.2f} ms/query")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--radius", type=float, default=2000, help="search radius in metres")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--in-memory", action="store_true",
+                        help="emulate the index in memory instead of using a database")
+    args = parser.parse_args()
+
+    if args.in_memory:
+        run_in_memory(args.rows, args.queries, args.radius, args.seed)
+    else:
+        asyncio.run(run_database(args.rows, args.queries, args.radius, args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Cold start: import time and time to the first successful request.
+
+Imports src.main in fresh interpreters, then starts uvicorn --runs times and
+polls /service/ready and a database-backed request (GET /service/requests)
+until both succeed. Uses the same postgres-* environment variables as the
+service; run `python -m src.database.migrations` first:
+
+    python -m benchmarks.bench_startup --runs 5
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import src.main; print(time.perf_counter() - t)"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def get(url: str, api_key: str):
+    request = urllib.request.Request(url, headers={"X-API-Key": api_key})
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as error:
+        return error.code
+    except OSError:
+        return None
+
+
+def measure_import() -> float:
+    output = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], check=True,
+                            capture_output=True, text=True).stdout
+    return float(output.split()[-1])
+
+
+def measure_startup(api_key: str, timeout: float):
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.main:app", "--port", str(port), "--log-level", "warning"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    ready = served = None
+    try:
+        while ready is None or served is None:
+            if time.perf_counter() - start > timeout:
+                raise RuntimeError(f"server not ready after {timeout:.0f}s")
+            if ready is None and get(f"{base}/service/ready", api_key) == 200:
+                ready = time.perf_counter() - start
+            if served is None and get(f"{base}/service/requests?limit=1", api_key) == 200:
+                served = time.perf_counter() - start
+            time.sleep(0.005)
+        warm_start = time.perf_counter()
+        get(f"{base}/service/requests?limit=1", api_key)
+        warm = time.perf_counter() - warm_start
+    finally:
+        server.terminate()
+        server.wait()
+    return ready, served, warm
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60, help="seconds to wait for one server")
+    args = parser.parse_args()
+    api_key = os.getenv("API_KEY", "secure-api-key")
+
+    imports = [measure_import() for _ in range(args.runs)]
+    print(f"import src.main: median {statistics.median(imports) * 1000:.0f} ms, "
+          f"min {min(imports) * 1000:.0f} ms")
+
+    runs = [measure_startup(api_key, args.timeout) for _ in range(args.runs)]
+    ready, served, warm = (sorted(values) for values in zip(*runs))
+    print(f"ready:                    median {statistics.median(ready) * 1000:.0f} ms "
+          f"(max {ready[-1] * 1000:.0f} ms) after spawn")
+    print(f"first successful request: median {statistics.median(served) * 1000:.0f} ms "
+          f"(max {served[-1] * 1000:.0f} ms) after spawn")
+    print(f"next request:             median {statistics.median(warm) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
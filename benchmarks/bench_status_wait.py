@@ -0,0 +1,109 @@
+"""Request status reads: client polling vs. long-polling and SSE on change notifications.
+
+--clients watch one request each while a simulated worker moves every
+request through received -> processing -> completed. Counts the database
+reads each strategy needs and how long clients take to see the final status:
+
+    python -m benchmarks.bench_status_wait --clients 1000 --poll-ms 250
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime
+
+from src.services.location_service import LocationService, FINAL_STATUSES, status_etag
+from src.services.status_cache import StatusCache
+from src.services.status_notifier import StatusNotifier
+
+
+class FakeRepository:
+    def __init__(self, latency):
+        self.latency = latency
+        self.rows = {}
+        self.reads = 0
+        self.notifier = None
+
+    async def get_location(self, request_id):
+        self.reads += 1
+        await asyncio.sleep(self.latency)
+        return self.rows[request_id]
+
+    async def set_status(self, request_id, status):
+        row = self.rows[request_id]
+        self.rows[request_id] = row[:2] + (status, row[3], datetime.now(), row[5])
+        if self.notifier is not None:
+            await self.notifier.publish(request_id)
+
+
+async def run(args, strategy):
+    rng = random.Random(args.seed)
+    repo = FakeRepository(args.latency_ms / 1000)
+    notifier = StatusNotifier()
+    repo.notifier = notifier if strategy != "polling" else None
+    # ttl=0: the bench measures database reads, not cache hits
+    service = LocationService(repository=repo, status_cache=StatusCache(ttl=0), status_notifier=notifier)
+    ids = [str(i) for i in range(args.clients)]
+    now = datetime.now()
+    for request_id in ids:
+        repo.rows[request_id] = (request_id, "Istanbul", "received", now, now, 0.0)
+    seen = {}
+
+    async def worker(request_id):
+        await asyncio.sleep(rng.uniform(0, args.duration))
+        await repo.set_status(request_id, "processing")
+        await asyncio.sleep(rng.uniform(0, args.duration))
+        await repo.set_status(request_id, "completed")
+        return time.perf_counter()
+
+    async def poller(request_id):
+        while True:
+            response = await service.get_request_status(request_id)
+            if response.status in FINAL_STATUSES:
+                seen[request_id] = time.perf_counter()
+                return
+            await asyncio.sleep(args.poll_ms / 1000)
+
+    async def waiter(request_id):
+        etag = None
+        while True:
+            response = await service.wait_for_status(request_id, timeout=30, etag=etag)
+            if response.status in FINAL_STATUSES:
+                seen[request_id] = time.perf_counter()
+                return
+            etag = status_etag(response)
+
+    async def subscriber(request_id):
+        async for response in service.status_updates(request_id, heartbeat=30):
+            if response is not None and response.status in FINAL_STATUSES:
+                seen[request_id] = time.perf_counter()
+
+    client = {"polling": poller, "long-poll": waiter, "sse": subscriber}[strategy]
+    clients = [asyncio.create_task(client(request_id)) for request_id in ids]
+    finished = await asyncio.gather(*(worker(request_id) for request_id in ids))
+    await asyncio.gather(*clients)
+    delays = sorted(seen[request_id] - done for request_id, done in zip(ids, finished))
+    return repo.reads, delays
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--poll-ms", type=float, default=250, help="client polling interval")
+    parser.add_argument("--duration", type=float, default=2, help="seconds each status lasts at most")
+    parser.add_argument("--latency-ms", type=float, default=1, help="simulated database read latency")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    changes = 2 * args.clients
+    for name in ("polling", "long-poll", "sse"):
+        reads, delays = asyncio.run(run(args, name))
+        p50 = delays[len(delays) // 2] * 1000
+        p99 = delays[int(len(delays) * 0.99)] * 1000
+        print(f"{name:>9}: {reads} reads ({reads / changes:.2f} per change), "
+              f"final status seen after p50 {p50:.1f} ms / p99 {p99:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Broadcast fan-out to many simulated WebSocket clients.
+
+Compares the old sequential broadcast (await every send in turn) with the
+queue-per-client ConnectionManager. A fraction of the clients is slow, which
+is what used to hold every other client back:
+
+    python -m benchmarks.bench_websocket_broadcast --clients 10000 --slow 100
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from src.services.connection_manager import ConnectionManager
+
+
+class SimulatedWebSocket:
+    def __init__(self, delay, done, expected):
+        self.delay = delay
+        self.done = done
+        self.expected = expected
+        self.received = 0
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        else:
+            # A real send yields to the loop at least once
+            await asyncio.sleep(0)
+        self.received += 1
+        if self.received == self.expected:
+            self.done()
+
+    async def close(self, code=1000):
+        pass
+
+
+class SequentialManager:
+    """The pre-change behaviour: one awaited send after another."""
+
+    def __init__(self):
+        self.active_connections = []
+
+    async def connect(self, websocket):
+        await websocket.accept()
+        self.active_connections.append(websocket)
+
+    async def broadcast(self, message):
+        for connection in self.active_connections:
+            await connection.send_text(message)
+
+    async def close(self):
+        pass
+
+
+async def run(manager, clients: int, slow: int, slow_delay: float, messages: int) -> dict:
+    loop = asyncio.get_running_loop()
+    fast_done = loop.create_future()
+    # Spread the slow clients evenly through the connection list
+    stride = max(1, clients // slow) if slow else 1
+    slow_ids = set(range(0, clients, stride)[:slow]) if slow else set()
+    remaining = clients - len(slow_ids)
+
+    def client_done():
+        nonlocal remaining
+        remaining -= 1
+        if remaining == 0 and not fast_done.done():
+            fast_done.set_result(None)
+
+    for i in range(clients):
+        if i in slow_ids:
+            websocket = SimulatedWebSocket(slow_delay, lambda: None, messages)
+        else:
+            websocket = SimulatedWebSocket(0, client_done, messages)
+        await manager.connect(websocket)
+
+    payload = json.dumps({"type": "location", "city": "Istanbul", "latitude": 41.0082, "longitude": 28.9784})
+    start = time.perf_counter()
+    broadcast_time = 0.0
+    for _ in range(messages):
+        call_start = time.perf_counter()
+        await manager.broadcast(payload)
+        broadcast_time = max(broadcast_time, time.perf_counter() - call_start)
+    await fast_done
+    elapsed = time.perf_counter() - start
+    await manager.close()
+    return {
+        "max_broadcast_call_ms": broadcast_time * 1000,
+        "fast_clients_done_ms": elapsed * 1000,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=10000)
+    parser.add_argument("--slow", type=int, default=100, help="number of slow clients")
+    parser.add_argument("--slow-delay", type=float, default=20, help="send latency of slow clients in ms")
+    parser.add_argument("--messages", type=int, default=5)
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.INFO)
+
+    managers = {
+        "sequential (before)": SequentialManager(),
+        "per-client queues": ConnectionManager(queue_size=max(16, args.messages)),
+    }
+    for name, manager in managers.items():
+        result = await run(manager, args.clients, args.slow, args.slow_delay / 1000, args.messages)
+        print(f"{name:20s} broadcast call {result['max_broadcast_call_ms']:9.1f}ms  "
+              f"all fast clients served {result['fast_clients_done_ms']:9.1f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,137 @@
+"""Text vs MessagePack framing on /service/stream, over a real loopback socket.
+
+Serves the app's WebSocket endpoint with uvicorn (no lifespan, so no
+database), connects clients in each protocol mode with a geofence covering
+the whole map, publishes a burst of location events and counts the frames
+and the bytes read from the socket until every client got every event:
+
+    python -m benchmarks.bench_websocket_protocol --clients 10 --events 20000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+
+# Room for the whole burst: the benchmark measures framing, not eviction
+os.environ.setdefault("WS_SEND_QUEUE_SIZE", "1000000")
+
+import msgpack
+import uvicorn
+import websockets
+
+from src.main import app, manager
+from src.server import SelectiveDeflateWebSocketProtocol
+from src.services.ws_protocol import MSGPACK_SUBPROTOCOL
+
+WORLD = {"type": "box", "min_lat": -90, "min_lon": -180, "max_lat": 90, "max_lon": 180}
+
+
+class CountingClient(websockets.WebSocketClientProtocol):
+    bytes_received = 0
+
+    def data_received(self, data):
+        self.bytes_received += len(data)
+        super().data_received(data)
+
+
+async def consume(url: str, binary: bool, deflate: bool, events: int, subscribed: asyncio.Event) -> tuple:
+    async with websockets.connect(
+        url,
+        subprotocols=[MSGPACK_SUBPROTOCOL] if binary else None,
+        compression="deflate" if deflate else None,
+        create_protocol=CountingClient,
+        max_size=None,
+        max_queue=None,
+    ) as websocket:
+        command = {"action": "subscribe", "fence": WORLD}
+        await websocket.send(msgpack.packb(command) if binary else json.dumps(command))
+        await websocket.recv()
+        start_bytes = websocket.bytes_received
+        subscribed.set()
+
+        frames = received = 0
+        unpacker = msgpack.Unpacker()
+        while received < events:
+            frame = await websocket.recv()
+            frames += 1
+            if binary:
+                unpacker.feed(frame)
+                received += sum(1 for _ in unpacker)
+            else:
+                received += 1
+        return frames, websocket.bytes_received - start_bytes
+
+
+async def run(port: int, mode: str, delay_ms: float, deflate: bool, clients: int, events: int, burst: int) -> dict:
+    binary = mode == "msgpack"
+    url = f"ws://127.0.0.1:{port}/service/stream"
+    if binary:
+        url += f"?max_delay_ms={delay_ms:g}"
+    ready = [asyncio.Event() for _ in range(clients)]
+    consumers = [asyncio.create_task(consume(url, binary, deflate, events, event)) for event in ready]
+    await asyncio.gather(*(event.wait() for event in ready))
+
+    start = time.perf_counter()
+    for i in range(0, events, burst):
+        for _ in range(min(burst, events - i)):
+            await manager.publish_location({
+                "request_id": str(uuid.uuid4()), "city": "Istanbul",
+                "latitude": 41.0082 + i * 1e-6, "longitude": 28.9784 - i * 1e-6
+            })
+        # A high-rate producer still yields between bursts
+        await asyncio.sleep(0)
+    results = await asyncio.gather(*consumers)
+    elapsed = time.perf_counter() - start
+
+    frames = sum(frame_count for frame_count, _ in results)
+    wire = sum(byte_count for _, byte_count in results)
+    return {
+        "elapsed_ms": elapsed * 1000,
+        "frames_per_second": frames / elapsed,
+        "messages_per_second": clients * events / elapsed,
+        "messages_per_frame": clients * events / frames,
+        "wire_bytes_per_message": wire / (clients * events),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--burst", type=int, default=100, help="events published between yields")
+    parser.add_argument("--delay-ms", type=float, default=5, help="max_delay_ms of the msgpack clients")
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.WARNING)
+
+    config = uvicorn.Config(app, host="127.0.0.1", port=0, lifespan="off", log_level="error",
+                            ws=SelectiveDeflateWebSocketProtocol)
+    server = uvicorn.Server(config)
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+
+    modes = [("text", 0), ("msgpack", 0), ("msgpack", args.delay_ms)]
+    print(f"{args.clients} clients x {args.events} location events")
+    for deflate in (False, True):
+        for mode, delay_ms in modes:
+            result = await run(port, mode, delay_ms, deflate, args.clients, args.events, args.burst)
+            name = mode if mode == "text" else f"{mode} {delay_ms:g}ms"
+            print(f"{name:14s} deflate={'on ' if deflate else 'off'}  "
+                  f"{result['frames_per_second']:9.0f} frames/s  "
+                  f"{result['messages_per_second']:9.0f} msgs/s  "
+                  f"{result['messages_per_frame']:6.1f} msgs/frame  "
+                  f"{result['wire_bytes_per_message']:6.1f} wire bytes/msg  "
+                  f"{result['elapsed_ms']:8.0f}ms")
+
+    server.should_exit = True
+    await serving
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1 +1 @@
-# This file makes "src" a package so other modules can import it.
+# This file makes "src" a package so other modules can import it.
@@ -1,71 +1,117 @@
-from fastapi import APIRouter, HTTPException, Depends, Security
-from fastapi.security.api_key import APIKeyHeader
-import logging
-import os
-from prometheus_client import Counter, Histogram, Gauge
-from datetime import datetime
-
-logger = logging.getLogger(__name__)
-router = APIRouter()
-
-# API Key Security
-API_KEY = os.getenv("API_KEY", "secure-api-key")
-api_key_header = APIKeyHeader(name="X-API-Key")
-
-def verify_api_key(api_key: str = Security(api_key_header)):
-    if api_key != API_KEY:
-        raise HTTPException(status_code=403, detail="Forbidden: Invalid API Key")
-
-# Prometheus metrics for DevOps monitoring
-DEPLOYMENT_COUNT = Counter(
-    'deployments_total',
-    'Total number of deployments',
-    ['environment', 'status']
-)
-
-DEPLOYMENT_DURATION = Histogram(
-    'deployment_duration_seconds',
-    'Deployment duration in seconds',
-    ['environment']
-)
-
-SYSTEM_HEALTH = Gauge(
-    'system_health',
-    'System health status (1=healthy, 0=unhealthy)',
-    ['component']
-)
-
-class DevOpsController:
-    def __init__(self):
-        self.deployments = {}
-        self.system_status = {
-            "database": 1,
-            "cache": 1,
-            "api": 1
-        }
-
-    async def get_track_status(self, track_id: str):
-        try:
-            # In a real implementation, this would fetch from a database
-            # For now, we'll return mock data
-            return {
-                "track_id": track_id,
-                "status": "active",
-                "last_deployment": datetime.now().isoformat(),
-                "metrics": {
-                    "uptime": "99.9%",
-                    "response_time": "150ms",
-                    "error_rate": "0.1%"
-                }
-            }
-        except Exception as e:
-            logger.error(f"Error in get_track_status: {str(e)}")
-            raise HTTPException(status_code=404, detail=str(e))
-
-# Create controller instance
-controller = DevOpsController()
-
-# Define routes
-@router.get("/track-{track_id}", dependencies=[Depends(verify_api_key)])
-async def get_track_status(track_id: str):
-    return await controller.get_track_status(track_id) 
\ No newline at end of file
+from fastapi import APIRouter, HTTPException, Depends, Security, Query
+from fastapi.responses import PlainTextResponse
+from fastapi.security.api_key import APIKeyHeader
+import logging
+import os
+from prometheus_client import Counter, Histogram
+from datetime import datetime
+from typing import Optional
+from ..observability.telemetry import collector as telemetry
+from ..observability.sketches import tracker as latency_tracker
+from ..observability.profiler import profiler, ProfilerBusy, PROFILE_MAX_SECONDS
+from ..database.pool import PoolTimeout
+from ..services.health import prober, GAUGE_VALUES
+from ..models.telemetry_model import TelemetryReport
+from ..models.track_model import TrackStatus
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+# API Key Security
+API_KEY = os.getenv("API_KEY", "secure-api-key")
+api_key_header = APIKeyHeader(name="X-API-Key")
+
+def verify_api_key(api_key: str = Security(api_key_header)):
+    if api_key != API_KEY:
+        raise HTTPException(status_code=403, detail="Forbidden: Invalid API Key")
+
+# Prometheus metrics for DevOps monitoring
+DEPLOYMENT_COUNT = Counter(
+    'deployments_total',
+    'Total number of deployments',
+    ['environment', 'status']
+)
+
+DEPLOYMENT_DURATION = Histogram(
+    'deployment_duration_seconds',
+    'Deployment duration in seconds',
+    ['environment']
+)
+
+class DevOpsController:
+    def __init__(self):
+        self.deployments = {}
+
+    @property
+    def system_status(self) -> dict:
+        # Same values as the system_health gauge, as last seen by the health prober
+        return {name: GAUGE_VALUES[check["status"]] for name, check in prober.status["components"].items()}
+
+    async def get_health(self):
+        return prober.status
+
+    async def get_track_status(self, track_id: str):
+        try:
+            return await latency_tracker.track_status(track_id)
+        except LookupError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except PoolTimeout as e:
+            logger.warning(f"Database pool saturated in get_track_status: {str(e)}")
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+        except Exception as e:
+            logger.error(f"Error in get_track_status: {str(e)}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+    async def get_telemetry(self, since: Optional[datetime], until: Optional[datetime],
+                            route: Optional[str], method: Optional[str]):
+        if since is not None and until is not None and since >= until:
+            raise HTTPException(status_code=400, detail="since must be before until")
+        try:
+            return await telemetry.percentiles(since, until, route, method)
+        except PoolTimeout as e:
+            logger.warning(f"Database pool saturated in get_telemetry: {str(e)}")
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+        except Exception as e:
+            logger.error(f"Error in get_telemetry: {str(e)}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+    async def profile(self, seconds: float, interval_ms: Optional[float]):
+        try:
+            stacks = await profiler.run(seconds, interval_ms / 1000 if interval_ms else None)
+        except ProfilerBusy as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        except Exception as e:
+            logger.error(f"Error in profile: {str(e)}")
+            raise HTTPException(status_code=500, detail=str(e))
+        logger.info(f"Profiled for {seconds:g}s, {len(stacks.splitlines())} distinct stacks")
+        return stacks
+
+# Create controller instance
+controller = DevOpsController()
+
+# Define routes
+@router.get("/track-{track_id}", dependencies=[Depends(verify_api_key)], response_model=TrackStatus)
+async def get_track_status(track_id: str):
+    return await controller.get_track_status(track_id)
+
+@router.get("/health", dependencies=[Depends(verify_api_key)])
+async def get_health():
+    # Cached by the background prober, never touches the database
+    return await controller.get_health()
+
+@router.get("/telemetry", dependencies=[Depends(verify_api_key)], response_model=TelemetryReport)
+async def get_telemetry(
+    since: Optional[datetime] = Query(None, description="Start of the window, by default an hour before until"),
+    until: Optional[datetime] = Query(None, description="End of the window, by default now"),
+    route: Optional[str] = Query(None, description="Route template, e.g. /service/request-{request_id}"),
+    method: Optional[str] = Query(None, description="HTTP method")
+):
+    return await controller.get_telemetry(since, until, route, method)
+
+@router.post("/profile", dependencies=[Depends(verify_api_key)], response_class=PlainTextResponse)
+async def profile(
+    seconds: float = Query(10, gt=0, le=PROFILE_MAX_SECONDS, description="How long to sample"),
+    interval_ms: Optional[float] = Query(None, ge=1, le=1000, description="Time between samples")
+):
+    # Profiles the worker process that serves this request
+    return await controller.profile(seconds, interval_ms)
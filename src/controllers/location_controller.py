@@ -1,56 +1,229 @@
-from fastapi import APIRouter, HTTPException, Depends, Security
-from fastapi.security.api_key import APIKeyHeader
-import logging
-from ..services.location_service import LocationService
-from ..models.location_model import LocationData, LocationResponse
-import os
-import json
-
-logger = logging.getLogger(__name__)
-router = APIRouter()
-
-# API Key Security
-API_KEY = os.getenv("API_KEY", "secure-api-key")
-api_key_header = APIKeyHeader(name="X-API-Key")
-
-def verify_api_key(api_key: str = Security(api_key_header)):
-    if api_key != API_KEY:
-        raise HTTPException(status_code=403, detail="Forbidden: Invalid API Key")
-
-class LocationController:
-    def __init__(self):
-        self.service = LocationService()
-
-    async def submit_location(self, data: LocationData):
-        try:
-            # Log the incoming data
-            logger.info(f"Received location data: {data.dict()}")
-            return self.service.submit_location(data)
-        except Exception as e:
-            logger.error(f"Error in submit_location: {str(e)}")
-            raise HTTPException(status_code=500, detail=str(e))
-
-    async def get_request_status(self, request_id: str):
-        try:
-            return self.service.get_request_status(request_id)
-        except Exception as e:
-            logger.error(f"Error in get_request_status: {str(e)}")
-            raise HTTPException(status_code=404, detail=str(e))
-
-# Create controller instance
-controller = LocationController()
-
-# Define routes
-@router.post("/submit", dependencies=[Depends(verify_api_key)])
-async def submit_location(data: LocationData):
-    try:
-        # Log the raw request data
-        logger.info(f"Raw request data: {data.dict()}")
-        return await controller.submit_location(data)
-    except Exception as e:
-        logger.error(f"Validation error: {str(e)}")
-        raise
-
-@router.get("/request-{request_id}", dependencies=[Depends(verify_api_key)])
-async def get_request_status(request_id: str):
-    return await controller.get_request_status(request_id) 
\ No newline at end of file
+from fastapi import APIRouter, HTTPException, Depends, Security, Request, Query, Header, Response
+from fastapi.responses import StreamingResponse
+from fastapi.security.api_key import APIKeyHeader
+from typing import List, Literal, Optional
+from datetime import datetime
+import logging
+from ..services.location_service import LocationService, status_etag, LIST_MAX_LIMIT
+from ..services.status_notifier import STATUS_MAX_WAIT_SECONDS, SSE_HEARTBEAT_SECONDS
+from ..services.idempotency import IDEMPOTENCY_KEY_MAX_LENGTH
+from ..database.pool import PoolTimeout
+from ..services.geo import NEARBY_MAX_RADIUS_M, NEARBY_MAX_LIMIT
+from ..models.location_model import LocationData, LocationResponse, NearbyLocation, LocationPage
+import os
+import json
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+# API Key Security
+API_KEY = os.getenv("API_KEY", "secure-api-key")
+api_key_header = APIKeyHeader(name="X-API-Key")
+
+def verify_api_key(api_key: str = Security(api_key_header)):
+    if api_key != API_KEY:
+        raise HTTPException(status_code=403, detail="Forbidden: Invalid API Key")
+
+class RequestStreamingResponse(StreamingResponse):
+    """StreamingResponse that keeps reading the request body while it streams.
+
+    The stock implementation listens for ``http.disconnect`` on ``receive``
+    in parallel, which would swallow the request body chunks our generator
+    is still consuming.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+class LocationController:
+    def __init__(self):
+        self.service = LocationService()
+
+    async def submit_location(self, data: LocationData, ack: Optional[str] = None,
+                              idempotency_key: Optional[str] = None):
+        try:
+            # Payloads are only logged at DEBUG, formatted lazily
+            logger.debug("Received location data: %s", data)
+            return await self.service.submit_location(data, ack=ack, idempotency_key=idempotency_key)
+        except PoolTimeout as e:
+            logger.warning(f"Database pool saturated in submit_location: {str(e)}")
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+        except Exception as e:
+            logger.error(f"Error in submit_location: {str(e)}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+    async def submit_location_batch(self, request: Request):
+        async def results():
+            async for results in self.service.submit_location_stream(request.stream()):
+                yield "".join(json.dumps(item) + "\n" for item in results)
+
+        return RequestStreamingResponse(results(), media_type="application/x-ndjson")
+
+    async def get_request_status(self, request_id: str, response: Response,
+                                 wait: Optional[float] = None, if_none_match: Optional[str] = None):
+        try:
+            if wait:
+                result = await self.service.wait_for_status(request_id, wait, etag=if_none_match)
+            else:
+                result = await self.service.get_request_status(request_id)
+        except PoolTimeout as e:
+            logger.warning(f"Database pool saturated in get_request_status: {str(e)}")
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+        except Exception as e:
+            logger.error(f"Error in get_request_status: {str(e)}")
+            raise HTTPException(status_code=404, detail=str(e))
+        etag = status_etag(result)
+        if if_none_match == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+        return result
+
+    async def stream_request_status(self, request_id: str):
+        updates = self.service.status_updates(request_id, SSE_HEARTBEAT_SECONDS)
+        try:
+            first = await updates.__anext__()
+        except PoolTimeout as e:
+            await updates.aclose()
+            logger.warning(f"Database pool saturated in stream_request_status: {str(e)}")
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+        except Exception as e:
+            await updates.aclose()
+            logger.error(f"Error in stream_request_status: {str(e)}")
+            raise HTTPException(status_code=404, detail=str(e))
+
+        def event(result: LocationResponse) -> str:
+            return f"event: status\nid: {status_etag(result)}\ndata: {result.model_dump_json()}\n\n"
+
+        async def events():
+            try:
+                yield event(first)
+                async for result in updates:
+                    yield ": keepalive\n\n" if result is None else event(result)
+            except Exception as e:
+                logger.error(f"Error in stream_request_status: {str(e)}")
+            finally:
+                await updates.aclose()
+
+        return StreamingResponse(events(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    async def find_nearby(self, lat: float, lon: float, radius: float, limit: int):
+        try:
+            return await self.service.find_nearby(lat, lon, radius, limit)
+        except PoolTimeout as e:
+            logger.warning(f"Database pool saturated in find_nearby: {str(e)}")
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+        except Exception as e:
+            logger.error(f"Error in find_nearby: {str(e)}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+    async def list_requests(self, status: Optional[str], since: Optional[datetime], until: Optional[datetime],
+                            limit: int, cursor: Optional[str], order: str):
+        try:
+            return await self.service.list_requests(status, since, until, limit, cursor,
+                                                    descending=order == "desc")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except PoolTimeout as e:
+            logger.warning(f"Database pool saturated in list_requests: {str(e)}")
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+        except Exception as e:
+            logger.error(f"Error in list_requests: {str(e)}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+    async def export_requests(self, export_format: str, status: Optional[str], since: Optional[datetime],
+                              until: Optional[datetime]):
+        chunks = self.service.export_requests(export_format, status, since, until)
+        # The first chunk is read before answering so that a failing query
+        # is still reported with an error status
+        try:
+            first = await chunks.__anext__()
+        except StopAsyncIteration:
+            first = ""
+        except PoolTimeout as e:
+            await chunks.aclose()
+            logger.warning(f"Database pool saturated in export_requests: {str(e)}")
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+        except Exception as e:
+            await chunks.aclose()
+            logger.error(f"Error in export_requests: {str(e)}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+        async def body():
+            try:
+                yield first
+                async for chunk in chunks:
+                    yield chunk
+            finally:
+                await chunks.aclose()
+
+        media_type = "text/csv" if export_format == "csv" else "application/x-ndjson"
+        filename = f"requests.{'csv' if export_format == 'csv' else 'ndjson'}"
+        return StreamingResponse(body(), media_type=media_type,
+                                 headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+# Create controller instance
+controller = LocationController()
+
+# Define routes
+@router.post("/submit", dependencies=[Depends(verify_api_key)])
+async def submit_location(
+    data: LocationData,
+    ack: Optional[Literal["flush", "enqueue"]] = None,
+    idempotency_key: Optional[str] = Header(None, min_length=1, max_length=IDEMPOTENCY_KEY_MAX_LENGTH)
+):
+    try:
+        logger.debug("Raw request data: %s", data)
+        return await controller.submit_location(data, ack=ack, idempotency_key=idempotency_key)
+    except Exception as e:
+        logger.error(f"Validation error: {str(e)}")
+        raise
+
+@router.post("/submit/batch", dependencies=[Depends(verify_api_key)])
+async def submit_location_batch(request: Request):
+    return await controller.submit_location_batch(request)
+
+@router.get("/request-{request_id}", dependencies=[Depends(verify_api_key)])
+async def get_request_status(
+    request_id: str,
+    response: Response,
+    wait: Optional[float] = Query(None, ge=0, le=STATUS_MAX_WAIT_SECONDS,
+                                  description="Seconds to wait for the status to change"),
+    if_none_match: Optional[str] = Header(None)
+):
+    return await controller.get_request_status(request_id, response, wait=wait, if_none_match=if_none_match)
+
+@router.get("/request-{request_id}/events", dependencies=[Depends(verify_api_key)])
+async def stream_request_status(request_id: str):
+    return await controller.stream_request_status(request_id)
+
+@router.get("/nearby", dependencies=[Depends(verify_api_key)], response_model=List[NearbyLocation])
+async def find_nearby(
+    lat: float = Query(..., ge=-90, le=90, description="Latitude of the search centre"),
+    lon: float = Query(..., ge=-180, le=180, description="Longitude of the search centre"),
+    radius: float = Query(..., gt=0, le=NEARBY_MAX_RADIUS_M, description="Search radius in metres"),
+    limit: int = Query(100, ge=1, le=NEARBY_MAX_LIMIT)
+):
+    return await controller.find_nearby(lat, lon, radius, limit)
+
+@router.get("/requests", dependencies=[Depends(verify_api_key)], response_model=LocationPage)
+async def list_requests(
+    status: Optional[str] = Query(None, description="Only requests with this status"),
+    since: Optional[datetime] = Query(None, description="Created at or after this time"),
+    until: Optional[datetime] = Query(None, description="Created before this time"),
+    limit: int = Query(100, ge=1, le=LIST_MAX_LIMIT),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    order: Literal["asc", "desc"] = "asc"
+):
+    return await controller.list_requests(status, since, until, limit, cursor, order)
+
+@router.get("/requests/export", dependencies=[Depends(verify_api_key)])
+async def export_requests(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    status: Optional[str] = Query(None, description="Only requests with this status"),
+    since: Optional[datetime] = Query(None, description="Created at or after this time"),
+    until: Optional[datetime] = Query(None, description="Created before this time")
+):
+    return await controller.export_requests(format, status, since, until)
@@ -0,0 +1,83 @@
+import asyncio
+import logging
+import os
+from .connection import get_db_config
+from .migrations import run_migrations, DB_MIGRATE_ON_STARTUP, DB_MIGRATION_TARGET
+from ..observability.telemetry import add_db_time, TELEMETRY_SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+async def _time_queries(conn):
+    # asyncpg calls query loggers in the querying task's context
+    conn.add_query_logger(lambda record: add_db_time(record.elapsed))
+
+class AsyncDatabaseConnection:
+    """asyncpg pool shared by the async repository backend."""
+
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self._pool = None
+        self._lock = asyncio.Lock()
+        self.min_size = int(os.getenv("ASYNC_DB_POOL_MIN", os.getenv("DB_POOL_MIN", "1")))
+        self.max_size = int(os.getenv("ASYNC_DB_POOL_MAX", os.getenv("DB_POOL_MAX", "10")))
+
+    async def get_pool(self):
+        if self._pool is None:
+            async with self._lock:
+                if self._pool is None:
+                    self._pool = await self._create_pool()
+        return self._pool
+
+    async def _create_pool(self):
+        import asyncpg
+
+        config = get_db_config()
+        try:
+            pool = await asyncpg.create_pool(
+                database=config["dbname"],
+                user=config["user"],
+                password=config["password"],
+                host=config["host"],
+                port=int(config["port"]),
+                min_size=self.min_size,
+                max_size=self.max_size,
+                init=_time_queries if TELEMETRY_SAMPLE_RATE > 0 else None
+            )
+            logger.info("Async connection pool created successfully")
+        except Exception as error:
+            logger.error(f"Error while connecting to PostgreSQL: {error}")
+            raise
+
+        if DB_MIGRATE_ON_STARTUP:
+            # Migrations are written against psycopg2, run them off the loop
+            try:
+                await asyncio.to_thread(run_migrations, DB_MIGRATION_TARGET)
+            except Exception as error:
+                logger.error(f"Error applying migrations: {error}")
+        return pool
+
+    @property
+    def is_open(self) -> bool:
+        return self._pool is not None
+
+    def pool_stats(self) -> dict:
+        # Same keys as the psycopg2 pool; asyncpg does not tell how many
+        # tasks are waiting for a connection
+        if self._pool is None:
+            return {"size": 0, "max_size": self.max_size, "in_use": 0, "idle": 0, "waiters": None}
+        size = self._pool.get_size()
+        idle = self._pool.get_idle_size()
+        return {"size": size, "max_size": self._pool.get_max_size(), "in_use": size - idle, "idle": idle,
+                "waiters": None}
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
@@ -1,85 +1,139 @@
-import psycopg2
-from psycopg2 import pool
-import logging
-import os
-
-logger = logging.getLogger(__name__)
-
-class DatabaseConnection:
-    _instance = None
-    _pool = None
-
-    @classmethod
-    def get_instance(cls):
-        if cls._instance is None:
-            cls._instance = cls()
-        return cls._instance
-
-    def __init__(self):
-        if self._pool is None:
-            try:
-                # Get database configuration from environment variables
-                dbname = os.getenv("postgres-db")
-                user = os.getenv("postgres-user")
-                password = os.getenv("postgres-password")
-                host = os.getenv("postgres-service")
-                port = os.getenv("postgres-port")
-
-                # Log the values (without password for security)
-                logger.info(f"Database configuration: host={host}, port={port}, dbname={dbname}, user={user}")
-
-                # Verify all required values are present
-                if not all([dbname, user, password, host, port]):
-                    missing = [k for k, v in {
-                        "postgres-db": dbname,
-                        "postgres-user": user,
-                        "postgres-password": password,
-                        "postgres-service": host,
-                        "postgres-port": port
-                    }.items() if not v]
-                    raise ValueError(f"Missing required environment variables: {', '.join(missing)}")
-                
-                self._pool = psycopg2.pool.SimpleConnectionPool(
-                    minconn=1,
-                    maxconn=10,
-                    dbname=dbname,
-                    user=user,
-                    password=password,
-                    host=host,
-                    port=port
-                )
-                if self._pool:
-                    logger.info("Connection pool created successfully")
-                    self._create_table()
-            except (Exception, psycopg2.DatabaseError) as error:
-                logger.error(f"Error while connecting to PostgreSQL: {error}")
-                raise
-
-    def _create_table(self):
-        conn = self._pool.getconn()
-        if conn:
-            try:
-                cursor = conn.cursor()
-                cursor.execute("""
-                CREATE TABLE IF NOT EXISTS requests (
-                    id UUID PRIMARY KEY,
-                    location TEXT,
-                    status TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    response_time FLOAT
-                )
-                """)
-                conn.commit()
-                cursor.close()
-            except (Exception, psycopg2.DatabaseError) as error:
-                logger.error(f"Error creating table: {error}")
-            finally:
-                self._pool.putconn(conn)
-
-    def get_connection(self):
-        return self._pool.getconn()
-
-    def return_connection(self, conn):
-        if conn:
-            self._pool.putconn(conn) 
+import psycopg2
+import logging
+import os
+import threading
+from time import monotonic
+from psycopg2 import extensions
+from .pool import ConnectionPool
+from .migrations import migrate, DB_MIGRATE_ON_STARTUP, DB_MIGRATION_TARGET
+from ..observability.telemetry import add_db_time, TELEMETRY_SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+def get_db_config() -> dict:
+    # Get database configuration from environment variables
+    dbname = os.getenv("postgres-db")
+    user = os.getenv("postgres-user")
+    password = os.getenv("postgres-password")
+    host = os.getenv("postgres-service")
+    port = os.getenv("postgres-port")
+
+    # Log the values (without password for security)
+    logger.info(f"Database configuration: host={host}, port={port}, dbname={dbname}, user={user}")
+
+    # Verify all required values are present
+    if not all([dbname, user, password, host, port]):
+        missing = [k for k, v in {
+            "postgres-db": dbname,
+            "postgres-user": user,
+            "postgres-password": password,
+            "postgres-service": host,
+            "postgres-port": port
+        }.items() if not v]
+        raise ValueError(f"Missing required environment variables: {', '.join(missing)}")
+
+    return {
+        "dbname": dbname,
+        "user": user,
+        "password": password,
+        "host": host,
+        "port": port
+    }
+
+class TimedCursor(extensions.cursor):
+    """Cursor that charges the time its statements take to the sampled request."""
+
+    def execute(self, query, vars=None):
+        start = monotonic()
+        try:
+            return super().execute(query, vars)
+        finally:
+            add_db_time(monotonic() - start)
+
+    def executemany(self, query, vars_list):
+        start = monotonic()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            add_db_time(monotonic() - start)
+
+    def copy_expert(self, sql, file, size=8192):
+        start = monotonic()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            add_db_time(monotonic() - start)
+
+class DatabaseConnection:
+    """Process-wide psycopg2 pool.
+
+    Constructing it does no I/O: the pool is created and pre-warmed by
+    ``open()``, which the application calls during startup, or on the first
+    ``get_connection()`` otherwise.
+    """
+
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def open(self):
+        """Create and pre-warm the pool once; later calls return at once."""
+        if self._pool is not None:
+            return self._pool
+        with self._lock:
+            if self._pool is None:
+                try:
+                    config = get_db_config()
+                    if TELEMETRY_SAMPLE_RATE > 0:
+                        config["cursor_factory"] = TimedCursor
+                    # Sizing, timeouts and recycling come from the DB_POOL_* variables
+                    pool = ConnectionPool(name="psycopg2", **config)
+                    pool.prewarm()
+                    logger.info("Connection pool created successfully")
+                except (Exception, psycopg2.DatabaseError) as error:
+                    logger.error(f"Error while connecting to PostgreSQL: {error}")
+                    raise
+                if DB_MIGRATE_ON_STARTUP:
+                    self._migrate(pool)
+                self._pool = pool
+        return self._pool
+
+    def _migrate(self, pool):
+        conn = pool.getconn()
+        try:
+            migrate(conn, target=DB_MIGRATION_TARGET)
+        except (Exception, psycopg2.DatabaseError) as error:
+            logger.error(f"Error applying migrations: {error}")
+        finally:
+            pool.putconn(conn)
+
+    @property
+    def is_open(self) -> bool:
+        return self._pool is not None
+
+    def get_connection(self):
+        # Waits for a free connection, raises PoolTimeout if none frees up
+        return self.open().getconn()
+
+    def return_connection(self, conn):
+        if conn:
+            self._pool.putconn(conn)
+
+    def pool_stats(self) -> dict:
+        if self._pool is None:
+            return {"size": 0, "max_size": 0, "in_use": 0, "idle": 0, "waiters": 0}
+        return self._pool.stats()
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.closeall()
@@ -0,0 +1,492 @@
+import argparse
+import logging
+import os
+import re
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+import psycopg2
+import psycopg2.errors
+from psycopg2.extras import execute_values
+from ..services.geo import parse_location, geohash_encode
+from .partitions import (
+    REQUESTS_PARTITION_INTERVAL, REQUESTS_PARTITIONS_AHEAD, PARTITION_LOCK_TIMEOUT_MS,
+    Partition, partition_plan, partition_end
+)
+
+logger = logging.getLogger(__name__)
+
+CREATE_REQUESTS_TABLE = """
+CREATE TABLE IF NOT EXISTS requests (
+    id UUID PRIMARY KEY,
+    location TEXT,
+    status TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    response_time FLOAT
+)
+"""
+
+# Rows per transaction when backfilling existing data
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "10000"))
+
+# Apply pending migrations when the pool is first opened instead of as a
+# separate `python -m src.database.migrations` step (handy for local runs)
+DB_MIGRATE_ON_STARTUP = os.getenv("DB_MIGRATE_ON_STARTUP", "false").lower() == "true"
+# Highest version either way of migrating applies; unset applies them all.
+# Rollouts pin it below versions the code being replaced cannot run against
+DB_MIGRATION_TARGET = int(os.getenv("DB_MIGRATION_TARGET") or 0) or None
+
+# Serializes migrations when several replicas start at once
+MIGRATION_LOCK_ID = 727601
+
+CREATE_MIGRATIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    description TEXT,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+ADD_COORDINATE_COLUMNS = [
+    "ALTER TABLE requests ADD COLUMN IF NOT EXISTS city TEXT",
+    "ALTER TABLE requests ADD COLUMN IF NOT EXISTS latitude DOUBLE PRECISION",
+    "ALTER TABLE requests ADD COLUMN IF NOT EXISTS longitude DOUBLE PRECISION",
+    # Byte-wise collation so prefix ranges map onto plain btree range scans
+    'ALTER TABLE requests ADD COLUMN IF NOT EXISTS geohash TEXT COLLATE "C"',
+    "CREATE INDEX IF NOT EXISTS idx_requests_geohash ON requests (geohash)",
+]
+
+def backfill_coordinates(conn, batch_size: int = None):
+    """Fill the typed coordinate columns of old rows from the location string.
+
+    Walks the table in primary key order and commits every ``batch_size``
+    rows, so a large table is never locked in one transaction and an
+    interrupted run resumes where it stopped. Rows whose location does not
+    parse are left NULL.
+    """
+    batch_size = batch_size or MIGRATION_BATCH_SIZE
+    last_id = "00000000-0000-0000-0000-000000000000"
+    updated = 0
+    with conn.cursor() as cursor:
+        while True:
+            cursor.execute(
+                "SELECT id::text, location FROM requests "
+                "WHERE id > %s AND geohash IS NULL AND location IS NOT NULL "
+                "ORDER BY id LIMIT %s",
+                (last_id, batch_size)
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            values = []
+            for request_id, location in rows:
+                parsed = parse_location(location)
+                if parsed is not None:
+                    city, latitude, longitude = parsed
+                    values.append((request_id, city, latitude, longitude,
+                                   geohash_encode(latitude, longitude)))
+            if values:
+                execute_values(
+                    cursor,
+                    "UPDATE requests AS r SET city = v.city, latitude = v.latitude, "
+                    "longitude = v.longitude, geohash = v.geohash "
+                    "FROM (VALUES %s) AS v (id, city, latitude, longitude, geohash) "
+                    "WHERE r.id = v.id::uuid",
+                    values,
+                    page_size=len(values)
+                )
+            conn.commit()
+            updated += len(values)
+    logger.info(f"Backfilled coordinates for {updated} rows")
+
+ADD_GEOCODING_COLUMNS = [
+    # Nearest gazetteer city and its distance, filled in when GEOCODER is enabled
+    "ALTER TABLE requests ADD COLUMN IF NOT EXISTS canonical_city TEXT",
+    "ALTER TABLE requests ADD COLUMN IF NOT EXISTS canonical_distance_m DOUBLE PRECISION",
+]
+
+ADD_JOB_COLUMNS = [
+    # Claim bookkeeping for services.job_worker; rows already in the table
+    # become available immediately
+    "ALTER TABLE requests ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0",
+    "ALTER TABLE requests ADD COLUMN IF NOT EXISTS available_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP",
+    "ALTER TABLE requests ADD COLUMN IF NOT EXISTS last_error TEXT",
+    # Only unfinished rows are indexed, so the index stays as small as the backlog
+    "CREATE INDEX IF NOT EXISTS idx_requests_pending ON requests (available_at) "
+    "WHERE status IN ('received', 'processing')",
+]
+
+ADD_LISTING_INDEXES = [
+    # Keyset pagination and exports walk (created_at, id); the status variant
+    # keeps filtered listings from scanning past rows of other statuses
+    "CREATE INDEX IF NOT EXISTS idx_requests_created ON requests (created_at, id)",
+    "CREATE INDEX IF NOT EXISTS idx_requests_status_created ON requests (status, created_at, id)",
+]
+
+ADD_IDEMPOTENCY_KEY = [
+    # Client-supplied Idempotency-Key of POST /service/submit. Unique only
+    # where set, so unkeyed and bulk rows cost nothing in the index.
+    "ALTER TABLE requests ADD COLUMN IF NOT EXISTS idempotency_key TEXT",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_requests_idempotency_key ON requests (idempotency_key) "
+    "WHERE idempotency_key IS NOT NULL",
+]
+
+# Per-request telemetry, written in batches by observability.telemetry
+CREATE_METRICS_TABLE = [
+    """
+    CREATE TABLE IF NOT EXISTS metrics (
+        id BIGSERIAL PRIMARY KEY,
+        request_id TEXT,
+        method TEXT NOT NULL,
+        route TEXT NOT NULL,
+        status INTEGER,
+        process_time DOUBLE PRECISION NOT NULL,
+        db_time DOUBLE PRECISION,
+        memory_usage BIGINT,
+        allocated_bytes BIGINT,
+        error_count INTEGER NOT NULL DEFAULT 0,
+        timestamp TIMESTAMP NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_metrics_timestamp ON metrics (timestamp)",
+]
+
+CREATE_LATENCY_SKETCHES_TABLE = [
+    """
+    CREATE TABLE IF NOT EXISTS latency_sketches (
+        track TEXT NOT NULL,
+        worker TEXT NOT NULL,
+        started_at DOUBLE PRECISION NOT NULL,
+        method TEXT NOT NULL,
+        route TEXT NOT NULL,
+        width INTEGER NOT NULL,
+        slot BIGINT NOT NULL,
+        requests BIGINT NOT NULL,
+        errors BIGINT NOT NULL,
+        bucket_indexes INTEGER[] NOT NULL,
+        bucket_counts BIGINT[] NOT NULL,
+        PRIMARY KEY (track, worker, method, route, width, slot)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_latency_sketches_track ON latency_sketches (track, width, slot)",
+    "CREATE INDEX IF NOT EXISTS idx_latency_sketches_slot ON latency_sketches (slot)",
+]
+
+# Idempotency keys move out of requests: a partitioned table cannot have a
+# unique index that leaves out the partition key
+CREATE_REQUEST_KEYS_TABLE = [
+    """
+    CREATE TABLE IF NOT EXISTS request_keys (
+        idempotency_key TEXT PRIMARY KEY,
+        id UUID NOT NULL,
+        created_at TIMESTAMP NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_request_keys_created ON request_keys (created_at)",
+]
+
+def fill_created_at(conn, batch_size: int = None):
+    """Give rows without a created_at one, ``batch_size`` rows per transaction."""
+    batch_size = batch_size or MIGRATION_BATCH_SIZE
+    filled = 0
+    with conn.cursor() as cursor:
+        while True:
+            cursor.execute(
+                "UPDATE requests SET created_at = coalesce(updated_at, LOCALTIMESTAMP) "
+                "WHERE id IN (SELECT id FROM requests WHERE created_at IS NULL LIMIT %s)",
+                (batch_size,)
+            )
+            conn.commit()
+            filled += cursor.rowcount
+            if cursor.rowcount < batch_size:
+                break
+    if filled:
+        logger.info(f"Filled in created_at of {filled} rows")
+
+def copy_request_keys(conn, batch_size: int = None):
+    """Copy idempotency keys from requests into request_keys.
+
+    Walks the keys in order, ``batch_size`` per transaction, and skips keys
+    that are already there, so a rerun picks up keys written since.
+    """
+    batch_size = batch_size or MIGRATION_BATCH_SIZE
+    fill_created_at(conn, batch_size)
+    last_key = ""
+    checked = 0
+    with conn.cursor() as cursor:
+        while True:
+            cursor.execute(
+                "WITH batch AS ("
+                "SELECT idempotency_key, id, created_at FROM requests "
+                "WHERE idempotency_key > %s ORDER BY idempotency_key LIMIT %s"
+                "), copied AS ("
+                "INSERT INTO request_keys (idempotency_key, id, created_at) SELECT * FROM batch "
+                "ON CONFLICT (idempotency_key) DO NOTHING"
+                ") SELECT max(idempotency_key), count(*) FROM batch",
+                (last_key, batch_size)
+            )
+            last_key, count = cursor.fetchone()
+            conn.commit()
+            checked += count
+            if count < batch_size:
+                break
+    logger.info(f"Copied the idempotency keys of {checked} rows")
+
+# Attempts at DDL that needs a lock on requests, PARTITION_LOCK_TIMEOUT_MS each
+PARTITION_LOCK_ATTEMPTS = 30
+# Lets ATTACH PARTITION take the old table without scanning it
+LEGACY_BOUNDS = "requests_legacy_bounds"
+LEGACY_PRIMARY_KEY = "requests_legacy_pkey"
+# The old table keeps taking rows up to a partition boundary at least this
+# far ahead, which leaves time to validate and index it
+CUTOVER_MARGIN = timedelta(days=1)
+# Rows at or past the cutover are rejected until the swap, so a resumed
+# conversion picks a new cutover when the old one is this close
+CUTOVER_MIN_LEAD = timedelta(hours=1)
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def _with_lock_timeout(conn, description: str, step):
+    """Run ``step(cursor)`` in one transaction under a short lock_timeout.
+
+    Waiting on a lock of a busy table would queue every other query behind
+    the DDL, so a lock that is not granted in time rolls back and retries.
+    """
+    for attempt in range(1, PARTITION_LOCK_ATTEMPTS + 1):
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(f"SET LOCAL lock_timeout = {PARTITION_LOCK_TIMEOUT_MS}")
+                step(cursor)
+            conn.commit()
+            return
+        except psycopg2.errors.LockNotAvailable:
+            conn.rollback()
+            logger.warning(f"{description}: lock not granted, attempt {attempt} of {PARTITION_LOCK_ATTEMPTS}")
+            time.sleep(min(attempt, 10))
+    raise RuntimeError(f"{description}: could not get a lock on requests")
+
+def _legacy_cutover(cursor):
+    cursor.execute(
+        "SELECT pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = 'requests'::regclass AND conname = %s",
+        (LEGACY_BOUNDS,)
+    )
+    row = cursor.fetchone()
+    return datetime.fromisoformat(re.search(r"'([^']+)'", row[0]).group(1)) if row else None
+
+def _drop_bounds(cursor):
+    cursor.execute(f"ALTER TABLE requests DROP CONSTRAINT IF EXISTS {LEGACY_BOUNDS}")
+
+def _add_bounds(cutover: datetime):
+    def step(cursor):
+        cursor.execute(
+            f"ALTER TABLE requests ADD CONSTRAINT {LEGACY_BOUNDS} "
+            "CHECK (created_at IS NOT NULL AND created_at < %s) NOT VALID",
+            (cutover,)
+        )
+    return step
+
+def _build_legacy_key(conn):
+    # CONCURRENTLY cannot run in a transaction; an interrupted build leaves
+    # an invalid index behind that has to be dropped first
+    conn.commit()
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)",
+                           (LEGACY_PRIMARY_KEY,))
+            row = cursor.fetchone()
+            if row is not None and not row[0]:
+                cursor.execute(f"DROP INDEX CONCURRENTLY {LEGACY_PRIMARY_KEY}")
+            cursor.execute(f"CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {LEGACY_PRIMARY_KEY} "
+                           "ON requests (id, created_at)")
+    finally:
+        conn.autocommit = False
+
+def _swap(cutover: datetime, copied_since: datetime, interval: str, ahead: int):
+    def step(cursor):
+        cursor.execute("LOCK TABLE requests IN ACCESS EXCLUSIVE MODE")
+        # Keys written since they were copied, by replicas of the previous version
+        cursor.execute(
+            "INSERT INTO request_keys (idempotency_key, id, created_at) "
+            "SELECT idempotency_key, id, created_at FROM requests "
+            "WHERE idempotency_key IS NOT NULL AND created_at >= %s "
+            "ON CONFLICT (idempotency_key) DO NOTHING",
+            (copied_since,)
+        )
+        cursor.execute(
+            "SELECT c.relname, i.indisunique, pg_get_indexdef(i.indexrelid) "
+            "FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE i.indrelid = 'requests'::regclass AND NOT i.indisprimary AND c.relname <> %s",
+            (LEGACY_PRIMARY_KEY,)
+        )
+        indexes = cursor.fetchall()
+        cursor.execute("SELECT conname FROM pg_constraint WHERE conrelid = 'requests'::regclass AND contype = 'p'")
+        for (primary_key,) in cursor.fetchall():
+            cursor.execute(f"ALTER TABLE requests DROP CONSTRAINT {primary_key}")
+        # The validated check already proves it, so this does not scan
+        cursor.execute("ALTER TABLE requests ALTER COLUMN created_at SET NOT NULL")
+        cursor.execute(f"ALTER TABLE requests ADD CONSTRAINT {LEGACY_PRIMARY_KEY} "
+                       f"PRIMARY KEY USING INDEX {LEGACY_PRIMARY_KEY}")
+        for name, unique, _ in indexes:
+            if unique:
+                # Cannot exist on the partitioned table; request_keys took over
+                cursor.execute(f"DROP INDEX {name}")
+            else:
+                cursor.execute(f"ALTER INDEX {name} RENAME TO {name}_legacy")
+        cursor.execute("ALTER TABLE requests RENAME TO requests_legacy")
+        cursor.execute("CREATE TABLE requests (LIKE requests_legacy INCLUDING DEFAULTS) "
+                       "PARTITION BY RANGE (created_at)")
+        cursor.execute("ALTER TABLE requests ADD PRIMARY KEY (id, created_at)")
+        for _, unique, definition in indexes:
+            if not unique:
+                cursor.execute(definition)
+        # The old table's indexes match the new ones and are attached as they
+        # are, and the check spares scanning its rows
+        cursor.execute("ALTER TABLE requests ATTACH PARTITION requests_legacy "
+                       "FOR VALUES FROM (MINVALUE) TO (%s)", (cutover,))
+        cursor.execute(f"ALTER TABLE requests_legacy DROP CONSTRAINT {LEGACY_BOUNDS}")
+        create, _ = partition_plan([Partition("requests_legacy", None, cutover)], _utcnow(), interval, ahead, 0)
+        for partition in create:
+            cursor.execute(f"CREATE TABLE {partition.name} PARTITION OF requests FOR VALUES FROM (%s) TO (%s)",
+                           (partition.lower, partition.upper))
+    return step
+
+def partition_requests(conn, interval: str = None, ahead: int = None):
+    """Turn requests into a table range-partitioned by created_at, online.
+
+    The existing table becomes the first partition, holding everything
+    before a cutover at least a day ahead, and regular partitions follow it.
+    Each step either holds its lock for a moment or works under locks that
+    let reads and writes go on:
+
+    1. a NOT VALID check that created_at is set and before the cutover,
+       then validated without blocking writes;
+    2. a unique (id, created_at) index built concurrently, which becomes
+       the old table's primary key;
+    3. in one short transaction, the table is renamed to requests_legacy,
+       an empty partitioned requests takes its place and the old table is
+       attached to it. The check lets the attach skip scanning the rows and
+       the existing indexes are reused, so nothing is rebuilt under the lock.
+
+    An interrupted run resumes where it stopped.
+    """
+    interval = interval or REQUESTS_PARTITION_INTERVAL
+    ahead = REQUESTS_PARTITIONS_AHEAD if ahead is None else ahead
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = 'requests'::regclass")
+        if cursor.fetchone()[0] == "p":
+            conn.commit()
+            logger.info("requests is already partitioned")
+            return
+        cutover = _legacy_cutover(cursor)
+        conn.commit()
+    if cutover is not None and cutover < _utcnow() + CUTOVER_MIN_LEAD:
+        _with_lock_timeout(conn, "Dropping a stale cutover", _drop_bounds)
+        cutover = None
+
+    copied_since = _utcnow() - timedelta(minutes=5)
+    copy_request_keys(conn)
+    if cutover is None:
+        cutover = partition_end(_utcnow() + CUTOVER_MARGIN, interval)
+        _with_lock_timeout(conn, "Adding the cutover check", _add_bounds(cutover))
+    logger.info(f"Rows before {cutover} stay in requests_legacy")
+    _with_lock_timeout(
+        conn, "Validating the cutover check",
+        lambda cursor: cursor.execute(f"ALTER TABLE requests VALIDATE CONSTRAINT {LEGACY_BOUNDS}")
+    )
+    _build_legacy_key(conn)
+
+    if cutover < _utcnow() + timedelta(minutes=5):
+        # Too late to swap before inserts start failing the check
+        _with_lock_timeout(conn, "Dropping a stale cutover", _drop_bounds)
+        raise RuntimeError("The cutover passed while requests was converted; run the migration again")
+    _with_lock_timeout(conn, "Swapping in the partitioned table", _swap(cutover, copied_since, interval, ahead))
+    logger.info("requests is now partitioned by created_at")
+
+# (version, description, statements, optional callable run afterwards with
+# the connection). Append only; applied versions are never re-run.
+MIGRATIONS = [
+    (1, "create requests table", [CREATE_REQUESTS_TABLE], None),
+    (2, "typed coordinate columns and geohash index", ADD_COORDINATE_COLUMNS, backfill_coordinates),
+    (3, "canonical city from reverse geocoding", ADD_GEOCODING_COLUMNS, None),
+    (4, "job queue columns and pending index", ADD_JOB_COLUMNS, None),
+    (5, "listing indexes on (created_at, id)", ADD_LISTING_INDEXES, None),
+    (6, "idempotency key", ADD_IDEMPOTENCY_KEY, None),
+    (7, "request telemetry table", CREATE_METRICS_TABLE, None),
+    (8, "latency sketch table", CREATE_LATENCY_SKETCHES_TABLE, None),
+    (9, "idempotency keys table", CREATE_REQUEST_KEYS_TABLE, copy_request_keys),
+    (10, "partition requests by created_at", [], partition_requests),
+]
+
+def applied_versions(cursor) -> set:
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+def migrate(conn, migrations: list = None, target: int = None) -> list:
+    """Apply pending migrations in order, up to ``target`` if given, and return their versions."""
+    migrations = MIGRATIONS if migrations is None else migrations
+    if target is not None:
+        migrations = [migration for migration in migrations if migration[0] <= target]
+    applied = []
+    with conn.cursor() as cursor:
+        cursor.execute(CREATE_MIGRATIONS_TABLE)
+        conn.commit()
+        cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+        try:
+            done = applied_versions(cursor)
+            for version, description, statements, post in migrations:
+                if version in done:
+                    continue
+                logger.info(f"Applying migration {version}: {description}")
+                for statement in statements:
+                    cursor.execute(statement)
+                conn.commit()
+                if post is not None:
+                    post(conn)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                    (version, description)
+                )
+                conn.commit()
+                applied.append(version)
+        except (Exception, psycopg2.DatabaseError):
+            conn.rollback()
+            raise
+        finally:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+            conn.commit()
+    return applied
+
+def run_migrations(target: int = None) -> list:
+    """Apply pending migrations over a dedicated connection."""
+    from .connection import get_db_config
+
+    conn = psycopg2.connect(**get_db_config())
+    try:
+        return migrate(conn, target=target)
+    finally:
+        conn.close()
+
+def main(argv: list = ()) -> int:
+    parser = argparse.ArgumentParser(description="Apply pending schema migrations.")
+    parser.add_argument("--target", type=int, default=DB_MIGRATION_TARGET,
+                        help="stop after this version (default: DB_MIGRATION_TARGET, else the latest)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    try:
+        applied = run_migrations(args.target)
+    except (Exception, psycopg2.DatabaseError) as error:
+        logger.error(f"Migrations failed: {error}")
+        return 1
+    if applied:
+        logger.info(f"Applied migrations {', '.join(map(str, applied))}")
+    else:
+        logger.info("Schema is up to date")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import os
+import random
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple, Optional
+from uuid import UUID
+from prometheus_client import Gauge
+
+logger = logging.getLogger(__name__)
+
+# requests is range-partitioned on created_at, one partition per day, week
+# or month
+REQUESTS_PARTITION_INTERVAL = os.getenv("REQUESTS_PARTITION_INTERVAL", "day")
+# Partitions kept created beyond the current one, so an insert never waits on DDL
+REQUESTS_PARTITIONS_AHEAD = int(os.getenv("REQUESTS_PARTITIONS_AHEAD", "7"))
+# Partitions whose rows are all older than this are detached and dropped;
+# 0 keeps every partition
+REQUESTS_RETENTION_DAYS = int(os.getenv("REQUESTS_RETENTION_DAYS", "0"))
+PARTITION_MAINTENANCE_SECONDS = float(os.getenv("PARTITION_MAINTENANCE_SECONDS", "3600"))
+# Partition DDL gives up on a lock it cannot get within this long and is
+# retried later, rather than queueing every query on requests behind it
+PARTITION_LOCK_TIMEOUT_MS = int(os.getenv("PARTITION_LOCK_TIMEOUT_MS", "2000"))
+
+INTERVALS = ("day", "week", "month")
+
+_EPOCH = datetime(1970, 1, 1)
+_BOUNDS = re.compile(r"FOR VALUES FROM \((.+)\) TO \((.+)\)")
+
+PARTITION_HORIZON = Gauge(
+    'requests_partition_horizon_seconds',
+    'How far past now the newest requests partition reaches; inserts fail beyond it',
+    multiprocess_mode='livemin'
+)
+
+def uuid7(now: float = None) -> str:
+    """A version 7 UUID: Unix milliseconds in the top 48 bits, then random bits.
+
+    Request ids carry their creation time this way, so a lookup by id knows
+    which partition to read.
+    """
+    millis = int((time.time() if now is None else now) * 1000)
+    value = (millis << 80) | int.from_bytes(os.urandom(10), "big")
+    value = value & ~(0xF << 76) | 0x7 << 76
+    value = value & ~(0x3 << 62) | 0x2 << 62
+    return str(UUID(int=value))
+
+def uuid7_time(request_id) -> Optional[datetime]:
+    """created_at (naive UTC) encoded in a version 7 id, None for any other id."""
+    try:
+        value = UUID(str(request_id))
+    except ValueError:
+        return None
+    if value.version != 7:
+        return None
+    return _EPOCH + timedelta(milliseconds=value.int >> 80)
+
+def request_created_at(request_id) -> datetime:
+    """created_at to store with a new row: the id's timestamp when it has one."""
+    return uuid7_time(request_id) or datetime.now(timezone.utc).replace(tzinfo=None)
+
+def partition_start(moment: datetime, interval: str) -> datetime:
+    day = datetime(moment.year, moment.month, moment.day)
+    if interval == "day":
+        return day
+    if interval == "week":
+        return day - timedelta(days=day.weekday())
+    if interval == "month":
+        return day.replace(day=1)
+    raise ValueError(f"Unknown partition interval: {interval}")
+
+def partition_end(moment: datetime, interval: str) -> datetime:
+    """First partition boundary after ``moment``."""
+    start = partition_start(moment, interval)
+    if interval == "day":
+        return start + timedelta(days=1)
+    if interval == "week":
+        return start + timedelta(weeks=1)
+    return (start + timedelta(days=32)).replace(day=1)
+
+def partition_name(start: datetime) -> str:
+    return f"requests_p{start:%Y%m%d}"
+
+class Partition(NamedTuple):
+    name: str
+    # None for MINVALUE / MAXVALUE
+    lower: Optional[datetime]
+    upper: Optional[datetime]
+    # Left behind by an interrupted DETACH ... CONCURRENTLY
+    detach_pending: bool = False
+
+def _parse_bound(value: str) -> Optional[datetime]:
+    if value in ("MINVALUE", "MAXVALUE"):
+        return None
+    return datetime.fromisoformat(value.strip("'"))
+
+def parse_partition(name: str, bound: str, detach_pending: bool = False) -> Optional[Partition]:
+    """Partition from its catalog row; None for a default partition."""
+    match = _BOUNDS.fullmatch(bound or "")
+    if match is None:
+        return None
+    return Partition(name, _parse_bound(match.group(1)), _parse_bound(match.group(2)), bool(detach_pending))
+
+def partition_plan(partitions: list, now: datetime, interval: str, ahead: int, retention_days: int) -> tuple:
+    """Partitions to create and partitions to drop, as two lists.
+
+    New partitions continue from the newest existing one until the current
+    interval and ``ahead`` more are covered. Partitions whose upper bound is
+    ``retention_days`` or more in the past are dropped, as are partitions
+    left half detached by an earlier run.
+    """
+    attached = [partition for partition in partitions if not partition.detach_pending]
+    create = []
+    if all(partition.upper is not None for partition in attached):
+        horizon = partition_start(now, interval)
+        for _ in range(ahead + 1):
+            horizon = partition_end(horizon, interval)
+        cursor = max((partition.upper for partition in attached), default=partition_start(now, interval))
+        while cursor < horizon:
+            end = partition_end(cursor, interval)
+            create.append(Partition(partition_name(cursor), cursor, end))
+            cursor = end
+
+    drop = [partition for partition in partitions if partition.detach_pending]
+    if retention_days > 0:
+        cutoff = now - timedelta(days=retention_days)
+        drop += [partition for partition in attached if partition.upper is not None and partition.upper <= cutoff]
+    drop.sort(key=lambda partition: partition.upper or datetime.max)
+    return create, drop
+
+class PartitionMaintainer:
+    """Keeps the requests partitions ahead of time and drops expired ones.
+
+    Every ``interval`` seconds it creates the partitions ``partition_plan``
+    asks for and detaches and drops those past the retention period, so old
+    rows go away a whole partition at a time instead of through DELETE, and
+    expires the idempotency keys of the dropped rows. Replicas run it
+    concurrently; DDL that loses a race or a lock fails harmlessly and the
+    next run picks it up.
+    """
+
+    def __init__(self, repository=None, interval: float = None, partition_interval: str = None,
+                 ahead: int = None, retention_days: int = None):
+        self.repository = repository
+        self.interval = PARTITION_MAINTENANCE_SECONDS if interval is None else interval
+        self.partition_interval = partition_interval or REQUESTS_PARTITION_INTERVAL
+        if self.partition_interval not in INTERVALS:
+            raise ValueError(f"REQUESTS_PARTITION_INTERVAL must be one of {', '.join(INTERVALS)}")
+        self.ahead = REQUESTS_PARTITIONS_AHEAD if ahead is None else ahead
+        self.retention_days = REQUESTS_RETENTION_DAYS if retention_days is None else retention_days
+        self._task = None
+
+    async def start(self):
+        if self._task is None and self.repository is not None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as error:
+                logger.error(f"Error maintaining requests partitions: {error}")
+            # Spread out the passes of the service's processes
+            await asyncio.sleep(self.interval * random.uniform(0.5, 1.5))
+
+    async def run_once(self, now: datetime = None) -> Optional[dict]:
+        """One maintenance pass; returns the names created and dropped."""
+        now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+        rows = await self.repository.list_partitions()
+        if rows is None:
+            return None
+        partitions = [partition for partition in (parse_partition(*row) for row in rows) if partition is not None]
+        if not partitions:
+            logger.warning("requests is not partitioned yet, apply the pending migrations")
+            return None
+        create, drop = partition_plan(partitions, now, self.partition_interval, self.ahead, self.retention_days)
+
+        created = []
+        for partition in create:
+            if not await self.repository.create_partition(partition.name, partition.lower, partition.upper):
+                # Later partitions would leave a gap
+                break
+            created.append(partition.name)
+            partitions.append(partition)
+        dropped = []
+        for partition in drop:
+            if await self.repository.drop_partition(partition.name, partition.detach_pending):
+                dropped.append(partition.name)
+        if self.retention_days > 0:
+            await self.repository.expire_request_keys(now - timedelta(days=self.retention_days))
+
+        if created or dropped:
+            logger.info(f"Requests partitions created: {', '.join(created) or 'none'}; "
+                        f"dropped: {', '.join(dropped) or 'none'}")
+        uppers = [partition.upper for partition in partitions if not partition.detach_pending]
+        if None not in uppers:
+            PARTITION_HORIZON.set((max(uppers) - now).total_seconds())
+        return {"created": created, "dropped": dropped}
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+maintainer = PartitionMaintainer()
@@ -0,0 +1,297 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from time import monotonic
+import psycopg2
+from psycopg2 import extensions
+from prometheus_client import Counter, Histogram, Gauge
+
+logger = logging.getLogger(__name__)
+
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+DB_POOL_MAX_WAITERS = int(os.getenv("DB_POOL_MAX_WAITERS", "100"))
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))
+DB_POOL_HEALTHCHECK_AFTER = float(os.getenv("DB_POOL_HEALTHCHECK_AFTER", "30"))
+
+POOL_IN_USE = Gauge(
+    'db_pool_connections_in_use',
+    'Connections currently checked out of the pool',
+    ['pool'],
+    multiprocess_mode='livesum'
+)
+
+POOL_IDLE = Gauge(
+    'db_pool_connections_idle',
+    'Open connections waiting in the pool',
+    ['pool'],
+    multiprocess_mode='livesum'
+)
+
+POOL_WAITERS = Gauge(
+    'db_pool_waiters',
+    'Threads waiting for a free connection',
+    ['pool'],
+    multiprocess_mode='livesum'
+)
+
+POOL_ACQUIRE_LATENCY = Histogram(
+    'db_pool_acquire_seconds',
+    'Time spent waiting to check out a connection',
+    ['pool'],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+)
+
+POOL_TIMEOUTS = Counter(
+    'db_pool_timeouts_total',
+    'Checkouts rejected because the pool stayed saturated',
+    ['pool', 'reason']
+)
+
+POOL_RECYCLED = Counter(
+    'db_pool_connections_recycled_total',
+    'Connections closed and replaced by the pool',
+    ['pool', 'reason']
+)
+
+class PoolTimeout(Exception):
+    """No connection became available within the acquire timeout."""
+
+class PoolExhausted(PoolTimeout):
+    """The wait queue is full, so the caller was rejected without waiting."""
+
+class _Entry:
+    __slots__ = ("conn", "created_at", "last_used")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = monotonic()
+        self.last_used = self.created_at
+
+class ConnectionPool:
+    """Thread-safe psycopg2 connection pool with a bounded wait queue.
+
+    When every connection is checked out, ``getconn`` waits up to ``timeout``
+    seconds for one to be returned instead of failing immediately. At most
+    ``max_waiters`` threads may wait; beyond that callers are rejected with
+    ``PoolExhausted`` so a burst degrades into fast 503s rather than a pile-up.
+    Connections older than ``max_lifetime`` are recycled and connections that
+    sat idle longer than ``healthcheck_after`` are pinged before reuse.
+    """
+
+    def __init__(self, name: str = "default", min_size: int = None, max_size: int = None,
+                 timeout: float = None, max_waiters: int = None, max_lifetime: float = None,
+                 healthcheck_after: float = None, **connect_kwargs):
+        self.name = name
+        self.min_size = DB_POOL_MIN if min_size is None else min_size
+        self.max_size = max_size or DB_POOL_MAX
+        self.timeout = DB_POOL_TIMEOUT if timeout is None else timeout
+        self.max_waiters = DB_POOL_MAX_WAITERS if max_waiters is None else max_waiters
+        self.max_lifetime = DB_POOL_MAX_LIFETIME if max_lifetime is None else max_lifetime
+        self.healthcheck_after = DB_POOL_HEALTHCHECK_AFTER if healthcheck_after is None else healthcheck_after
+        self._connect_kwargs = connect_kwargs
+        self._idle = deque()
+        self._in_use = {}
+        self._size = 0
+        self._waiters = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._pid = os.getpid()
+
+        self._in_use_gauge = POOL_IN_USE.labels(pool=name)
+        self._idle_gauge = POOL_IDLE.labels(pool=name)
+        self._waiters_gauge = POOL_WAITERS.labels(pool=name)
+        self._acquire_latency = POOL_ACQUIRE_LATENCY.labels(pool=name)
+
+    def _open(self):
+        return psycopg2.connect(**self._connect_kwargs)
+
+    def _update_gauges(self):
+        self._in_use_gauge.set(len(self._in_use))
+        self._idle_gauge.set(len(self._idle))
+        self._waiters_gauge.set(self._waiters)
+
+    def _check_fork(self):
+        """Forget connections inherited from a parent process.
+
+        Sharing a libpq socket between processes corrupts both sessions, so a
+        forked child starts with an empty pool. The inherited connections are
+        dropped without closing them, which would also close the parent's.
+        Runs without the lock: one inherited while held would never be released.
+        """
+        if self._pid == os.getpid():
+            return
+        logger.warning(f"Connection pool {self.name} used after fork, discarding inherited connections")
+        self._pid = os.getpid()
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._in_use = {}
+        self._size = 0
+        self._waiters = 0
+
+    def prewarm(self):
+        """Open connections until the pool holds ``min_size`` of them."""
+        opened = []
+        self._check_fork()
+        with self._cond:
+            missing = max(0, min(self.min_size, self.max_size) - self._size)
+            self._size += missing
+        try:
+            if missing:
+                # Each connect is a few network round trips, so they are
+                # opened side by side rather than one after another
+                with ThreadPoolExecutor(max_workers=missing, thread_name_prefix=f"prewarm-{self.name}") as executor:
+                    futures = [executor.submit(self._open) for _ in range(missing)]
+                errors = []
+                for future in futures:
+                    try:
+                        opened.append(_Entry(future.result()))
+                    except Exception as error:
+                        errors.append(error)
+                if errors:
+                    raise errors[0]
+        finally:
+            with self._cond:
+                self._size -= missing - len(opened)
+                self._idle.extend(opened)
+                self._update_gauges()
+                self._cond.notify(len(opened))
+        logger.info(f"Connection pool {self.name} pre-warmed with {len(opened)} connections")
+
+    def getconn(self, timeout: float = None):
+        start_time = monotonic()
+        deadline = start_time + (self.timeout if timeout is None else timeout)
+        entry = None
+        self._check_fork()
+        with self._cond:
+            if self._closed:
+                raise PoolTimeout("Connection pool is closed")
+            if not self._idle and self._size >= self.max_size and self._waiters >= self.max_waiters:
+                POOL_TIMEOUTS.labels(pool=self.name, reason="queue_full").inc()
+                raise PoolExhausted("Connection pool wait queue is full")
+            while True:
+                if self._idle:
+                    # LIFO keeps the hottest connections busy and lets the
+                    # rest age out
+                    entry = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    POOL_TIMEOUTS.labels(pool=self.name, reason="timeout").inc()
+                    raise PoolTimeout(f"No database connection available after {self.timeout:.1f}s")
+                self._waiters += 1
+                self._waiters_gauge.set(self._waiters)
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiters -= 1
+                    self._waiters_gauge.set(self._waiters)
+
+        try:
+            entry = self._checkout(entry)
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._update_gauges()
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._in_use[id(entry.conn)] = entry
+            self._update_gauges()
+        self._acquire_latency.observe(monotonic() - start_time)
+        return entry.conn
+
+    def _checkout(self, entry):
+        """Return a usable entry, replacing ``entry`` if it is stale or broken."""
+        if entry is not None:
+            now = monotonic()
+            if entry.conn.closed:
+                self._recycle(entry, "broken")
+                entry = None
+            elif now - entry.created_at > self.max_lifetime:
+                self._recycle(entry, "max_lifetime")
+                entry = None
+            elif now - entry.last_used > self.healthcheck_after and not self._ping(entry.conn):
+                self._recycle(entry, "healthcheck")
+                entry = None
+        if entry is None:
+            entry = _Entry(self._open())
+        return entry
+
+    def _ping(self, conn) -> bool:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception as error:
+            logger.warning(f"Pooled connection failed health check: {error}")
+            return False
+
+    def _recycle(self, entry, reason: str):
+        POOL_RECYCLED.labels(pool=self.name, reason=reason).inc()
+        try:
+            entry.conn.close()
+        except Exception:
+            pass
+
+    def putconn(self, conn, close: bool = False):
+        with self._cond:
+            entry = self._in_use.pop(id(conn), None)
+        if entry is None:
+            raise ValueError("Trying to return a connection that is not checked out of this pool")
+
+        # Same reset policy as psycopg2's own pools
+        if not close and not conn.closed:
+            status = conn.info.transaction_status
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                close = True
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except Exception:
+                    close = True
+        if not close and monotonic() - entry.created_at > self.max_lifetime:
+            self._recycle(entry, "max_lifetime")
+            close = True
+        elif close or conn.closed:
+            self._recycle(entry, "broken")
+            close = True
+
+        with self._cond:
+            if close or self._closed:
+                self._size -= 1
+                if self._closed and not conn.closed:
+                    conn.close()
+            else:
+                entry.last_used = monotonic()
+                self._idle.append(entry)
+            self._update_gauges()
+            self._cond.notify()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "size": self._size,
+                "max_size": self.max_size,
+                "in_use": len(self._in_use),
+                "idle": len(self._idle),
+                "waiters": self._waiters
+            }
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+            self._update_gauges()
+            self._cond.notify_all()
+        for entry in idle:
+            entry.conn.close()
@@ -1,12 +1,12 @@
-"""Test configuration for database connection"""
-
-import os
-
-# Test database configuration
-TEST_DB_CONFIG = {
-    'dbname': "test_db",
-    'user': "test_user",
-    'password': "test_password",
-    'host': "localhost",
-    'port': "5432"
-} 
+"""Test configuration for database connection"""
+
+import os
+
+# Test database configuration
+TEST_DB_CONFIG = {
+    'dbname': "test_db",
+    'user': "test_user",
+    'password': "test_password",
+    'host': "localhost",
+    'port': "5432"
+} 
@@ -1,190 +1,206 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.trustedhost import TrustedHostMiddleware
-import logging
-from time import time
-from .controllers.location_controller import router as location_router
-from .controllers.devops_controller import router as devops_router
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
-from prometheus_client import Counter, Histogram, Gauge
-from prometheus_fastapi_instrumentator import Instrumentator
-import json
-from pythonjsonlogger import jsonlogger
-
-# Configure structured logging
-logger = logging.getLogger()
-logHandler = logging.StreamHandler()
-formatter = jsonlogger.JsonFormatter(
-    fmt='%(asctime)s %(levelname)s %(name)s %(message)s'
-)
-logHandler.setFormatter(formatter)
-logger.addHandler(logHandler)
-logger.setLevel(logging.INFO)
-
-# Prometheus metrics
-REQUEST_COUNT = Counter(
-    'http_requests_total',
-    'Total number of HTTP requests',
-    ['method', 'endpoint', 'status']
-)
-
-REQUEST_LATENCY = Histogram(
-    'http_request_duration_seconds',
-    'HTTP request duration in seconds',
-    ['method', 'endpoint']
-)
-
-WEBSOCKET_CONNECTIONS = Gauge(
-    'websocket_connections_active',
-    'Number of active WebSocket connections'
-)
-
-ERROR_COUNT = Counter(
-    'http_errors_total',
-    'Total number of HTTP errors',
-    ['type']
-)
-
-app = FastAPI()
-
-# Initialize Prometheus metrics
-Instrumentator().instrument(app).expose(app)
-
-# Rate limiting configuration
-limiter = Limiter(key_func=get_remote_address)
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
-
-# CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Trusted hosts middleware
-app.add_middleware(
-    TrustedHostMiddleware,
-    allowed_hosts=["*"]  # Production'da spesifik host'lar belirtilmeli
-)
-
-# Include routers
-app.include_router(location_router, prefix="/service", tags=["location"])
-app.include_router(devops_router, prefix="/service/devops", tags=["devops"])
-
-# Middleware to log all requests with response time and metrics
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    start_time = time()
-    method = request.method
-    endpoint = request.url.path
-    
-    # Log request
-    logger.info("Incoming request", extra={
-        "method": method,
-        "endpoint": endpoint,
-        "client_ip": request.client.host
-    })
-    
-    try:
-        response = await call_next(request)
-        duration = time() - start_time
-        
-        # Record metrics
-        REQUEST_COUNT.labels(method=method, endpoint=endpoint, status=response.status_code).inc()
-        REQUEST_LATENCY.labels(method=method, endpoint=endpoint).observe(duration)
-        
-        # Log response
-        logger.info("Request completed", extra={
-            "method": method,
-            "endpoint": endpoint,
-            "status_code": response.status_code,
-            "duration": duration
-        })
-        
-        return response
-    except Exception as e:
-        ERROR_COUNT.labels(type=type(e).__name__).inc()
-        logger.error("Request failed", extra={
-            "method": method,
-            "endpoint": endpoint,
-            "error": str(e)
-        })
-        raise
-
-# WebSocket connection manager
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: list[WebSocket] = []
-        self.connection_count = 0
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-        self.connection_count += 1
-        WEBSOCKET_CONNECTIONS.set(self.connection_count)
-        logger.info("WebSocket connection established", extra={
-            "total_connections": self.connection_count
-        })
-
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-        self.connection_count -= 1
-        WEBSOCKET_CONNECTIONS.set(self.connection_count)
-        logger.info("WebSocket connection closed", extra={
-            "total_connections": self.connection_count
-        })
-
-    async def broadcast(self, message: str):
-        logger.info("Broadcasting message", extra={
-            "message": message,
-            "recipients": len(self.active_connections)
-        })
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except Exception as e:
-                logger.error("Error broadcasting message", extra={
-                    "error": str(e)
-                })
-                await self.disconnect(connection)
-
-manager = ConnectionManager()
-
-@app.get("/service")
-@limiter.limit("100/minute")
-async def service_status(request: Request):
-    logger.info("Service status endpoint accessed")
-    return {
-        "message": "Service is running",
-        "websocket_connections": manager.connection_count,
-        "uptime": time() - app.start_time if hasattr(app, 'start_time') else 0
-    }
-
-@app.websocket("/service/stream")
-async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
-    try:
-        while True:
-            data = await websocket.receive_text()
-            logger.info("WebSocket received data", extra={
-                "data": data
-            })
-            await manager.broadcast(f"Received data: {data}")
-    except WebSocketDisconnect:
-        manager.disconnect(websocket)
-    except Exception as e:
-        logger.error("WebSocket error", extra={
-            "error": str(e)
-        })
-        manager.disconnect(websocket)
-
-# Add startup event to initialize app start time
-@app.on_event("startup")
-async def startup_event():
-    app.start_time = time()
-    logger.info("Application startup completed")
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, Response
+from fastapi.responses import JSONResponse
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.trustedhost import TrustedHostMiddleware
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from time import time, monotonic
+from .controllers.location_controller import router as location_router, controller as location_controller
+from .controllers.devops_controller import router as devops_router
+from .services.connection_manager import ConnectionManager
+from .services.backplane import create_backplane
+from .services.startup import keep_trying, STARTUP_SECONDS
+from .services.health import prober
+from .database.partitions import maintainer as partition_maintainer
+from .services import ws_protocol
+from slowapi import Limiter, _rate_limit_exceeded_handler
+from slowapi.util import get_remote_address
+from slowapi.errors import RateLimitExceeded
+import json
+from .observability.logging_pipeline import configure_logging
+from .observability.middleware import RequestLoggingMiddleware
+from .observability.metrics import render_metrics, multiprocess_enabled, gauge_total
+from .observability.telemetry import collector as telemetry
+from .observability.loop_lag import monitor as loop_lag
+from .observability.sketches import tracker as latency_tracker
+
+# Configure structured logging, formatted and written off the event loop
+configure_logging()
+logger = logging.getLogger()
+
+# Module import is timed from here, before any route or service is built
+_process_started = monotonic()
+
+async def warm_up():
+    """Bring up pools, backplanes and the geocoder, then report ready."""
+    await asyncio.gather(
+        keep_trying("websocket backplane", manager.start),
+        location_controller.service.start(),
+        telemetry.start(),
+        latency_tracker.start(),
+        partition_maintainer.start(),
+    )
+    # Readiness also needs a first health probe to look at
+    await prober.start()
+    app.state.ready = True
+    STARTUP_SECONDS.set(monotonic() - _process_started)
+    logger.info(f"Application ready after {monotonic() - _process_started:.2f}s")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.start_time = time()
+    app.state.ready = False
+    await loop_lag.start()
+    # Warm up in the background so the server answers probes meanwhile;
+    # /service/ready stays 503 until it is done
+    warming = asyncio.create_task(warm_up())
+    logger.info("Application startup completed")
+    yield
+    warming.cancel()
+    await asyncio.gather(warming, return_exceptions=True)
+    await prober.close()
+    await manager.close()
+    await location_controller.service.close()
+    await telemetry.close()
+    await latency_tracker.close()
+    await partition_maintainer.close()
+    await loop_lag.close()
+    logger.info("Application shutdown completed")
+
+app = FastAPI(lifespan=lifespan)
+
+# Rate limiting configuration
+limiter = Limiter(key_func=get_remote_address)
+app.state.limiter = limiter
+app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+
+# CORS middleware
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+# Trusted hosts middleware
+app.add_middleware(
+    TrustedHostMiddleware,
+    allowed_hosts=["*"]  # Production'da spesifik host'lar belirtilmeli
+)
+
+# Request timing, metrics and logging (pure ASGI, added last so it runs first)
+app.add_middleware(RequestLoggingMiddleware)
+
+# Include routers
+app.include_router(location_router, prefix="/service", tags=["location"])
+app.include_router(devops_router, prefix="/service/devops", tags=["devops"])
+
+manager = ConnectionManager(backplane=create_backplane())
+# Stored locations are pushed to clients whose geofences contain them
+location_controller.service.location_listeners.append(manager.publish_location)
+# Sampled request telemetry and latency sketches go through the same database backend
+telemetry.repository = location_controller.service.repository
+latency_tracker.repository = location_controller.service.repository
+# Creates requests partitions ahead of time and drops expired ones
+partition_maintainer.repository = location_controller.service.repository
+prober.repository = location_controller.service.repository
+prober.manager = manager
+prober.loop_lag = loop_lag
+
+# Prometheus scrape endpoint, HTTP metrics come from RequestLoggingMiddleware.
+# Under src.server this aggregates every worker.
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    content, content_type = render_metrics()
+    return Response(content, media_type=content_type)
+
+def websocket_connection_total() -> int:
+    # Each worker only knows its own clients
+    if multiprocess_enabled():
+        total = gauge_total("websocket_connections_active")
+        if total is not None:
+            return int(total)
+    return manager.connection_count
+
+@app.get("/service")
+@limiter.limit("100/minute")
+async def service_status(request: Request):
+    logger.info("Service status endpoint accessed")
+    return {
+        "message": "Service is running",
+        "websocket_connections": websocket_connection_total(),
+        "health": prober.status["status"],
+        "uptime": time() - app.start_time if hasattr(app, 'start_time') else 0
+    }
+
+@app.get("/service/ready")
+async def service_ready():
+    # Readiness probe: pools are open and pre-warmed and the last health
+    # probe reached the database. Answered from the prober's cache.
+    if not getattr(app.state, "ready", False):
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    if not prober.database_ok:
+        return JSONResponse(status_code=503, content={"status": "unavailable", "health": prober.status["status"]})
+    return {"status": "ready"}
+
+@app.get("/service/live")
+async def service_live():
+    # Liveness probe: the event loop answers and the health prober keeps
+    # running. Dependencies being down is a readiness matter.
+    if not prober.alive():
+        return JSONResponse(status_code=503, content={"status": "stuck"})
+    return {"status": "alive"}
+
+def parse_command(data):
+    # {"action": ...} messages manage geofence subscriptions, anything else
+    # is broadcast as before. MessagePack frames arrive already decoded.
+    if isinstance(data, dict):
+        return data if "action" in data else None
+    if not data.startswith("{"):
+        return None
+    try:
+        command = json.loads(data)
+    except ValueError:
+        return None
+    return command if isinstance(command, dict) and "action" in command else None
+
+@app.websocket("/service/stream")
+async def websocket_endpoint(websocket: WebSocket):
+    try:
+        protocol = ws_protocol.negotiate(websocket.scope, websocket.query_params)
+    except ValueError as e:
+        logger.warning("WebSocket protocol rejected", extra={"error": str(e)})
+        # 1008 = "policy violation", sent as a 403 before the handshake
+        await websocket.close(code=1008)
+        return
+    await manager.connect(websocket, protocol)
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            try:
+                data = ws_protocol.decode_frame(message)
+            except ValueError as e:
+                await manager.send_json(websocket, {"event": "error", "detail": str(e)})
+                continue
+            logger.debug("WebSocket received data", extra={
+                "data": data
+            })
+            command = parse_command(data)
+            if command is not None:
+                await manager.handle_command(websocket, command)
+                continue
+            if not isinstance(data, str):
+                await manager.send_json(websocket, {"event": "error", "detail": "expected a command or a string"})
+                continue
+            await manager.broadcast(f"Received data: {data}")
+    except WebSocketDisconnect:
+        manager.disconnect(websocket)
+    except Exception as e:
+        logger.error("WebSocket error", extra={
+            "error": str(e)
+        })
+        manager.disconnect(websocket)
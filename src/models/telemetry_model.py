@@ -0,0 +1,22 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Dict, List, Optional
+
+class RouteTelemetry(BaseModel):
+    method: str
+    route: str
+    # Sampled requests, divide by sample_rate for an estimate of the total
+    samples: int
+    errors: int
+    # Seconds, keyed by percentile ("p50", "p99", ...)
+    process_time: Dict[str, Optional[float]]
+    db_time: Dict[str, Optional[float]]
+    # Bytes; process-wide deltas, see TelemetryCollector
+    memory_usage_avg: Optional[float]
+    allocated_bytes_avg: Optional[float]
+
+class TelemetryReport(BaseModel):
+    since: datetime
+    until: datetime
+    sample_rate: float
+    routes: List[RouteTelemetry]
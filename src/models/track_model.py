@@ -0,0 +1,30 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Dict, List, Optional
+
+class LatencyWindow(BaseModel):
+    requests: int
+    # Requests per second over the window
+    throughput: float
+    # Share of requests answered with a 5xx
+    error_rate: float
+    # Seconds, keyed by percentile ("p50", "p95", "p99"), empty without requests
+    latency: Dict[str, float]
+
+class RouteLatencyWindow(LatencyWindow):
+    method: str
+    route: str
+
+class TrackWindow(LatencyWindow):
+    routes: List[RouteLatencyWindow]
+
+class TrackStatus(BaseModel):
+    track_id: str
+    # "active" if any worker served requests in the last minute, else "idle"
+    status: str
+    replicas: int
+    workers: int
+    # Start of the oldest worker that served requests in the last minute
+    last_deployment: Optional[datetime]
+    # Keyed by window: "1m", "5m", "1h"
+    windows: Dict[str, TrackWindow]
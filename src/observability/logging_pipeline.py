@@ -0,0 +1,216 @@
+import atexit
+import contextvars
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from time import monotonic
+from prometheus_client import Counter
+from pythonjsonlogger import jsonlogger
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Hard cap on bytes written per second, 0 disables it
+LOG_MAX_BYTES_PER_SEC = int(os.getenv("LOG_MAX_BYTES_PER_SEC", "1048576"))
+# Share of requests whose INFO/DEBUG records are kept, e.g.
+# "/service/submit=0.1,/service/request-=0.01"; the longest matching path
+# prefix wins and everything else uses LOG_SAMPLE_DEFAULT
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+LOG_SAMPLE_DEFAULT = float(os.getenv("LOG_SAMPLE_DEFAULT", "1.0"))
+# Records held back per unsampled request in case it ends in an error
+LOG_ERROR_CONTEXT_RECORDS = int(os.getenv("LOG_ERROR_CONTEXT_RECORDS", "50"))
+
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s %(message)s'
+
+LOG_RECORDS_DROPPED = Counter(
+    'log_records_dropped_total',
+    'Log records that were not written',
+    ['reason']
+)
+
+LOG_BYTES_WRITTEN = Counter(
+    'log_bytes_written_total',
+    'Bytes of log output written'
+)
+
+class OrjsonFormatter(jsonlogger.JsonFormatter):
+    """Same output as JsonFormatter, serialized with orjson when available."""
+
+    def jsonify_log_record(self, log_record):
+        if orjson is None:
+            return super().jsonify_log_record(log_record)
+        return orjson.dumps(log_record, default=str).decode()
+
+def parse_sample_rates(spec: str) -> list:
+    """Parse ``prefix=rate`` pairs into (prefix, rate), longest prefix first."""
+    rates = []
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        prefix, _, rate = item.rpartition("=")
+        if not prefix:
+            raise ValueError(f"Invalid LOG_SAMPLE_RATES entry: {item}")
+        rates.append((prefix.strip(), float(rate)))
+    return sorted(rates, key=lambda entry: len(entry[0]), reverse=True)
+
+class _RequestSample:
+    __slots__ = ("sampled", "held")
+
+    def __init__(self, sampled: bool):
+        self.sampled = sampled
+        self.held = []
+
+_current_sample = contextvars.ContextVar("log_sample", default=None)
+
+class RequestSampler:
+    """Decides per request whether its low-severity records are logged.
+
+    Records at WARNING and above are always kept. INFO/DEBUG records of an
+    unsampled request are held back (up to ``max_held``) and only written if
+    the request ends in an error, so failures keep their context.
+    """
+
+    def __init__(self, rates: list = None, default_rate: float = None,
+                 max_held: int = None, rng=random.random):
+        self.rates = parse_sample_rates(LOG_SAMPLE_RATES) if rates is None else rates
+        self.default_rate = LOG_SAMPLE_DEFAULT if default_rate is None else default_rate
+        self.max_held = LOG_ERROR_CONTEXT_RECORDS if max_held is None else max_held
+        self.rng = rng
+        self.handler = None
+
+    def rate_for(self, path: str) -> float:
+        for prefix, rate in self.rates:
+            if path.startswith(prefix):
+                return rate
+        return self.default_rate
+
+    def begin(self, path: str):
+        rate = self.rate_for(path)
+        sampled = rate >= 1 or (rate > 0 and self.rng() < rate)
+        return _current_sample.set(_RequestSample(sampled))
+
+    def end(self, token, error: bool = False):
+        sample = _current_sample.get()
+        _current_sample.reset(token)
+        if sample is None or not sample.held:
+            return
+        if error and self.handler is not None:
+            for record in sample.held:
+                self.handler.enqueue(record)
+        else:
+            LOG_RECORDS_DROPPED.labels(reason="sampled").inc(len(sample.held))
+        sample.held = []
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        sample = _current_sample.get()
+        if sample is None or sample.sampled:
+            return True
+        if len(sample.held) < self.max_held:
+            self.handler.prepare(record)
+            sample.held.append(record)
+        else:
+            LOG_RECORDS_DROPPED.labels(reason="sampled").inc()
+        return False
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks the caller and leaves formatting to the listener."""
+
+    def prepare(self, record: logging.LogRecord):
+        # The stock prepare() formats the whole record here; only merge the
+        # args so the record no longer references caller-owned objects
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.labels(reason="queue_full").inc()
+
+class RateLimitedStreamHandler(logging.StreamHandler):
+    """StreamHandler with a token bucket on the number of bytes written."""
+
+    def __init__(self, stream=None, max_bytes_per_sec: int = None, clock=monotonic):
+        super().__init__(stream)
+        self.max_bytes_per_sec = LOG_MAX_BYTES_PER_SEC if max_bytes_per_sec is None else max_bytes_per_sec
+        self.clock = clock
+        self._tokens = float(self.max_bytes_per_sec)
+        self._last_refill = clock()
+
+    def _allow(self, size: int) -> bool:
+        if not self.max_bytes_per_sec:
+            return True
+        now = self.clock()
+        self._tokens = min(float(self.max_bytes_per_sec),
+                           self._tokens + (now - self._last_refill) * self.max_bytes_per_sec)
+        self._last_refill = now
+        if size > self._tokens:
+            return False
+        self._tokens -= size
+        return True
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            msg = self.format(record) + self.terminator
+            # The cap and the counter are in bytes; orjson leaves non-ASCII text unescaped
+            size = len(msg.encode("utf-8"))
+            if not self._allow(size):
+                LOG_RECORDS_DROPPED.labels(reason="rate_limit").inc()
+                return
+            self.stream.write(msg)
+            self.flush()
+            LOG_BYTES_WRITTEN.inc(size)
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+_listener = None
+_lock = threading.Lock()
+sampler = RequestSampler()
+
+def configure_logging(stream=None, level: str = None):
+    """Route the root logger through a background queue listener.
+
+    The calling thread only filters and enqueues records; JSON formatting, the
+    byte-rate cap and the write to ``stream`` happen on the listener thread.
+    """
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return _listener
+        output = RateLimitedStreamHandler(stream or sys.stdout)
+        output.setFormatter(OrjsonFormatter(fmt=LOG_FORMAT))
+
+        handler = NonBlockingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+        handler.addFilter(sampler)
+        sampler.handler = handler
+
+        root = logging.getLogger()
+        root.addHandler(handler)
+        root.setLevel(level or LOG_LEVEL)
+
+        _listener = QueueListener(handler.queue, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+        return _listener
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,61 @@
+import asyncio
+import logging
+import os
+from prometheus_client import Histogram
+
+logger = logging.getLogger(__name__)
+
+# How often the event loop is checked; blocks shorter than this can be missed
+LOOP_LAG_INTERVAL_MS = float(os.getenv("LOOP_LAG_INTERVAL_MS", "100"))
+# Blocks at least this long are also logged
+LOOP_LAG_WARN_MS = float(os.getenv("LOOP_LAG_WARN_MS", "250"))
+
+EVENT_LOOP_LAG = Histogram(
+    'event_loop_lag_seconds',
+    'How late the event loop woke a timer, i.e. how long it was blocked',
+    buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5)
+)
+
+class LoopLagMonitor:
+    """Measures how long the event loop is blocked.
+
+    A task sleeps for ``interval`` seconds at a time and records how much
+    later than asked it woke up. On an idle loop that is close to zero; code
+    that blocks the loop (synchronous I/O, heavy CPU work in a handler) shows
+    up as lag in the histogram, and POST /service/devops/profile shows where.
+    """
+
+    def __init__(self, interval: float = None, warn_after: float = None):
+        self.interval = LOOP_LAG_INTERVAL_MS / 1000 if interval is None else interval
+        self.warn_after = LOOP_LAG_WARN_MS / 1000 if warn_after is None else warn_after
+        self.peak = 0.0
+        self._task = None
+
+    def take_peak(self) -> float:
+        """Longest lag seen since the previous call."""
+        peak, self.peak = self.peak, 0.0
+        return peak
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            EVENT_LOOP_LAG.observe(lag)
+            if lag > self.peak:
+                self.peak = lag
+            if lag >= self.warn_after:
+                logger.warning(f"Event loop was blocked for {lag * 1000:.0f}ms")
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+monitor = LoopLagMonitor()
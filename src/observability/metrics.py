@@ -0,0 +1,30 @@
+import os
+from prometheus_client import REGISTRY, CollectorRegistry, CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client import multiprocess
+
+def multiprocess_enabled() -> bool:
+    # Set by src.server before the workers are forked
+    return bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+def collect_registry():
+    """Registry to expose: the live one, or an aggregate over all workers."""
+    if not multiprocess_enabled():
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+def render_metrics():
+    return generate_latest(collect_registry()), CONTENT_TYPE_LATEST
+
+def gauge_total(name: str):
+    """Sum of a gauge over every live worker, or None if it is not exported."""
+    found = False
+    total = 0.0
+    for family in collect_registry().collect():
+        if family.name != name:
+            continue
+        for sample in family.samples:
+            found = True
+            total += sample.value
+    return total if found else None
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import os
+from time import time
+from prometheus_client import Counter, Histogram
+from .logging_pipeline import sampler as log_sampler
+from .telemetry import collector as telemetry
+from .sketches import tracker as latency_tracker
+
+logger = logging.getLogger(__name__)
+
+def parse_buckets(spec: str) -> tuple:
+    if not spec.strip():
+        return Histogram.DEFAULT_BUCKETS
+    return tuple(sorted(float(bucket) for bucket in spec.split(",") if bucket.strip()))
+
+# Comma separated upper bounds in seconds, e.g. "0.005,0.01,0.05,0.1,0.5,1"
+HTTP_LATENCY_BUCKETS = parse_buckets(os.getenv("HTTP_LATENCY_BUCKETS", ""))
+
+# Label for requests no route matched (404s, scanners), so arbitrary paths
+# cannot create new series
+UNMATCHED_ROUTE = "<unmatched>"
+KNOWN_METHODS = frozenset(("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS", "WS"))
+
+REQUEST_COUNT = Counter(
+    'http_requests_total',
+    'Total number of HTTP requests',
+    ['method', 'endpoint', 'status']
+)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds',
+    'HTTP request duration in seconds',
+    ['method', 'endpoint'],
+    buckets=HTTP_LATENCY_BUCKETS
+)
+
+ERROR_COUNT = Counter(
+    'http_errors_total',
+    'Total number of HTTP errors',
+    ['type']
+)
+
+# Method label used for WebSocket sessions
+WEBSOCKET_METHOD = "WS"
+
+def route_template(scope) -> str:
+    """The matched route's path template, e.g. ``/service/request-{request_id}``."""
+    route = scope.get("route")
+    return getattr(route, "path_format", None) or UNMATCHED_ROUTE
+
+# Request each running task is serving, so the stack sampler can tell which
+# route the event loop was busy with; the task's own context is not readable
+# from another thread
+active_requests = {}
+
+def active_route(task) -> str:
+    """``METHOD /route/template`` of the request ``task`` serves, or None."""
+    request = active_requests.get(task)
+    if request is None:
+        return None
+    method, scope = request
+    return f"{method} {route_template(scope)}"
+
+class RequestLoggingMiddleware:
+    """Times, counts and logs every HTTP request and WebSocket session.
+
+    A plain ASGI middleware: it observes the ``http.response.start`` /
+    ``http.response.body`` messages the app sends instead of wrapping the
+    response like ``BaseHTTPMiddleware``, so streaming responses and
+    background tasks pass through untouched and no extra task is spawned.
+    The request counts as completed when the last body chunk is sent.
+
+    Metrics are labelled with the matched route template rather than the raw
+    path, and the label children are bound once per (method, route, status)
+    and reused, so the hot path is a single dict lookup. Every HTTP request
+    is also counted in its route's latency sketch, and a sampled share is
+    handed to the telemetry collector.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._children = {}
+
+    def _metrics_for(self, method: str, endpoint: str, status: int):
+        key = (method, endpoint, status)
+        children = self._children.get(key)
+        if children is None:
+            children = (
+                REQUEST_COUNT.labels(method=method, endpoint=endpoint, status=status),
+                REQUEST_LATENCY.labels(method=method, endpoint=endpoint),
+                latency_tracker.route(method, endpoint)
+            )
+            self._children[key] = children
+        return children
+
+    async def __call__(self, scope, receive, send):
+        scope_type = scope["type"]
+        if scope_type == "http":
+            method = scope["method"]
+            if method not in KNOWN_METHODS:
+                method = "other"
+        elif scope_type == "websocket":
+            method = WEBSOCKET_METHOD
+        else:
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time()
+        endpoint = scope["path"]
+        client = scope.get("client")
+        sample_token = log_sampler.begin(endpoint)
+        telemetry_sample = telemetry.begin(method, scope["headers"]) if scope_type == "http" else None
+        status_code = None
+        completed = False
+        task = asyncio.current_task()
+        active_requests[task] = (method, scope)
+
+        logger.info("Incoming request", extra={
+            "method": method,
+            "endpoint": endpoint,
+            "client_ip": client[0] if client else None
+        })
+
+        def complete(status: int):
+            nonlocal completed
+            completed = True
+            duration = time() - start_time
+            route = route_template(scope)
+            request_count, request_latency, route_sketch = self._metrics_for(method, route, status)
+            request_count.inc()
+            if scope_type == "http":
+                request_latency.observe(duration)
+                route_sketch.record(duration, status >= 500, start_time + duration)
+            logger.info("Request completed", extra={
+                "method": method,
+                "endpoint": endpoint,
+                "route": route,
+                "status_code": status,
+                "duration": duration
+            })
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            message_type = message["type"]
+            if message_type == "http.response.start":
+                status_code = message["status"]
+            elif message_type == "websocket.accept":
+                status_code = 101
+            elif message_type == "websocket.close" and status_code is None:
+                # Closed before the handshake completed, i.e. rejected
+                status_code = 403
+            await send(message)
+            if message_type == "http.response.body" and not message.get("more_body", False):
+                complete(status_code)
+
+        failed = False
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            failed = True
+            ERROR_COUNT.labels(type=type(e).__name__).inc()
+            logger.error("Request failed", extra={
+                "method": method,
+                "endpoint": endpoint,
+                "error": str(e)
+            })
+            raise
+        finally:
+            active_requests.pop(task, None)
+            if not failed and not completed and status_code is not None:
+                # WebSocket sessions, or a response the app never finished
+                complete(status_code)
+            elif failed and scope_type == "http":
+                # Answered with a 500 further out, by ServerErrorMiddleware
+                duration = time() - start_time
+                self._metrics_for(method, route_template(scope), 500)[2].record(duration, True, start_time + duration)
+            log_sampler.end(sample_token, error=failed or (status_code or 0) >= 500)
+            if telemetry_sample is not None:
+                status = 500 if failed or status_code is None else status_code
+                telemetry.finish(telemetry_sample, route_template(scope), status, error=status >= 500)
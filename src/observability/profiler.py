@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+from collections import Counter
+from time import monotonic
+from .middleware import active_route
+
+logger = logging.getLogger(__name__)
+
+# Time between two samples of every thread's stack
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "10"))
+# Longest profile POST /service/devops/profile may ask for
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+# Frames kept per stack, counted from the innermost one
+PROFILE_MAX_DEPTH = int(os.getenv("PROFILE_MAX_DEPTH", "256"))
+
+# Tag of event loop stacks that belong to no request (callbacks, background tasks)
+NO_REQUEST = "<no request>"
+
+class ProfilerBusy(Exception):
+    """A profile is already being taken in this process."""
+
+def _path_prefixes() -> list:
+    return sorted({os.path.join(path, "") for path in sys.path if path}, key=len, reverse=True)
+
+class StackSampler:
+    """Samples the stack of every thread at a fixed interval.
+
+    Sampling runs on its own thread, so code that blocks the event loop is
+    caught in the act. The event loop thread's stacks are tagged with the
+    method and route of the request task running at that moment; other
+    threads are tagged with their name. The result is in the collapsed
+    format flamegraph.pl, inferno and speedscope read: one
+    ``frame;frame;... count`` line per distinct stack, outermost frame first.
+    """
+
+    def __init__(self, interval: float = None, max_depth: int = None):
+        self.interval = PROFILE_INTERVAL_MS / 1000 if interval is None else interval
+        self.max_depth = max_depth or PROFILE_MAX_DEPTH
+        self._lock = threading.Lock()
+
+    async def run(self, seconds: float, interval: float = None) -> str:
+        """Profile this process for ``seconds`` and return the collapsed stacks."""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("A profile is already running")
+        loop = asyncio.get_running_loop()
+        loop_thread = threading.get_ident()
+        done = loop.create_future()
+        stop = threading.Event()
+
+        def finish(callback, value):
+            if not done.done():
+                callback(value)
+
+        def target():
+            try:
+                stacks = self.sample(seconds, loop, loop_thread, stop, interval)
+            except Exception as error:
+                loop.call_soon_threadsafe(finish, done.set_exception, error)
+            else:
+                loop.call_soon_threadsafe(finish, done.set_result, stacks)
+            finally:
+                self._lock.release()
+
+        try:
+            threading.Thread(target=target, name="stack-sampler", daemon=True).start()
+        except BaseException:
+            self._lock.release()
+            raise
+        try:
+            stacks = await done
+        finally:
+            # A client that gave up stops the sampler too
+            stop.set()
+        return collapse(stacks)
+
+    def sample(self, seconds: float, loop=None, loop_thread: int = None,
+               stop: threading.Event = None, interval: float = None) -> Counter:
+        """Count stacks for ``seconds``; blocks the calling thread, which is left out."""
+        stop = stop or threading.Event()
+        interval = interval or self.interval
+        own = threading.get_ident()
+        labels = {}
+        prefixes = _path_prefixes()
+        stacks = Counter()
+        deadline = monotonic() + seconds
+        while not stop.is_set():
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                tags = (names.get(ident, f"thread-{ident}"),)
+                if ident == loop_thread and loop is not None:
+                    tags += (active_route(asyncio.current_task(loop)) or NO_REQUEST,)
+                stacks[tags + self._frames(frame, labels, prefixes)] += 1
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                break
+            stop.wait(min(interval, remaining))
+        return stacks
+
+    def _frames(self, frame, labels: dict, prefixes: list) -> tuple:
+        frames = []
+        while frame is not None and len(frames) < self.max_depth:
+            code = frame.f_code
+            label = labels.get(code)
+            if label is None:
+                path = code.co_filename
+                for prefix in prefixes:
+                    if path.startswith(prefix):
+                        path = path[len(prefix):]
+                        break
+                name = getattr(code, "co_qualname", code.co_name)
+                # ';' separates frames in the collapsed format
+                label = labels[code] = f"{name} ({path}:{code.co_firstlineno})".replace(";", ":")
+            frames.append(label)
+            frame = frame.f_back
+        frames.reverse()
+        return tuple(frames)
+
+def collapse(stacks: Counter) -> str:
+    return "".join(f"{';'.join(stack)} {count}\n" for stack, count in stacks.most_common())
+
+profiler = StackSampler()
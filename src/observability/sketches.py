@@ -0,0 +1,281 @@
+import asyncio
+import logging
+import math
+import os
+import socket
+from array import array
+from datetime import datetime, timezone
+from time import time
+
+logger = logging.getLogger(__name__)
+
+# Release track this replica belongs to, e.g. "stable" or "canary"; the
+# track-status endpoint merges every worker of every replica on a track
+DEPLOYMENT_TRACK = os.getenv("DEPLOYMENT_TRACK", "stable")
+# How often each worker writes its sketches to the latency_sketches table
+SKETCH_PUBLISH_SECONDS = float(os.getenv("SKETCH_PUBLISH_SECONDS", "10"))
+
+# Bucket layout, shared by every worker so their sketches can be added up:
+# logarithmic buckets that keep percentiles within 2% of the true latency
+# between SKETCH_MIN_SECONDS and SKETCH_MAX_SECONDS (outliers are clamped)
+SKETCH_RELATIVE_ACCURACY = 0.02
+SKETCH_MIN_SECONDS = 5e-5
+SKETCH_MAX_SECONDS = 120.0
+_GAMMA = (1 + SKETCH_RELATIVE_ACCURACY) / (1 - SKETCH_RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+SKETCH_BUCKETS = math.ceil(math.log(SKETCH_MAX_SECONDS / SKETCH_MIN_SECONDS) / _LOG_GAMMA) + 1
+
+# (slot width, slots) of the rings every route is counted in: 10s slots
+# for the last five minutes, one minute slots for the last hour
+RESOLUTIONS = ((10, 30), (60, 60))
+# Reported sliding windows: name, seconds, slot width they are summed from
+WINDOWS = (("1m", 60, 10), ("5m", 300, 10), ("1h", 3600, 60))
+SKETCH_PERCENTILES = (0.5, 0.95, 0.99)
+
+_ZEROS = array("I", bytes(4 * SKETCH_BUCKETS))
+
+def bucket_index(seconds: float) -> int:
+    if seconds <= SKETCH_MIN_SECONDS:
+        return 0
+    index = math.ceil(math.log(seconds / SKETCH_MIN_SECONDS) / _LOG_GAMMA)
+    return index if index < SKETCH_BUCKETS else SKETCH_BUCKETS - 1
+
+def bucket_value(index: int) -> float:
+    """Latency a bucket stands for, within the relative accuracy of all it holds."""
+    if index <= 0:
+        return SKETCH_MIN_SECONDS
+    return SKETCH_MIN_SECONDS * _GAMMA ** index * 2 / (_GAMMA + 1)
+
+class SlotRing:
+    """Histograms of the last ``size`` time slots of ``width`` seconds each.
+
+    All memory is allocated up front; a slot is zeroed in place when the
+    ring wraps around to it.
+    """
+
+    __slots__ = ("width", "size", "epochs", "buckets", "requests", "errors", "dirty")
+
+    def __init__(self, width: int, size: int):
+        self.width = width
+        self.size = size
+        self.epochs = [-1] * size
+        self.buckets = [array("I", _ZEROS) for _ in range(size)]
+        self.requests = array("Q", bytes(8 * size))
+        self.errors = array("Q", bytes(8 * size))
+        # Slots changed since they were last published
+        self.dirty = bytearray(size)
+
+    def record(self, now: float, index: int, error: bool):
+        epoch = int(now // self.width)
+        slot = epoch % self.size
+        if self.epochs[slot] != epoch:
+            if epoch < self.epochs[slot]:
+                # Finished more than a full ring ago, e.g. the clock stepped back
+                return
+            self.epochs[slot] = epoch
+            self.buckets[slot][:] = _ZEROS
+            self.requests[slot] = 0
+            self.errors[slot] = 0
+        self.buckets[slot][index] += 1
+        self.requests[slot] += 1
+        if error:
+            self.errors[slot] += 1
+        self.dirty[slot] = 1
+
+class RouteSketch:
+    """Latency, throughput and errors of one method and route in this worker."""
+
+    __slots__ = ("method", "route", "rings")
+
+    def __init__(self, method: str, route: str):
+        self.method = method
+        self.route = route
+        self.rings = tuple(SlotRing(width, size) for width, size in RESOLUTIONS)
+
+    def record(self, seconds: float, error: bool, now: float):
+        """Count one request; constant time, nothing but small ints allocated."""
+        index = bucket_index(seconds)
+        for ring in self.rings:
+            ring.record(now, index, error)
+
+def _quantiles(counts, total: int) -> dict:
+    cumulative = counts.cumsum()
+    values = {}
+    for fraction in SKETCH_PERCENTILES:
+        index = int((cumulative > fraction * (total - 1)).argmax())
+        values[f"p{fraction * 100:g}"] = bucket_value(index)
+    return values
+
+class LatencyTracker:
+    """Mergeable per-route latency sketches over sliding windows.
+
+    ``RequestLoggingMiddleware`` records every HTTP request into the sketch
+    of its route: log-spaced bucket counts per time slot, so an update is a
+    few array increments and memory is fixed by the route table. Every
+    ``publish_interval`` seconds the slots that changed are upserted into the
+    latency_sketches table, one row per worker, route and slot. Sketches add
+    up bucket by bucket, so ``track_status`` can merge every worker of every
+    replica on a track into fleet-wide percentiles.
+    """
+
+    def __init__(self, repository=None, track: str = None, publish_interval: float = None):
+        self.repository = repository
+        self.track = track or DEPLOYMENT_TRACK
+        self.publish_interval = SKETCH_PUBLISH_SECONDS if publish_interval is None else publish_interval
+        self.worker = None
+        self.started_at = None
+        self._routes = {}
+        self._task = None
+
+    def route(self, method: str, route: str) -> RouteSketch:
+        key = (method, route)
+        sketch = self._routes.get(key)
+        if sketch is None:
+            sketch = self._routes[key] = RouteSketch(method, route)
+        return sketch
+
+    def snapshot(self, now: float = None) -> tuple:
+        """Rows of the slots changed since the last snapshot, and what they came from."""
+        # Imported here to keep numpy off the startup path
+        import numpy as np
+
+        now = time() if now is None else now
+        rows = []
+        taken = []
+        for sketch in self._routes.values():
+            for ring in sketch.rings:
+                oldest = int(now // ring.width) - ring.size
+                for slot in range(ring.size):
+                    if not ring.dirty[slot]:
+                        continue
+                    ring.dirty[slot] = 0
+                    epoch = ring.epochs[slot]
+                    if epoch <= oldest:
+                        continue
+                    counts = np.frombuffer(ring.buckets[slot], dtype=np.uint32)
+                    # Stored sparse, a route's latencies span few buckets
+                    indexes = counts.nonzero()[0]
+                    rows.append((self.track, self.worker, self.started_at, sketch.method, sketch.route,
+                                 ring.width, epoch * ring.width, ring.requests[slot], ring.errors[slot],
+                                 indexes.tolist(), counts[indexes].tolist()))
+                    taken.append((ring, slot))
+        return rows, taken
+
+    async def start(self):
+        # Named after the forked worker, not the process that imported this
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+        self.started_at = time()
+        if self._task is None and self.publish_interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.publish_interval)
+            try:
+                await self.publish()
+            except Exception as error:
+                logger.error(f"Error publishing latency sketches: {error}")
+
+    async def publish(self, now: float = None) -> int:
+        """Write the changed slots and expire old ones; returns the rows written."""
+        if self.repository is None or self.worker is None:
+            return 0
+        now = time() if now is None else now
+        rows, taken = self.snapshot(now)
+        if not rows:
+            return 0
+        if not await self.repository.write_sketches(rows, retention_params(now)):
+            # Published again with the next batch
+            for ring, slot in taken:
+                ring.dirty[slot] = 1
+            return 0
+        return len(rows)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await self.publish()
+        except Exception as error:
+            logger.error(f"Error publishing latency sketches: {error}")
+
+    async def track_status(self, track: str = None, now: float = None) -> dict:
+        """Fleet-wide latency, throughput and error rate of ``track``.
+
+        Raises LookupError if no worker on the track served a request in the
+        last hour. Numbers lag by up to ``publish_interval`` seconds.
+        """
+        import numpy as np
+
+        track = track or self.track
+        now = time() if now is None else now
+        rows = await self.repository.read_sketches(track, *read_params(now))
+        if rows is None:
+            raise RuntimeError("Failed to query latency sketches")
+        if not rows:
+            raise LookupError(f"No requests on track {track} in the last hour")
+
+        windows = {}
+        for name, seconds, width in WINDOWS:
+            # Whole slots that started inside the window, the current one included
+            first = math.ceil((now - seconds) / width) * width
+            covered = max(now - first, 1e-9)
+            routes = {}
+            for worker, started_at, method, route, row_width, slot, requests, errors, indexes, counts in rows:
+                if row_width != width or slot < first:
+                    continue
+                merged = routes.get((method, route))
+                if merged is None:
+                    merged = routes[(method, route)] = [np.zeros(SKETCH_BUCKETS, dtype=np.int64), 0, 0]
+                np.add.at(merged[0], indexes, counts)
+                merged[1] += requests
+                merged[2] += errors
+
+            def stats(counts, requests, errors):
+                return {
+                    "requests": requests,
+                    "throughput": requests / covered,
+                    "error_rate": errors / requests if requests else 0.0,
+                    "latency": _quantiles(counts, requests) if requests else {}
+                }
+
+            total = [np.zeros(SKETCH_BUCKETS, dtype=np.int64), 0, 0]
+            for counts, requests, errors in routes.values():
+                total[0] += counts
+                total[1] += requests
+                total[2] += errors
+            windows[name] = dict(stats(*total), routes=[
+                dict(method=method, route=route, **stats(*merged))
+                for (method, route), merged in sorted(routes.items(), key=lambda item: -item[1][1])
+            ])
+
+        # Workers that served requests in the most recent window
+        _, seconds, width = WINDOWS[0]
+        first = math.ceil((now - seconds) / width) * width
+        recent = {row[0]: row[1] for row in rows if row[4] == width and row[5] >= first}
+        started = min(recent.values(), default=None)
+        return {
+            "track_id": track,
+            "status": "active" if recent else "idle",
+            "replicas": len({worker.rpartition(":")[0] for worker in recent}),
+            "workers": len(recent),
+            "last_deployment": datetime.fromtimestamp(started, timezone.utc) if started is not None else None,
+            "windows": windows
+        }
+
+def read_params(now: float) -> tuple:
+    """Slot widths and, per width, the first slot start the windows need."""
+    widths = [width for width, _ in RESOLUTIONS]
+    since = [int(now) - max(seconds for _, seconds, window_width in WINDOWS if window_width == width) - width
+             for width in widths]
+    return widths, since
+
+def retention_params(now: float) -> tuple:
+    """Slot widths and, per width, the slot start before which rows are deleted."""
+    widths = [width for width, _ in RESOLUTIONS]
+    before = [int(now) - (size + 1) * width for width, size in RESOLUTIONS]
+    return widths, before
+
+tracker = LatencyTracker()
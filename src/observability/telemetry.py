@@ -0,0 +1,210 @@
+import asyncio
+import contextvars
+import logging
+import os
+import random
+import tracemalloc
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from time import monotonic
+from prometheus_client import Counter
+
+logger = logging.getLogger(__name__)
+
+# Share of HTTP requests sampled into the metrics table, 0 disables telemetry
+# (and the database timing hooks it needs)
+TELEMETRY_SAMPLE_RATE = float(os.getenv("TELEMETRY_SAMPLE_RATE", "0"))
+# Samples held between flushes; the oldest are overwritten if writes fall behind
+TELEMETRY_BUFFER_SIZE = int(os.getenv("TELEMETRY_BUFFER_SIZE", "10000"))
+TELEMETRY_FLUSH_SECONDS = float(os.getenv("TELEMETRY_FLUSH_SECONDS", "5"))
+# Samples per COPY into the metrics table
+TELEMETRY_BATCH_SIZE = int(os.getenv("TELEMETRY_BATCH_SIZE", "1000"))
+# tracemalloc makes every allocation in the process slower, so allocation
+# deltas are opt-in
+TELEMETRY_TRACE_ALLOCATIONS = os.getenv("TELEMETRY_TRACE_ALLOCATIONS", "false").lower() == "true"
+# Window of the percentile API when no start is given
+TELEMETRY_DEFAULT_WINDOW = timedelta(seconds=float(os.getenv("TELEMETRY_DEFAULT_WINDOW_SECONDS", "3600")))
+TELEMETRY_PERCENTILES = (0.5, 0.9, 0.95, 0.99)
+
+TELEMETRY_SAMPLES = Counter(
+    'telemetry_samples_total',
+    'Per-request telemetry samples by what became of them',
+    ['outcome']
+)
+
+try:
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):  # pragma: no cover - not POSIX
+    _PAGE_SIZE = 4096
+
+def rss_bytes():
+    """Resident set size of this process, None where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+def _utc(value: datetime):
+    # metrics.timestamp is a timestamp without time zone written in UTC
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def _header(headers: list, name: bytes):
+    for key, value in headers:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+class Sample:
+    """Measurements of one sampled request while it runs."""
+
+    __slots__ = ("method", "request_id", "timestamp", "start", "db_time", "rss", "allocated", "token")
+
+    def __init__(self, method: str, request_id: str = None, trace_allocations: bool = False):
+        self.method = method
+        self.request_id = request_id
+        self.timestamp = datetime.now(timezone.utc).replace(tzinfo=None)
+        self.db_time = 0.0
+        self.rss = rss_bytes()
+        self.allocated = tracemalloc.get_traced_memory()[0] if trace_allocations and tracemalloc.is_tracing() else None
+        self.token = None
+        self.start = monotonic()
+
+    def row(self, route: str, status: int, error: bool) -> tuple:
+        """The sample as a METRIC_COLUMNS row."""
+        process_time = monotonic() - self.start
+        rss = rss_bytes() if self.rss is not None else None
+        allocated = tracemalloc.get_traced_memory()[0] if self.allocated is not None else None
+        return (self.request_id, self.method, route, status, process_time, self.db_time,
+                rss - self.rss if rss is not None else None,
+                allocated - self.allocated if allocated is not None else None,
+                1 if error else 0, self.timestamp)
+
+_current_sample = contextvars.ContextVar("telemetry_sample", default=None)
+
+def add_db_time(seconds: float):
+    """Charge ``seconds`` of database time to the request being sampled, if any.
+
+    Called by the database drivers' timing hooks; threadpool calls inherit
+    the request's context, so psycopg2 queries count too.
+    """
+    sample = _current_sample.get()
+    if sample is not None:
+        sample.db_time += seconds
+
+class TelemetryCollector:
+    """Samples per-request cost and writes it to the metrics table in batches.
+
+    ``begin``/``finish`` run on the request path and only touch memory:
+    finished samples go into a ring buffer of ``buffer_size`` rows, and a
+    background task copies them into the database every ``flush_interval``
+    seconds. When the database falls behind, the oldest samples are
+    overwritten rather than slowing requests down.
+
+    RSS and allocation deltas are process-wide, so under concurrency they
+    include whatever other requests did meanwhile; they are meaningful as
+    distributions over many samples, not per request.
+    """
+
+    def __init__(self, repository=None, sample_rate: float = None, buffer_size: int = None,
+                 flush_interval: float = None, batch_size: int = None, trace_allocations: bool = None,
+                 rng=random.random):
+        self.repository = repository
+        self.sample_rate = TELEMETRY_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.flush_interval = TELEMETRY_FLUSH_SECONDS if flush_interval is None else flush_interval
+        self.batch_size = batch_size or TELEMETRY_BATCH_SIZE
+        self.trace_allocations = TELEMETRY_TRACE_ALLOCATIONS if trace_allocations is None else trace_allocations
+        self.rng = rng
+        self._buffer = deque(maxlen=buffer_size or TELEMETRY_BUFFER_SIZE)
+        self._task = None
+        self._recorded = TELEMETRY_SAMPLES.labels(outcome="recorded")
+        self._overwritten = TELEMETRY_SAMPLES.labels(outcome="overwritten")
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def begin(self, method: str, headers: list = ()):
+        """Start sampling the current request, or return None if it is not sampled."""
+        rate = self.sample_rate
+        if rate <= 0 or (rate < 1 and self.rng() >= rate):
+            return None
+        sample = Sample(method, _header(headers, b"x-request-id"), self.trace_allocations)
+        sample.token = _current_sample.set(sample)
+        return sample
+
+    def finish(self, sample: Sample, route: str, status: int, error: bool = False):
+        """Buffer the sample; must run in the context ``begin`` was called in."""
+        _current_sample.reset(sample.token)
+        if len(self._buffer) == self._buffer.maxlen:
+            self._overwritten.inc()
+        self._buffer.append(sample.row(route, status, error))
+        self._recorded.inc()
+
+    async def start(self):
+        if self.sample_rate <= 0 or self._task is not None:
+            return
+        if self.trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as error:
+                logger.error(f"Error flushing telemetry: {error}")
+
+    async def flush(self) -> int:
+        """Write buffered samples in batches and return how many were written."""
+        written = 0
+        while self._buffer and self.repository is not None:
+            batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            if not await self.repository.write_metrics(batch):
+                # Dropped rather than retried, telemetry is best effort
+                TELEMETRY_SAMPLES.labels(outcome="write_failed").inc(len(batch))
+                break
+            TELEMETRY_SAMPLES.labels(outcome="written").inc(len(batch))
+            written += len(batch)
+        return written
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def percentiles(self, since: datetime = None, until: datetime = None,
+                          route: str = None, method: str = None) -> dict:
+        """Per-route latency percentiles of the samples taken in [since, until)."""
+        # Imported here, the repositories reach this module through the database layer
+        from ..repositories.location_repository import metric_percentiles_params
+
+        until = _utc(until) or datetime.now(timezone.utc).replace(tzinfo=None)
+        since = _utc(since) or until - TELEMETRY_DEFAULT_WINDOW
+        params = metric_percentiles_params(since, until, TELEMETRY_PERCENTILES, route, method)
+        rows = await self.repository.metric_percentiles(params)
+        if rows is None:
+            raise RuntimeError("Failed to query telemetry")
+
+        def named(values):
+            return {f"p{fraction * 100:g}": value for fraction, value in zip(TELEMETRY_PERCENTILES, values or ())}
+
+        return {
+            "since": since,
+            "until": until,
+            "sample_rate": self.sample_rate,
+            "routes": [
+                {
+                    "method": method, "route": route, "samples": samples, "errors": errors,
+                    "process_time": named(process_time), "db_time": named(db_time),
+                    "memory_usage_avg": memory_usage, "allocated_bytes_avg": allocated
+                }
+                for method, route, samples, errors, process_time, db_time, memory_usage, allocated in rows
+            ]
+        }
+
+collector = TelemetryCollector()
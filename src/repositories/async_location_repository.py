@@ -0,0 +1,428 @@
+import logging
+import os
+from starlette.concurrency import run_in_threadpool, iterate_in_threadpool
+from ..database.async_connection import AsyncDatabaseConnection
+from .location_repository import (
+    LocationRepository, STORED_COLUMNS, STORED_INSERT_COLUMNS, full_row, insert_row, id_condition,
+    nearby_query, nearby_params, CLAIM_JOBS_SQL, JOB_BACKLOG_SQL, finish_statements, records_query,
+    IDEMPOTENT_INSERT_SQL, IDEMPOTENCY_KEY_OWNER_SQL, METRIC_COLUMNS, metric_percentiles_query,
+    SKETCH_COLUMNS, UPSERT_SKETCHES_SQL, EXPIRE_SKETCHES_SQL, READ_SKETCHES_SQL,
+    LIST_PARTITIONS_SQL, CREATE_PARTITION_SQL, DETACH_PARTITION_SQL, FINALIZE_DETACH_SQL, DROP_PARTITION_SQL,
+    LOCK_TIMEOUT_SQL, LOCAL_LOCK_TIMEOUT_SQL, EXPIRE_REQUEST_KEYS_SQL
+)
+
+logger = logging.getLogger(__name__)
+
+# "psycopg2" keeps the blocking driver (run in the threadpool), "asyncpg" uses
+# the native async driver.
+DB_BACKEND = os.getenv("DB_BACKEND", "psycopg2")
+
+class InvalidatingRepository:
+    """Drops status cache entries for every request id written through it.
+
+    Status transitions are also announced through ``notifier`` so that
+    clients waiting on those requests wake up.
+    """
+
+    cache = None
+    notifier = None
+
+    async def _invalidate(self, *request_ids: str):
+        if self.cache is not None and request_ids:
+            await self.cache.invalidate(*request_ids)
+
+    async def _status_changed(self, *request_ids: str):
+        await self._invalidate(*request_ids)
+        if self.notifier is not None and request_ids:
+            await self.notifier.publish(*request_ids)
+
+class AsyncLocationRepository(InvalidatingRepository):
+    """LocationRepository counterpart built on an asyncpg pool."""
+
+    def __init__(self, cache=None, notifier=None):
+        self.db = AsyncDatabaseConnection.get_instance()
+        self.cache = cache
+        self.notifier = notifier
+
+    async def open(self):
+        await self.db.get_pool()
+
+    async def ping(self) -> bool:
+        # Errors are raised, not logged: the health prober reports them
+        pool = await self.db.get_pool()
+        await pool.fetchval("SELECT 1")
+        return True
+
+    def pool_stats(self) -> dict:
+        return self.db.pool_stats()
+
+    async def create_location(self, request_id: str, location: str, status: str,
+                              coordinates: tuple = None) -> bool:
+        pool = await self.db.get_pool()
+        try:
+            await pool.execute(
+                f"INSERT INTO requests ({', '.join(STORED_INSERT_COLUMNS)}) "
+                f"VALUES ({', '.join(f'${i}' for i in range(1, len(STORED_INSERT_COLUMNS) + 1))})",
+                *insert_row(request_id, location, status, coordinates)
+            )
+            await self._invalidate(request_id)
+            return True
+        except Exception as error:
+            logger.error(f"Error in create_location: {error}")
+            return False
+
+    async def create_location_once(self, request_id: str, location: str, status: str,
+                                   coordinates: tuple, idempotency_key: str):
+        row = insert_row(request_id, location, status, coordinates) + (idempotency_key,)
+        # The key, id and created_at are the row's own last, first and second to last values
+        count = len(row)
+        pool = await self.db.get_pool()
+        try:
+            row = await pool.fetchrow(
+                IDEMPOTENT_INSERT_SQL.format(f"${count}", "$1", f"${count - 1}",
+                                             ", ".join(f"${i}" for i in range(1, count + 1))),
+                *row
+            )
+            if row is not None:
+                await self._invalidate(request_id)
+            else:
+                row = await pool.fetchrow(IDEMPOTENCY_KEY_OWNER_SQL.format("$1"), idempotency_key)
+            return tuple(row) if row else None
+        except Exception as error:
+            logger.error(f"Error in create_location_once: {error}")
+            return None
+
+    async def create_locations(self, rows: list) -> bool:
+        # COPY is both the fastest multi-row write and a single transaction
+        return await self.copy_locations(rows)
+
+    async def copy_locations(self, rows: list) -> bool:
+        pool = await self.db.get_pool()
+        try:
+            async with pool.acquire() as conn:
+                await conn.copy_records_to_table(
+                    "requests",
+                    records=[full_row(row) for row in rows],
+                    columns=list(STORED_COLUMNS)
+                )
+            await self._invalidate(*(row[0] for row in rows))
+            return True
+        except Exception as error:
+            logger.error(f"Error in copy_locations: {error}")
+            return False
+
+    async def update_response_time(self, request_id: str, response_time: float) -> bool:
+        pool = await self.db.get_pool()
+        try:
+            condition, params = id_condition(request_id, ("$2", "$3"))
+            await pool.execute(f"UPDATE requests SET response_time = $1 WHERE {condition}", response_time, *params)
+            await self._invalidate(request_id)
+            return True
+        except Exception as error:
+            logger.error(f"Error in update_response_time: {error}")
+            return False
+
+    async def get_location(self, request_id: str):
+        pool = await self.db.get_pool()
+        try:
+            condition, params = id_condition(request_id, ("$1", "$2"))
+            row = await pool.fetchrow(
+                f"SELECT id::text, location, status, created_at, updated_at, response_time FROM requests "
+                f"WHERE {condition}",
+                *params
+            )
+            return tuple(row) if row else None
+        except Exception as error:
+            logger.error(f"Error in get_location: {error}")
+            return None
+
+    async def find_nearby(self, latitude: float, longitude: float, radius_m: float,
+                          ranges: list, limit: int):
+        names = []
+
+        def placeholder(name):
+            if name not in names:
+                names.append(name)
+            return f"${names.index(name) + 1}"
+
+        query = nearby_query(placeholder, ranges)
+        params = nearby_params(latitude, longitude, radius_m, ranges, limit)
+        pool = await self.db.get_pool()
+        try:
+            rows = await pool.fetch(query, *(params[name] for name in names))
+            return [tuple(row) for row in rows]
+        except Exception as error:
+            logger.error(f"Error in find_nearby: {error}")
+            return None
+
+    async def list_requests(self, params: dict, descending: bool = False):
+        names = list(params)
+        query = records_query(lambda name: f"${names.index(name) + 1}", params, descending)
+        pool = await self.db.get_pool()
+        try:
+            rows = await pool.fetch(query, *params.values())
+            return [tuple(row) for row in rows]
+        except Exception as error:
+            logger.error(f"Error in list_requests: {error}")
+            return None
+
+    async def export_requests(self, params: dict, chunk_size: int):
+        names = list(params)
+        query = records_query(lambda name: f"${names.index(name) + 1}", params)
+        pool = await self.db.get_pool()
+        try:
+            async with pool.acquire() as conn:
+                # asyncpg cursors only exist inside a transaction
+                async with conn.transaction(readonly=True):
+                    cursor = await conn.cursor(query, *params.values())
+                    while True:
+                        rows = await cursor.fetch(chunk_size)
+                        if not rows:
+                            break
+                        yield [tuple(row) for row in rows]
+        except Exception as error:
+            logger.error(f"Error in export_requests: {error}")
+            raise
+
+    async def claim_jobs(self, limit: int, lease_seconds: float):
+        pool = await self.db.get_pool()
+        try:
+            rows = await pool.fetch(CLAIM_JOBS_SQL.format("$1", "$2"), float(lease_seconds), limit)
+            rows = [tuple(row) for row in rows]
+            await self._status_changed(*(row[0] for row in rows))
+            return rows
+        except Exception as error:
+            logger.error(f"Error in claim_jobs: {error}")
+            return None
+
+    async def finish_jobs(self, outcomes: list):
+        pool = await self.db.get_pool()
+        try:
+            ids = []
+            async with pool.acquire() as conn:
+                async with conn.transaction():
+                    for statement, params in finish_statements(outcomes):
+                        rows = await conn.fetch(statement.format(*(f"${i}" for i in range(1, 7))), *params)
+                        ids += [row[0] for row in rows]
+            await self._status_changed(*ids)
+            return ids
+        except Exception as error:
+            logger.error(f"Error in finish_jobs: {error}")
+            return None
+
+    async def job_backlog(self):
+        pool = await self.db.get_pool()
+        try:
+            row = await pool.fetchrow(JOB_BACKLOG_SQL)
+            return tuple(row)
+        except Exception as error:
+            logger.error(f"Error in job_backlog: {error}")
+            return None
+
+    async def write_metrics(self, rows: list) -> bool:
+        pool = await self.db.get_pool()
+        try:
+            async with pool.acquire() as conn:
+                await conn.copy_records_to_table("metrics", records=rows, columns=list(METRIC_COLUMNS))
+            return True
+        except Exception as error:
+            logger.error(f"Error in write_metrics: {error}")
+            return False
+
+    async def metric_percentiles(self, params: dict):
+        names = list(params)
+        query = metric_percentiles_query(lambda name: f"${names.index(name) + 1}", params)
+        pool = await self.db.get_pool()
+        try:
+            rows = await pool.fetch(query, *params.values())
+            return [tuple(row) for row in rows]
+        except Exception as error:
+            logger.error(f"Error in metric_percentiles: {error}")
+            return None
+
+    async def write_sketches(self, rows: list, retention: tuple) -> bool:
+        values = ", ".join(f"${i}" for i in range(1, len(SKETCH_COLUMNS) + 1))
+        pool = await self.db.get_pool()
+        try:
+            async with pool.acquire() as conn:
+                async with conn.transaction():
+                    await conn.executemany(UPSERT_SKETCHES_SQL.format(f"({values})"), rows)
+                    await conn.execute(EXPIRE_SKETCHES_SQL.format("$1", "$2"), *retention)
+            return True
+        except Exception as error:
+            logger.error(f"Error in write_sketches: {error}")
+            return False
+
+    async def read_sketches(self, track: str, widths: list, since: list):
+        pool = await self.db.get_pool()
+        try:
+            rows = await pool.fetch(READ_SKETCHES_SQL.format("$1", "$2", "$3"), track, widths, since)
+            return [tuple(row) for row in rows]
+        except Exception as error:
+            logger.error(f"Error in read_sketches: {error}")
+            return None
+
+    async def list_partitions(self):
+        pool = await self.db.get_pool()
+        try:
+            return [tuple(row) for row in await pool.fetch(LIST_PARTITIONS_SQL)]
+        except Exception as error:
+            logger.error(f"Error in list_partitions: {error}")
+            return None
+
+    async def create_partition(self, name: str, start, end) -> bool:
+        pool = await self.db.get_pool()
+        try:
+            async with pool.acquire() as conn:
+                async with conn.transaction():
+                    await conn.execute(LOCAL_LOCK_TIMEOUT_SQL)
+                    await conn.execute(CREATE_PARTITION_SQL.format(name, start, end))
+            return True
+        except Exception as error:
+            logger.error(f"Error in create_partition: {error}")
+            return False
+
+    async def drop_partition(self, name: str, detach_pending: bool = False) -> bool:
+        pool = await self.db.get_pool()
+        try:
+            # Outside a transaction, as DETACH ... CONCURRENTLY requires; the
+            # pool resets the lock_timeout when the connection is released
+            async with pool.acquire() as conn:
+                await conn.execute(LOCK_TIMEOUT_SQL)
+                await conn.execute((FINALIZE_DETACH_SQL if detach_pending else DETACH_PARTITION_SQL).format(name))
+                await conn.execute(DROP_PARTITION_SQL.format(name))
+            return True
+        except Exception as error:
+            logger.error(f"Error in drop_partition: {error}")
+            return False
+
+    async def expire_request_keys(self, before) -> bool:
+        pool = await self.db.get_pool()
+        try:
+            await pool.execute(EXPIRE_REQUEST_KEYS_SQL.format("$1"), before)
+            return True
+        except Exception as error:
+            logger.error(f"Error in expire_request_keys: {error}")
+            return False
+
+class ThreadedLocationRepository(InvalidatingRepository):
+    """Async facade over the blocking psycopg2 repository.
+
+    Every call is handed to the threadpool so the event loop keeps serving
+    other requests while psycopg2 waits on the network.
+    """
+
+    def __init__(self, repository: LocationRepository = None, cache=None, notifier=None):
+        self.repository = repository or LocationRepository()
+        self.cache = cache
+        self.notifier = notifier
+
+    async def open(self):
+        await run_in_threadpool(self.repository.open)
+
+    async def ping(self) -> bool:
+        return await run_in_threadpool(self.repository.ping)
+
+    def pool_stats(self) -> dict:
+        # In-memory counters, no need for the threadpool
+        return self.repository.pool_stats()
+
+    async def create_location(self, request_id: str, location: str, status: str,
+                              coordinates: tuple = None) -> bool:
+        ok = await run_in_threadpool(self.repository.create_location, request_id, location, status, coordinates)
+        if ok:
+            await self._invalidate(request_id)
+        return ok
+
+    async def create_location_once(self, request_id: str, location: str, status: str,
+                                   coordinates: tuple, idempotency_key: str):
+        row = await run_in_threadpool(self.repository.create_location_once, request_id, location, status,
+                                      coordinates, idempotency_key)
+        if row is not None and row[0] == request_id:
+            await self._invalidate(request_id)
+        return row
+
+    async def create_locations(self, rows: list) -> bool:
+        ok = await run_in_threadpool(self.repository.create_locations, rows)
+        if ok:
+            await self._invalidate(*(row[0] for row in rows))
+        return ok
+
+    async def copy_locations(self, rows: list) -> bool:
+        ok = await run_in_threadpool(self.repository.copy_locations, rows)
+        if ok:
+            await self._invalidate(*(row[0] for row in rows))
+        return ok
+
+    async def update_response_time(self, request_id: str, response_time: float) -> bool:
+        ok = await run_in_threadpool(self.repository.update_response_time, request_id, response_time)
+        if ok:
+            await self._invalidate(request_id)
+        return ok
+
+    async def get_location(self, request_id: str):
+        return await run_in_threadpool(self.repository.get_location, request_id)
+
+    async def find_nearby(self, latitude: float, longitude: float, radius_m: float,
+                          ranges: list, limit: int):
+        return await run_in_threadpool(self.repository.find_nearby, latitude, longitude,
+                                       radius_m, ranges, limit)
+
+    async def list_requests(self, params: dict, descending: bool = False):
+        return await run_in_threadpool(self.repository.list_requests, params, descending)
+
+    async def export_requests(self, params: dict, chunk_size: int):
+        chunks = self.repository.export_requests(params, chunk_size)
+        try:
+            async for rows in iterate_in_threadpool(chunks):
+                yield rows
+        finally:
+            # Hands the connection back to the pool when the client goes away early
+            await run_in_threadpool(chunks.close)
+
+    async def claim_jobs(self, limit: int, lease_seconds: float):
+        rows = await run_in_threadpool(self.repository.claim_jobs, limit, lease_seconds)
+        if rows:
+            await self._status_changed(*(row[0] for row in rows))
+        return rows
+
+    async def finish_jobs(self, outcomes: list):
+        ids = await run_in_threadpool(self.repository.finish_jobs, outcomes)
+        if ids:
+            await self._status_changed(*ids)
+        return ids
+
+    async def job_backlog(self):
+        return await run_in_threadpool(self.repository.job_backlog)
+
+    async def write_metrics(self, rows: list) -> bool:
+        return await run_in_threadpool(self.repository.write_metrics, rows)
+
+    async def metric_percentiles(self, params: dict):
+        return await run_in_threadpool(self.repository.metric_percentiles, params)
+
+    async def write_sketches(self, rows: list, retention: tuple) -> bool:
+        return await run_in_threadpool(self.repository.write_sketches, rows, retention)
+
+    async def read_sketches(self, track: str, widths: list, since: list):
+        return await run_in_threadpool(self.repository.read_sketches, track, widths, since)
+
+    async def list_partitions(self):
+        return await run_in_threadpool(self.repository.list_partitions)
+
+    async def create_partition(self, name: str, start, end) -> bool:
+        return await run_in_threadpool(self.repository.create_partition, name, start, end)
+
+    async def drop_partition(self, name: str, detach_pending: bool = False) -> bool:
+        return await run_in_threadpool(self.repository.drop_partition, name, detach_pending)
+
+    async def expire_request_keys(self, before) -> bool:
+        return await run_in_threadpool(self.repository.expire_request_keys, before)
+
+def create_location_repository(backend: str = None, cache=None, notifier=None):
+    backend = backend or DB_BACKEND
+    if backend == "asyncpg":
+        return AsyncLocationRepository(cache=cache, notifier=notifier)
+    if backend == "psycopg2":
+        return ThreadedLocationRepository(cache=cache, notifier=notifier)
+    raise ValueError(f"Unknown DB_BACKEND: {backend}")
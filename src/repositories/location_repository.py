@@ -1,65 +1,697 @@
-import logging
-from uuid import UUID
-from ..database.connection import DatabaseConnection
-
-logger = logging.getLogger(__name__)
-
-class LocationRepository:
-    def __init__(self):
-        self.db = DatabaseConnection.get_instance()
-
-    def create_location(self, request_id: str, location: str, status: str) -> bool:
-        conn = self.db.get_connection()
-        if conn:
-            try:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "INSERT INTO requests (id, location, status) VALUES (%s, %s, %s)",
-                    (request_id, location, status)
-                )
-                conn.commit()
-                return True
-            except Exception as error:
-                logger.error(f"Error in create_location: {error}")
-                return False
-            finally:
-                cursor.close()
-                self.db.return_connection(conn)
-        return False
-
-    def update_response_time(self, request_id: str, response_time: float) -> bool:
-        conn = self.db.get_connection()
-        if conn:
-            try:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "UPDATE requests SET response_time = %s WHERE id = %s",
-                    (response_time, request_id)
-                )
-                conn.commit()
-                return True
-            except Exception as error:
-                logger.error(f"Error in update_response_time: {error}")
-                return False
-            finally:
-                cursor.close()
-                self.db.return_connection(conn)
-        return False
-
-    def get_location(self, request_id: str):
-        conn = self.db.get_connection()
-        if conn:
-            try:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "SELECT id, location, status, created_at, updated_at, response_time FROM requests WHERE id = %s",
-                    (request_id,)
-                )
-                return cursor.fetchone()
-            except Exception as error:
-                logger.error(f"Error in get_location: {error}")
-                return None
-            finally:
-                cursor.close()
-                self.db.return_connection(conn)
-        return None 
\ No newline at end of file
+import csv
+import io
+import logging
+from uuid import UUID, uuid4
+from psycopg2.extras import execute_values
+from ..database.connection import DatabaseConnection
+from ..database.partitions import uuid7_time, request_created_at, PARTITION_LOCK_TIMEOUT_MS
+
+logger = logging.getLogger(__name__)
+
+# Column order of the rows taken by create_locations / copy_locations. The
+# trailing coordinate and geocoding columns may be left off.
+LOCATION_COLUMNS = ("id", "location", "status", "response_time", "city", "latitude", "longitude", "geohash",
+                    "canonical_city", "canonical_distance_m")
+# Written by create_location, response_time is filled in afterwards
+INSERT_COLUMNS = LOCATION_COLUMNS[:3] + LOCATION_COLUMNS[4:]
+# What full_row / insert_row write: the above plus created_at, which is the
+# partition key and is taken from the request id (see id_condition)
+STORED_COLUMNS = LOCATION_COLUMNS + ("created_at",)
+STORED_INSERT_COLUMNS = INSERT_COLUMNS + ("created_at",)
+
+# Keyed submissions claim the key in request_keys and insert the row only if
+# they got it; otherwise the caller looks up the row that already holds it.
+# Placeholders: {0} key, {1} id, {2} created_at, {3} the row values.
+IDEMPOTENT_INSERT_SQL = (
+    "WITH claimed AS ("
+    "INSERT INTO request_keys (idempotency_key, id, created_at) VALUES ({0}, {1}, {2}) "
+    "ON CONFLICT (idempotency_key) DO NOTHING RETURNING id"
+    f") INSERT INTO requests ({', '.join(STORED_INSERT_COLUMNS)}, idempotency_key) "
+    "SELECT {3} FROM claimed RETURNING id::text, response_time"
+)
+IDEMPOTENCY_KEY_OWNER_SQL = (
+    "SELECT r.id::text, r.response_time FROM request_keys k "
+    "JOIN requests r ON r.id = k.id AND r.created_at = k.created_at WHERE k.idempotency_key = {0}"
+)
+
+# Great-circle distance in metres from ({lat}, {lon}), same formula as
+# services.geo.haversine_m
+HAVERSINE_SQL = (
+    "2 * 6371008.8 * asin(least(1, sqrt("
+    "power(sin(radians(latitude - {lat}) / 2), 2) + "
+    "cos(radians({lat})) * cos(radians(latitude)) * "
+    "power(sin(radians(longitude - {lon}) / 2), 2))))"
+)
+
+def full_row(row) -> tuple:
+    # Follows STORED_COLUMNS
+    return tuple(row) + (None,) * (len(LOCATION_COLUMNS) - len(row)) + (request_created_at(row[0]),)
+
+def insert_row(request_id: str, location: str, status: str, coordinates: tuple = None) -> tuple:
+    # Follows STORED_INSERT_COLUMNS
+    row = (request_id, location, status) + tuple(coordinates or ())
+    return row + (None,) * (len(INSERT_COLUMNS) - len(row)) + (request_created_at(request_id),)
+
+def id_condition(request_id: str, placeholders: tuple) -> tuple:
+    """WHERE condition selecting the row ``request_id`` and its parameters.
+
+    A UUIDv7 id carries the row's created_at, and matching on it as well
+    confines the lookup to one partition; other ids are looked up in all of
+    them. ``placeholders`` render the id and the created_at parameter.
+    """
+    created_at = uuid7_time(request_id)
+    if created_at is None:
+        return f"id = {placeholders[0]}", (request_id,)
+    return f"id = {placeholders[0]} AND created_at = {placeholders[1]}", (request_id, created_at)
+
+def nearby_query(placeholder, ranges: list) -> str:
+    """SELECT for find_nearby; ``placeholder(name)`` renders a bound parameter."""
+    range_filter = " OR ".join(
+        f"(geohash >= {placeholder(f'lo{i}')} AND geohash < {placeholder(f'hi{i}')})"
+        for i in range(len(ranges))
+    )
+    distance = HAVERSINE_SQL.format(lat=placeholder("lat"), lon=placeholder("lon"))
+    return (
+        "SELECT id, city, latitude, longitude, distance_m FROM ("
+        f"SELECT id::text AS id, city, latitude, longitude, {distance} AS distance_m "
+        f"FROM requests WHERE {range_filter}"
+        f") candidates WHERE distance_m <= {placeholder('radius')} "
+        f"ORDER BY distance_m LIMIT {placeholder('limit')}"
+    )
+
+def nearby_params(latitude: float, longitude: float, radius_m: float, ranges: list, limit: int) -> dict:
+    params = {"lat": latitude, "lon": longitude, "radius": radius_m, "limit": limit}
+    for i, (lo, hi) in enumerate(ranges):
+        params[f"lo{i}"] = lo
+        params[f"hi{i}"] = hi
+    return params
+
+# Columns returned by list_requests / export_requests
+RECORD_COLUMNS = ("id", "location", "status", "city", "latitude", "longitude", "canonical_city",
+                  "canonical_distance_m", "created_at", "updated_at", "response_time")
+
+def records_query(placeholder, params: dict, descending: bool = False) -> str:
+    """SELECT for listing and exporting requests in (created_at, id) order.
+
+    ``params`` holds the filters in use (status, since, until), the keyset
+    position to continue after (after_created, after_id) and an optional
+    limit; ``placeholder(name)`` renders a bound parameter.
+    """
+    conditions = []
+    if "status" in params:
+        conditions.append(f"status = {placeholder('status')}")
+    if "since" in params:
+        conditions.append(f"created_at >= {placeholder('since')}")
+    if "until" in params:
+        conditions.append(f"created_at < {placeholder('until')}")
+    if "after_created" in params:
+        # Row comparison, so the index range scan starts right after the last
+        # row seen; the plain bound on created_at is what prunes partitions
+        conditions.append(
+            f"(created_at, id) {'<' if descending else '>'} "
+            f"({placeholder('after_created')}, {placeholder('after_id')}::uuid)"
+        )
+        conditions.append(f"created_at {'<=' if descending else '>='} {placeholder('after_created')}")
+    direction = "DESC" if descending else "ASC"
+    # Aliased so that ORDER BY id below still means the indexed uuid column
+    columns = ", ".join("id::text AS request_id" if column == "id" else column for column in RECORD_COLUMNS)
+    query = f"SELECT {columns} FROM requests"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += f" ORDER BY created_at {direction}, id {direction}"
+    if "limit" in params:
+        query += f" LIMIT {placeholder('limit')}"
+    return query
+
+def records_params(status: str = None, since=None, until=None, after: tuple = None, limit: int = None) -> dict:
+    params = {"status": status, "since": since, "until": until, "limit": limit}
+    if after is not None:
+        params["after_created"], params["after_id"] = after
+    return {name: value for name, value in params.items() if value is not None}
+
+# Job queue over the requests table, see services.job_worker. Rows waiting
+# for a worker are "received" with available_at in the past; a claim moves
+# them to "processing" and pushes available_at out by the lease, so a row
+# whose worker died becomes claimable again once the lease expires. The
+# attempts counter doubles as a fencing token for finishing a claim.
+# Placeholders: {0} lease seconds, {1} batch size.
+CLAIM_JOBS_SQL = (
+    "UPDATE requests AS r SET status = 'processing', attempts = r.attempts + 1, "
+    "available_at = CURRENT_TIMESTAMP + make_interval(secs => {0}), updated_at = CURRENT_TIMESTAMP "
+    "FROM ("
+    "SELECT id, created_at FROM requests "
+    "WHERE status IN ('received', 'processing') AND available_at <= CURRENT_TIMESTAMP "
+    "ORDER BY available_at LIMIT {1} "
+    "FOR UPDATE SKIP LOCKED"
+    ") AS claimed WHERE r.id = claimed.id AND r.created_at = claimed.created_at "
+    "RETURNING r.id::text, r.city, r.latitude, r.longitude, r.attempts, "
+    "EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - r.created_at)::float8"
+)
+
+# Placeholders: {0} ids, {1} attempts, {2} new statuses, {3} retry delays
+# in seconds, {4} errors, {5} created_at of the ids. Only "received" (a
+# retry) keeps available_at.
+_FINISH_JOBS = (
+    "UPDATE requests AS r SET status = v.status, last_error = v.error, updated_at = CURRENT_TIMESTAMP, "
+    "available_at = CASE WHEN v.status = 'received' "
+    "THEN CURRENT_TIMESTAMP + make_interval(secs => v.delay) END "
+    "FROM unnest({0}::uuid[], {1}::int[], {2}::text[], {3}::float8[], {4}::text[], {5}::timestamp[]) "
+    "AS v (id, attempts, status, delay, error, created_at) "
+    "WHERE r.id = v.id AND r.attempts = v.attempts AND r.status = 'processing' "
+)
+# Matching created_at too confines each row's update to its partition; ids
+# that are not UUIDv7 have no created_at to match and are looked up everywhere
+FINISH_JOBS_SQL = _FINISH_JOBS + "AND r.created_at = v.created_at RETURNING r.id::text"
+FINISH_UNTIMED_JOBS_SQL = _FINISH_JOBS + "RETURNING r.id::text"
+
+JOB_BACKLOG_SQL = (
+    "SELECT count(*) FILTER (WHERE available_at <= CURRENT_TIMESTAMP), "
+    "count(*) FILTER (WHERE available_at > CURRENT_TIMESTAMP) "
+    "FROM requests WHERE status IN ('received', 'processing')"
+)
+
+def finish_statements(outcomes: list) -> list:
+    """(statement, params) pairs that apply job outcomes.
+
+    outcomes are (id, attempts, status, delay, error) tuples; those with a
+    UUIDv7 id go through FINISH_JOBS_SQL, the rest through the untimed variant.
+    """
+    timed, untimed = [], []
+    for outcome in outcomes:
+        created_at = uuid7_time(outcome[0])
+        (untimed if created_at is None else timed).append(tuple(outcome) + (created_at,))
+    return [
+        (statement, tuple(list(column) for column in zip(*rows)))
+        for statement, rows in ((FINISH_JOBS_SQL, timed), (FINISH_UNTIMED_JOBS_SQL, untimed)) if rows
+    ]
+
+# Per-request telemetry samples, see observability.telemetry
+METRIC_COLUMNS = ("request_id", "method", "route", "status", "process_time", "db_time", "memory_usage",
+                  "allocated_bytes", "error_count", "timestamp")
+
+def metric_percentiles_query(placeholder, params: dict) -> str:
+    """Per-route sample count, errors and percentiles over a time window.
+
+    ``params`` holds the window (since, until), the percentiles as fractions
+    and optionally a route and method to narrow it down to.
+    """
+    fractions = f"{placeholder('fractions')}::float8[]"
+    conditions = [f"timestamp >= {placeholder('since')}", f"timestamp < {placeholder('until')}"]
+    if "route" in params:
+        conditions.append(f"route = {placeholder('route')}")
+    if "method" in params:
+        conditions.append(f"method = {placeholder('method')}")
+    return (
+        f"SELECT method, route, count(*), sum(error_count), "
+        f"percentile_cont({fractions}) WITHIN GROUP (ORDER BY process_time), "
+        f"percentile_cont({fractions}) WITHIN GROUP (ORDER BY db_time), "
+        f"avg(memory_usage)::float8, avg(allocated_bytes)::float8 "
+        f"FROM metrics WHERE {' AND '.join(conditions)} "
+        f"GROUP BY method, route ORDER BY count(*) DESC"
+    )
+
+def metric_percentiles_params(since, until, fractions: tuple, route: str = None, method: str = None) -> dict:
+    params = {"since": since, "until": until, "fractions": list(fractions), "route": route, "method": method}
+    return {name: value for name, value in params.items() if value is not None}
+
+# Per-worker latency sketches, see observability.sketches
+SKETCH_COLUMNS = ("track", "worker", "started_at", "method", "route", "width", "slot", "requests", "errors",
+                  "bucket_indexes", "bucket_counts")
+# A worker owns its rows, so rewriting a slot replaces it. Placeholders: {0} the values.
+UPSERT_SKETCHES_SQL = (
+    f"INSERT INTO latency_sketches ({', '.join(SKETCH_COLUMNS)}) VALUES {{0}} "
+    "ON CONFLICT (track, worker, method, route, width, slot) DO UPDATE SET "
+    "requests = EXCLUDED.requests, errors = EXCLUDED.errors, "
+    "bucket_indexes = EXCLUDED.bucket_indexes, bucket_counts = EXCLUDED.bucket_counts"
+)
+# Placeholders: {0} slot widths, {1} per width the first slot start to keep
+EXPIRE_SKETCHES_SQL = (
+    "DELETE FROM latency_sketches s USING unnest({0}::int[], {1}::bigint[]) AS r(width, before) "
+    "WHERE s.width = r.width AND s.slot < r.before"
+)
+# Placeholders: {0} track, {1} slot widths, {2} per width the first slot start to read
+READ_SKETCHES_SQL = (
+    "SELECT worker, started_at, method, route, s.width, slot, requests, errors, bucket_indexes, bucket_counts "
+    "FROM latency_sketches s JOIN unnest({1}::int[], {2}::bigint[]) AS r(width, since) "
+    "ON s.width = r.width AND s.slot >= r.since WHERE s.track = {0}"
+)
+
+# Partitions of requests, see database.partitions. DDL takes no bind
+# parameters, so names and bounds are formatted in; names come from
+# partition_name or the catalog. Placeholders: {0} name, {1}-{2} bounds.
+LIST_PARTITIONS_SQL = (
+    "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), i.inhdetachpending "
+    "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+    "WHERE i.inhparent = 'requests'::regclass ORDER BY c.relname"
+)
+CREATE_PARTITION_SQL = "CREATE TABLE IF NOT EXISTS {0} PARTITION OF requests FOR VALUES FROM ('{1}') TO ('{2}')"
+# Detaching concurrently only briefly blocks queries on requests; FINALIZE
+# completes a detach that was interrupted
+DETACH_PARTITION_SQL = "ALTER TABLE requests DETACH PARTITION {0} CONCURRENTLY"
+FINALIZE_DETACH_SQL = "ALTER TABLE requests DETACH PARTITION {0} FINALIZE"
+DROP_PARTITION_SQL = "DROP TABLE IF EXISTS {0}"
+# Partition DDL gives up on a busy table instead of queueing queries behind it
+LOCK_TIMEOUT_SQL = f"SET lock_timeout = {PARTITION_LOCK_TIMEOUT_MS}"
+LOCAL_LOCK_TIMEOUT_SQL = f"SET LOCAL lock_timeout = {PARTITION_LOCK_TIMEOUT_MS}"
+# Placeholders: {0} the oldest created_at to keep
+EXPIRE_REQUEST_KEYS_SQL = "DELETE FROM request_keys WHERE created_at < {0}"
+
+class LocationRepository:
+    def __init__(self):
+        self.db = DatabaseConnection.get_instance()
+
+    def open(self):
+        """Create and pre-warm the connection pool ahead of the first query."""
+        self.db.open()
+
+    def ping(self) -> bool:
+        # Errors are raised, not logged: the health prober reports them
+        conn = self.db.get_connection()
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+                conn.commit()
+            finally:
+                cursor.close()
+            return True
+        finally:
+            self.db.return_connection(conn)
+
+    def pool_stats(self) -> dict:
+        return self.db.pool_stats()
+
+    def create_location(self, request_id: str, location: str, status: str,
+                        coordinates: tuple = None) -> bool:
+        # coordinates follows INSERT_COLUMNS from city on
+        conn = self.db.get_connection()
+        if conn:
+            try:
+                cursor = conn.cursor()
+                cursor.execute(
+                    f"INSERT INTO requests ({', '.join(STORED_INSERT_COLUMNS)}) "
+                    f"VALUES ({', '.join(['%s'] * len(STORED_INSERT_COLUMNS))})",
+                    insert_row(request_id, location, status, coordinates)
+                )
+                conn.commit()
+                return True
+            except Exception as error:
+                logger.error(f"Error in create_location: {error}")
+                return False
+            finally:
+                cursor.close()
+                self.db.return_connection(conn)
+        return False
+
+    def create_location_once(self, request_id: str, location: str, status: str,
+                             coordinates: tuple, idempotency_key: str):
+        """Insert unless ``idempotency_key`` is taken.
+
+        Returns (id, response_time) of the row holding the key, which is
+        ``request_id`` if this call inserted it, or None on error.
+        """
+        conn = self.db.get_connection()
+        if conn:
+            try:
+                cursor = conn.cursor()
+                row = insert_row(request_id, location, status, coordinates) + (idempotency_key,)
+                cursor.execute(
+                    IDEMPOTENT_INSERT_SQL.format("%s", "%s", "%s", ", ".join(["%s"] * len(row))),
+                    (idempotency_key, request_id, row[-2]) + row
+                )
+                row = cursor.fetchone()
+                conn.commit()
+                if row is None:
+                    # A new statement, so it sees a concurrent insert that won the key
+                    cursor.execute(IDEMPOTENCY_KEY_OWNER_SQL.format("%s"), (idempotency_key,))
+                    row = cursor.fetchone()
+                    conn.commit()
+                return row
+            except Exception as error:
+                conn.rollback()
+                logger.error(f"Error in create_location_once: {error}")
+                return None
+            finally:
+                cursor.close()
+                self.db.return_connection(conn)
+        return None
+
+    def create_locations(self, rows: list) -> bool:
+        # rows follow LOCATION_COLUMNS and are written with a single
+        # multi-row INSERT and one commit
+        conn = self.db.get_connection()
+        if conn:
+            try:
+                cursor = conn.cursor()
+                execute_values(
+                    cursor,
+                    f"INSERT INTO requests ({', '.join(STORED_COLUMNS)}) VALUES %s",
+                    [full_row(row) for row in rows],
+                    page_size=len(rows)
+                )
+                conn.commit()
+                return True
+            except Exception as error:
+                conn.rollback()
+                logger.error(f"Error in create_locations: {error}")
+                return False
+            finally:
+                cursor.close()
+                self.db.return_connection(conn)
+        return False
+
+    def copy_locations(self, rows: list) -> bool:
+        # Same row shape as create_locations, streamed in with COPY
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(full_row(row) for row in rows)
+        buffer.seek(0)
+        conn = self.db.get_connection()
+        if conn:
+            try:
+                cursor = conn.cursor()
+                cursor.copy_expert(
+                    f"COPY requests ({', '.join(STORED_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+                    buffer
+                )
+                conn.commit()
+                return True
+            except Exception as error:
+                conn.rollback()
+                logger.error(f"Error in copy_locations: {error}")
+                return False
+            finally:
+                cursor.close()
+                self.db.return_connection(conn)
+        return False
+
+    def update_response_time(self, request_id: str, response_time: float) -> bool:
+        conn = self.db.get_connection()
+        if conn:
+            try:
+                cursor = conn.cursor()
+                condition, params = id_condition(request_id, ("%s", "%s"))
+                cursor.execute(f"UPDATE requests SET response_time = %s WHERE {condition}", (response_time,) + params)
+                conn.commit()
+                return True
+            except Exception as error:
+                logger.error(f"Error in update_response_time: {error}")
+                return False
+            finally:
+                cursor.close()
+                self.db.return_connection(conn)
+        return False
+
+    def get_location(self, request_id: str):
+        conn = self.db.get_connection()
+        if conn:
+            try:
+                cursor = conn.cursor()
+                condition, params = id_condition(request_id, ("%s", "%s"))
+                cursor.execute(
+                    f"SELECT id, location, status, created_at, updated_at, response_time FROM requests WHERE {condition}",
+                    params
+                )
+                return cursor.fetchone()
+            except Exception as error:
+                logger.error(f"Error in get_location: {error}")
+                return None
+            finally:
+                cursor.close()
+                self.db.return_connection(conn)
+        return None
+
+    def find_nearby(self, latitude: float, longitude: float, radius_m: float,
+                    ranges: list, limit: int) -> list:
+        # ranges are geohash [lo, hi) bounds from services.geo.prefix_ranges
+        conn = self.db.get_connection()
+        if conn:
+            try:
+                cursor = conn.cursor()
+                cursor.execute(
+                    nearby_query(lambda name: f"%({name})s", ranges),
+                    nearby_params(latitude, longitude, radius_m, ranges, limit)
+                )
+                return cursor.fetchall()
+            except Exception as error:
+                logger.error(f"Error in find_nearby: {error}")
+                return None
+            finally:
+                cursor.close()
+                self.db.return_connection(conn)
+        return None
+
+    def list_requests(self, params: dict, descending: bool = False):
+        # params from records_params
+        conn = self.db.get_connection()
+        if conn:
+            try:
+                cursor = conn.cursor()
+                cursor.execute(records_query(lambda name: f"%({name})s", params, descending), params)
+                return cursor.fetchall()
+            except Exception as error:
+                logger.error(f"Error in list_requests: {error}")
+                return None
+            finally:
+                cursor.close()
+                self.db.return_connection(conn)
+        return None
+
+    def export_requests(self, params: dict, chunk_size: int):
+        """Yield matching rows in lists of up to ``chunk_size``.
+
+        Rows come from a server-side (named) cursor, so only one chunk is
+        held in memory however many rows match. The pooled connection stays
+        checked out until the generator is exhausted or closed.
+        """
+        conn = self.db.get_connection()
+        try:
+            with conn.cursor(name=f"export_{uuid4().hex}") as cursor:
+                cursor.execute(records_query(lambda name: f"%({name})s", params), params)
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield rows
+        except Exception as error:
+            logger.error(f"Error in export_requests: {error}")
+            raise
+        finally:
+            # The pool rolls back the open transaction, which drops the cursor
+            self.db.return_connection(conn)
+
+    def claim_jobs(self, limit: int, lease_seconds: float):
+        conn = self.db.get_connection()
+        if conn:
+            try:
+                cursor = conn.cursor()
+                cursor.execute(CLAIM_JOBS_SQL.format("%s", "%s"), (lease_seconds, limit))
+                rows = cursor.fetchall()
+                conn.commit()
+                return rows
+            except Exception as error:
+                conn.rollback()
+                logger.error(f"Error in claim_jobs: {error}")
+                return None
+            finally:
+                cursor.close()
+                self.db.return_connection(conn)
+        return None
+
+    def finish_jobs(self, outcomes: list):
+        """Apply job outcomes, returning the ids whose claim was still held."""
+        conn = self.db.get_connection()
+        if conn:
+            try:
+                cursor = conn.cursor()
+                ids = []
+                for statement, params in finish_statements(outcomes):
+                    cursor.execute(statement.format(*["%s"] * 6), params)
+                    ids += [row[0] for row in cursor.fetchall()]
+                conn.commit()
+                return ids
+            except Exception as error:
+                conn.rollback()
+                logger.error(f"Error in finish_jobs: {error}")
+                return None
+            finally:
+                cursor.close()
+                self.db.return_connection(conn)
+        return None
+
+    def job_backlog(self):
+        """(ready, leased) number of unfinished jobs."""
+        conn = self.db.get_connection()
+        if conn:
+            try:
+                cursor = conn.cursor()
+                cursor.execute(JOB_BACKLOG_SQL)
+                row = cursor.fetchone()
+                conn.commit()
+                return row
+            except Exception as error:
+                conn.rollback()
+                logger.error(f"Error in job_backlog: {error}")
+                return None
+            finally:
+                cursor.close()
+                self.db.return_connection(conn)
+        return None
+
+    def write_metrics(self, rows: list) -> bool:
+        # rows are METRIC_COLUMNS tuples
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        conn = self.db.get_connection()
+        if conn:
+            try:
+                cursor = conn.cursor()
+                cursor.copy_expert(
+                    f"COPY metrics ({', '.join(METRIC_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+                    buffer
+                )
+                conn.commit()
+                return True
+            except Exception as error:
+                conn.rollback()
+                logger.error(f"Error in write_metrics: {error}")
+                return False
+            finally:
+                cursor.close()
+                self.db.return_connection(conn)
+        return False
+
+    def metric_percentiles(self, params: dict):
+        conn = self.db.get_connection()
+        if conn:
+            try:
+                cursor = conn.cursor()
+                cursor.execute(metric_percentiles_query(lambda name: f"%({name})s", params), params)
+                rows = cursor.fetchall()
+                conn.commit()
+                return rows
+            except Exception as error:
+                conn.rollback()
+                logger.error(f"Error in metric_percentiles: {error}")
+                return None
+            finally:
+                cursor.close()
+                self.db.return_connection(conn)
+        return None
+
+    def write_sketches(self, rows: list, retention: tuple) -> bool:
+        # rows are SKETCH_COLUMNS tuples, retention is (widths, before)
+        conn = self.db.get_connection()
+        if conn:
+            try:
+                cursor = conn.cursor()
+                execute_values(cursor, UPSERT_SKETCHES_SQL.format("%s"), rows, page_size=len(rows))
+                cursor.execute(EXPIRE_SKETCHES_SQL.format("%s", "%s"), retention)
+                conn.commit()
+                return True
+            except Exception as error:
+                conn.rollback()
+                logger.error(f"Error in write_sketches: {error}")
+                return False
+            finally:
+                cursor.close()
+                self.db.return_connection(conn)
+        return False
+
+    def read_sketches(self, track: str, widths: list, since: list):
+        conn = self.db.get_connection()
+        if conn:
+            try:
+                cursor = conn.cursor()
+                cursor.execute(READ_SKETCHES_SQL.format("%(track)s", "%(widths)s", "%(since)s"),
+                               {"track": track, "widths": widths, "since": since})
+                rows = cursor.fetchall()
+                conn.commit()
+                return rows
+            except Exception as error:
+                conn.rollback()
+                logger.error(f"Error in read_sketches: {error}")
+                return None
+            finally:
+                cursor.close()
+                self.db.return_connection(conn)
+        return None
+
+    def list_partitions(self):
+        """(name, bound expression, detach pending) of each requests partition."""
+        conn = self.db.get_connection()
+        if conn:
+            try:
+                cursor = conn.cursor()
+                cursor.execute(LIST_PARTITIONS_SQL)
+                rows = cursor.fetchall()
+                conn.commit()
+                return rows
+            except Exception as error:
+                conn.rollback()
+                logger.error(f"Error in list_partitions: {error}")
+                return None
+            finally:
+                cursor.close()
+                self.db.return_connection(conn)
+        return None
+
+    def create_partition(self, name: str, start, end) -> bool:
+        conn = self.db.get_connection()
+        if conn:
+            try:
+                cursor = conn.cursor()
+                cursor.execute(LOCAL_LOCK_TIMEOUT_SQL)
+                cursor.execute(CREATE_PARTITION_SQL.format(name, start, end))
+                conn.commit()
+                return True
+            except Exception as error:
+                conn.rollback()
+                logger.error(f"Error in create_partition: {error}")
+                return False
+            finally:
+                cursor.close()
+                self.db.return_connection(conn)
+        return False
+
+    def drop_partition(self, name: str, detach_pending: bool = False) -> bool:
+        """Detach a partition from requests and drop it."""
+        conn = self.db.get_connection()
+        if conn:
+            # DETACH ... CONCURRENTLY cannot run inside a transaction
+            conn.autocommit = True
+            try:
+                cursor = conn.cursor()
+                cursor.execute(LOCK_TIMEOUT_SQL)
+                try:
+                    cursor.execute((FINALIZE_DETACH_SQL if detach_pending else DETACH_PARTITION_SQL).format(name))
+                    cursor.execute(DROP_PARTITION_SQL.format(name))
+                finally:
+                    cursor.execute("RESET lock_timeout")
+                return True
+            except Exception as error:
+                logger.error(f"Error in drop_partition: {error}")
+                return False
+            finally:
+                conn.autocommit = False
+                cursor.close()
+                self.db.return_connection(conn)
+        return False
+
+    def expire_request_keys(self, before) -> bool:
+        conn = self.db.get_connection()
+        if conn:
+            try:
+                cursor = conn.cursor()
+                cursor.execute(EXPIRE_REQUEST_KEYS_SQL.format("%s"), (before,))
+                conn.commit()
+                return True
+            except Exception as error:
+                conn.rollback()
+                logger.error(f"Error in expire_request_keys: {error}")
+                return False
+            finally:
+                cursor.close()
+                self.db.return_connection(conn)
+        return False
@@ -0,0 +1,173 @@
+"""Production entry point: gunicorn with pre-forked uvicorn workers.
+
+    python -m src.server
+
+For local development keep using ``uvicorn src.main:app --reload``.
+"""
+
+import logging
+import math
+import os
+import shutil
+from uvicorn.protocols.websockets.websockets_impl import WebSocketProtocol
+from uvicorn.workers import UvicornWorker
+from websockets import frames
+from websockets.extensions.permessage_deflate import PerMessageDeflate, ServerPerMessageDeflateFactory
+
+logger = logging.getLogger(__name__)
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+# Seconds workers get to finish in-flight requests after SIGTERM
+GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+WORKER_TIMEOUT = int(os.getenv("WORKER_TIMEOUT", "60"))
+KEEPALIVE = int(os.getenv("KEEPALIVE", "5"))
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus_multiproc")
+# WebSocket messages smaller than this are sent uncompressed even when the
+# client negotiated permessage-deflate
+WS_DEFLATE_MIN_BYTES = int(os.getenv("WS_DEFLATE_MIN_BYTES", "1024"))
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+
+def _read(path: str):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def cgroup_cpu_limit(root: str = CGROUP_ROOT):
+    """CPU quota of the container in cores, or None when it is unlimited."""
+    # cgroup v2: "<quota> <period>" or "max <period>"
+    cpu_max = _read(os.path.join(root, "cpu.max"))
+    if cpu_max:
+        quota, _, period = cpu_max.partition(" ")
+        if quota != "max" and period:
+            return int(quota) / int(period)
+        return None
+    # cgroup v1
+    quota = _read(os.path.join(root, "cpu", "cpu.cfs_quota_us")) or _read(os.path.join(root, "cpu.cfs_quota_us"))
+    period = _read(os.path.join(root, "cpu", "cpu.cfs_period_us")) or _read(os.path.join(root, "cpu.cfs_period_us"))
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+def available_cpus(root: str = CGROUP_ROOT) -> int:
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    limit = cgroup_cpu_limit(root)
+    if limit is not None:
+        cpus = min(cpus, math.ceil(limit))
+    return max(1, cpus)
+
+def worker_count() -> int:
+    return int(os.getenv("WEB_CONCURRENCY", "0")) or available_cpus()
+
+def prepare_multiproc_dir(path: str = None):
+    """Give this run an empty metrics directory, shared with every worker.
+
+    Must happen before prometheus_client is imported anywhere, since it picks
+    its value storage at import time.
+    """
+    path = path or PROMETHEUS_MULTIPROC_DIR
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+    return path
+
+def child_exit(server, worker):
+    # Drop the dead worker's live gauges from the aggregate
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+class SelectivePerMessageDeflate(PerMessageDeflate):
+    """permessage-deflate that leaves small messages uncompressed.
+
+    RFC 7692 lets the sender choose per message (the RSV1 bit), and for a
+    short message the deflate block overhead and the CPU cost outweigh the
+    bytes saved.
+    """
+
+    def __init__(self, *args, min_size: int, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.min_size = min_size
+        self.skipping = False
+
+    def encode(self, frame: frames.Frame) -> frames.Frame:
+        if frame.opcode in frames.CTRL_OPCODES:
+            return frame
+        if frame.opcode is not frames.OP_CONT:
+            # Decided on the first frame, continuations follow it
+            self.skipping = frame.fin and len(frame.data) < self.min_size
+        if self.skipping:
+            return frame
+        return super().encode(frame)
+
+class SelectiveDeflateFactory(ServerPerMessageDeflateFactory):
+    def __init__(self, min_size: int, **kwargs):
+        super().__init__(**kwargs)
+        self.min_size = min_size
+
+    def process_request_params(self, params, accepted_extensions):
+        response_params, extension = super().process_request_params(params, accepted_extensions)
+        return response_params, SelectivePerMessageDeflate(
+            extension.remote_no_context_takeover,
+            extension.local_no_context_takeover,
+            extension.remote_max_window_bits,
+            extension.local_max_window_bits,
+            extension.compress_settings,
+            min_size=self.min_size
+        )
+
+class SelectiveDeflateWebSocketProtocol(WebSocketProtocol):
+    def __init__(self, config, server_state, app_state, _loop=None):
+        super().__init__(config, server_state, app_state, _loop)
+        if config.ws_per_message_deflate:
+            self.available_extensions = [SelectiveDeflateFactory(WS_DEFLATE_MIN_BYTES)]
+
+class Worker(UvicornWorker):
+    """UvicornWorker whose WebSockets only deflate messages of WS_DEFLATE_MIN_BYTES or more."""
+
+    CONFIG_KWARGS = dict(UvicornWorker.CONFIG_KWARGS, ws=SelectiveDeflateWebSocketProtocol)
+
+def gunicorn_options(workers: int = None) -> dict:
+    return {
+        "bind": f"{HOST}:{PORT}",
+        "workers": workers or worker_count(),
+        # Picks uvloop and httptools automatically when they are installed
+        "worker_class": "src.server.Worker",
+        # Workers import the app themselves, so database pools, the event
+        # loop and the backplane connection are all created after the fork
+        "preload_app": False,
+        "graceful_timeout": GRACEFUL_TIMEOUT,
+        "timeout": WORKER_TIMEOUT,
+        "keepalive": KEEPALIVE,
+        "child_exit": child_exit,
+        "accesslog": None,
+    }
+
+def main():
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def __init__(self, options: dict):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from .main import app
+            return app
+
+    prepare_multiproc_dir()
+    options = gunicorn_options()
+    logger.info(f"Starting {options['workers']} workers on {options['bind']}")
+    Server(options).run()
+
+if __name__ == "__main__":
+    main()
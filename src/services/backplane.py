@@ -0,0 +1,236 @@
+import asyncio
+import json
+import logging
+import os
+from collections import deque
+from prometheus_client import Counter
+from ..database.connection import get_db_config
+
+logger = logging.getLogger(__name__)
+
+# "none" keeps broadcasts pod-local, "postgres" shares them through
+# LISTEN/NOTIFY, "memory" is an in-process stand-in for tests
+WS_BACKPLANE = os.getenv("WS_BACKPLANE", "none")
+WS_BACKPLANE_CHANNEL = os.getenv("WS_BACKPLANE_CHANNEL", "ws_broadcast")
+WS_BACKPLANE_BATCH_MS = float(os.getenv("WS_BACKPLANE_BATCH_MS", "10"))
+WS_BACKPLANE_MAX_PENDING = int(os.getenv("WS_BACKPLANE_MAX_PENDING", "10000"))
+
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+NOTIFY_MAX_PAYLOAD = 7999
+
+BACKPLANE_PUBLISHED = Counter(
+    'ws_backplane_messages_published_total',
+    'Broadcast messages handed to the backplane',
+    ['backend']
+)
+
+BACKPLANE_NOTIFIES = Counter(
+    'ws_backplane_notifies_total',
+    'NOTIFY statements sent, each carrying a batch of messages',
+    ['backend']
+)
+
+BACKPLANE_RECEIVED = Counter(
+    'ws_backplane_messages_received_total',
+    'Broadcast messages received from the backplane',
+    ['backend']
+)
+
+BACKPLANE_DROPPED = Counter(
+    'ws_backplane_messages_dropped_total',
+    'Broadcast messages the backplane could not deliver',
+    ['backend', 'reason']
+)
+
+class InMemoryBackplane:
+    """Backplane for a single process.
+
+    Instances on the same channel see each other's messages, which is enough
+    to exercise multi-replica fan-out in tests.
+    """
+
+    backend = "memory"
+    _subscribers = {}
+
+    def __init__(self, channel: str = None):
+        self.channel = channel or WS_BACKPLANE_CHANNEL
+        self._handler = None
+
+    async def start(self, handler):
+        self._handler = handler
+        self._subscribers.setdefault(self.channel, set()).add(self)
+
+    async def publish(self, message: str):
+        BACKPLANE_PUBLISHED.labels(backend=self.backend).inc()
+        for subscriber in list(self._subscribers.get(self.channel, ())):
+            BACKPLANE_RECEIVED.labels(backend=self.backend).inc()
+            subscriber._handler(message)
+
+    async def close(self):
+        self._subscribers.get(self.channel, set()).discard(self)
+
+class PostgresBackplane:
+    """Shares broadcasts between replicas with Postgres LISTEN/NOTIFY.
+
+    Each pod holds one dedicated asyncpg connection that both LISTENs and
+    NOTIFYs, and fans received messages out to its own WebSocket clients, so
+    the database sees one connection per pod rather than one per client.
+    Messages published within ``batch_interval`` are packed into as few
+    NOTIFY payloads (JSON arrays) as the 8000 byte limit allows. A sender also
+    receives its own notifications, which is how local clients get them.
+    """
+
+    backend = "postgres"
+
+    def __init__(self, channel: str = None, batch_interval: float = None,
+                 max_pending: int = None, reconnect_delay: float = 1.0):
+        self.channel = channel or WS_BACKPLANE_CHANNEL
+        self.batch_interval = batch_interval if batch_interval is not None else WS_BACKPLANE_BATCH_MS / 1000
+        self.max_pending = max_pending or WS_BACKPLANE_MAX_PENDING
+        self.reconnect_delay = reconnect_delay
+        self._handler = None
+        self._conn = None
+        self._pending = deque()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._closing = False
+
+    async def start(self, handler):
+        self._handler = handler
+        await self._connect()
+        self._task = asyncio.create_task(self._run())
+
+    async def _connect(self):
+        import asyncpg
+
+        config = get_db_config()
+        self._conn = await asyncpg.connect(
+            database=config["dbname"],
+            user=config["user"],
+            password=config["password"],
+            host=config["host"],
+            port=int(config["port"])
+        )
+        await self._conn.add_listener(self.channel, self._on_notify)
+        # Wake the publisher so a dropped connection is noticed while idle
+        self._conn.add_termination_listener(lambda connection: self._wakeup.set())
+        logger.info(f"Listening for WebSocket broadcasts on channel {self.channel}")
+
+    def _on_notify(self, connection, pid, channel, payload):
+        try:
+            messages = json.loads(payload)
+        except ValueError:
+            logger.warning("Ignoring malformed backplane notification")
+            return
+        BACKPLANE_RECEIVED.labels(backend=self.backend).inc(len(messages))
+        for message in messages:
+            self._handler(message)
+
+    async def publish(self, message: str):
+        BACKPLANE_PUBLISHED.labels(backend=self.backend).inc()
+        if len(self._pending) >= self.max_pending:
+            self._pending.popleft()
+            BACKPLANE_DROPPED.labels(backend=self.backend, reason="backlog").inc()
+        self._pending.append(message)
+        self._wakeup.set()
+
+    def _next_payload(self):
+        """Pop as many pending messages as fit in one NOTIFY payload."""
+        parts = []
+        size = 2  # the surrounding brackets
+        while self._pending:
+            encoded = json.dumps(self._pending[0])
+            added = len(encoded.encode()) + (1 if parts else 0)
+            if size + added > NOTIFY_MAX_PAYLOAD:
+                if parts:
+                    break
+                # Too large to ever fit, other replicas cannot get it
+                message = self._pending.popleft()
+                BACKPLANE_DROPPED.labels(backend=self.backend, reason="too_large").inc()
+                logger.warning("Broadcast message exceeds the NOTIFY payload limit, delivering locally only")
+                self._handler(message)
+                continue
+            parts.append(encoded)
+            size += added
+            self._pending.popleft()
+        if not parts:
+            return None
+        return "[" + ",".join(parts) + "]"
+
+    async def _run(self):
+        while not self._closing:
+            await self._wakeup.wait()
+            # Give concurrent publishers a moment to join this batch
+            if self.batch_interval:
+                await asyncio.sleep(self.batch_interval)
+            self._wakeup.clear()
+            if self._conn is None or self._conn.is_closed():
+                logger.warning("Backplane connection lost, reconnecting")
+                await self._reconnect()
+                continue
+            try:
+                await self._flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                logger.error(f"Error publishing to backplane: {error}")
+                await self._reconnect()
+
+    async def _flush(self):
+        while True:
+            payload = self._next_payload()
+            if payload is None:
+                return
+            try:
+                await self._conn.execute("SELECT pg_notify($1, $2)", self.channel, payload)
+            except Exception:
+                # Put the batch back so it goes out after reconnecting
+                self._pending.extendleft(reversed(json.loads(payload)))
+                raise
+            BACKPLANE_NOTIFIES.labels(backend=self.backend).inc()
+
+    async def _reconnect(self):
+        while not self._closing:
+            await self._close_connection()
+            await asyncio.sleep(self.reconnect_delay)
+            try:
+                await self._connect()
+                self._wakeup.set()
+                return
+            except Exception as error:
+                logger.error(f"Backplane reconnect failed: {error}")
+
+    async def _close_connection(self):
+        if self._conn is None:
+            return
+        try:
+            await self._conn.close(timeout=1)
+        except Exception:
+            pass
+        self._conn = None
+
+    async def close(self):
+        self._closing = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._conn is not None and self._pending:
+            try:
+                await self._flush()
+            except Exception as error:
+                logger.error(f"Error flushing backplane on shutdown: {error}")
+        await self._close_connection()
+
+def create_backplane(backend: str = None, channel: str = None):
+    backend = backend or WS_BACKPLANE
+    if backend == "postgres":
+        return PostgresBackplane(channel=channel)
+    if backend == "memory":
+        return InMemoryBackplane(channel=channel)
+    if backend == "none":
+        return None
+    raise ValueError(f"Unknown WS_BACKPLANE: {backend}")
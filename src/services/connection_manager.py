@@ -0,0 +1,355 @@
+import asyncio
+import json
+import logging
+import os
+from fastapi import WebSocket
+from prometheus_client import Counter, Gauge
+from .geofence import GeofenceIndex, parse_fence, GEOFENCE_MAX_PER_CLIENT
+from .ws_protocol import WireProtocol, TEXT, WS_BATCH_MAX_BYTES, encode, encode_message
+
+logger = logging.getLogger(__name__)
+
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+# What to do when a client's queue is full: "disconnect" evicts the client,
+# "drop_oldest" / "drop_newest" discard a message and keep the client
+WS_OVERFLOW_POLICY = os.getenv("WS_OVERFLOW_POLICY", "disconnect")
+
+# Close code 1013 ("try again later") tells clients they were too slow
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+WEBSOCKET_CONNECTIONS = Gauge(
+    'websocket_connections_active',
+    'Number of active WebSocket connections',
+    multiprocess_mode='livesum'
+)
+
+WEBSOCKET_DROPPED = Counter(
+    'websocket_messages_dropped_total',
+    'Outbound WebSocket messages dropped because a client queue was full',
+    ['policy']
+)
+
+WEBSOCKET_EVICTIONS = Counter(
+    'websocket_evictions_total',
+    'WebSocket clients disconnected by the server',
+    ['reason']
+)
+
+WEBSOCKET_FRAMES = Counter(
+    'websocket_frames_sent_total',
+    'WebSocket data frames sent',
+    ['protocol']
+)
+
+WEBSOCKET_MESSAGES_SENT = Counter(
+    'websocket_messages_sent_total',
+    'Messages sent to WebSocket clients; msgpack clients get several per frame',
+    ['protocol']
+)
+
+GEOFENCES_ACTIVE = Gauge(
+    'geofences_active',
+    'Geofence subscriptions held by connected WebSocket clients',
+    multiprocess_mode='livesum'
+)
+
+GEOFENCE_NOTIFICATIONS = Counter(
+    'geofence_notifications_total',
+    'Location events queued for clients with a matching geofence'
+)
+
+_TEXT_FRAMES = WEBSOCKET_FRAMES.labels(protocol="text")
+_TEXT_MESSAGES = WEBSOCKET_MESSAGES_SENT.labels(protocol="text")
+_MSGPACK_FRAMES = WEBSOCKET_FRAMES.labels(protocol="msgpack")
+_MSGPACK_MESSAGES = WEBSOCKET_MESSAGES_SENT.labels(protocol="msgpack")
+
+class ClientConnection:
+    """One WebSocket with its own bounded outbound queue and writer task.
+
+    The queue holds messages already encoded for the client's ``protocol``.
+    """
+
+    __slots__ = ("websocket", "queue", "task", "fences", "protocol")
+
+    def __init__(self, websocket: WebSocket, queue_size: int, protocol: WireProtocol = TEXT):
+        self.websocket = websocket
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.task = None
+        self.fences = set()
+        self.protocol = protocol
+
+    async def send(self, message):
+        if isinstance(message, bytes):
+            await self.websocket.send_bytes(message)
+        else:
+            await self.websocket.send_text(message)
+
+class ConnectionManager:
+    """Fans broadcasts out to WebSocket clients without waiting on any of them.
+
+    ``broadcast`` only enqueues the (already serialized) payload on every
+    client's queue; per-client writer tasks do the actual sends, so one slow
+    client never delays the others. Clients whose queue overflows are handled
+    according to ``overflow_policy``.
+
+    With a ``backplane`` broadcasts are published to every replica and each
+    replica delivers them to its own clients when they come back.
+
+    Location events are not broadcast: each replica matches them against the
+    geofences its own clients subscribed to and only notifies those clients.
+
+    Clients that negotiated the msgpack protocol get MessagePack instead of
+    text, and their writer packs whatever queued up within the client's
+    ``batch_delay`` into one binary frame.
+    """
+
+    def __init__(self, queue_size: int = None, overflow_policy: str = None,
+                 backplane=None):
+        self.queue_size = queue_size or WS_SEND_QUEUE_SIZE
+        self.overflow_policy = overflow_policy or WS_OVERFLOW_POLICY
+        if self.overflow_policy not in ("disconnect", "drop_oldest", "drop_newest"):
+            raise ValueError(f"Unknown WS_OVERFLOW_POLICY: {self.overflow_policy}")
+        self.active_connections: dict[WebSocket, ClientConnection] = {}
+        self._dropped = WEBSOCKET_DROPPED.labels(policy=self.overflow_policy)
+        self.backplane = backplane
+        self.geofences = GeofenceIndex()
+
+    async def start(self):
+        if self.backplane is not None:
+            await self.backplane.start(self.deliver)
+
+    @property
+    def connection_count(self) -> int:
+        return len(self.active_connections)
+
+    def backlog(self) -> tuple:
+        """Messages waiting to be sent, and the fullest queue's share of its capacity."""
+        queued = 0
+        deepest = 0
+        for client in self.active_connections.values():
+            depth = client.queue.qsize()
+            queued += depth
+            if depth > deepest:
+                deepest = depth
+        return queued, deepest / self.queue_size
+
+    async def connect(self, websocket: WebSocket, protocol: WireProtocol = TEXT):
+        if protocol.subprotocol is None:
+            await websocket.accept()
+        else:
+            await websocket.accept(subprotocol=protocol.subprotocol)
+        self.register(websocket, protocol)
+        logger.info("WebSocket connection established", extra={
+            "total_connections": self.connection_count,
+            "binary": protocol.binary
+        })
+
+    def register(self, websocket: WebSocket, protocol: WireProtocol = TEXT) -> ClientConnection:
+        client = ClientConnection(websocket, self.queue_size, protocol)
+        client.task = asyncio.create_task(self._writer(client))
+        self.active_connections[websocket] = client
+        WEBSOCKET_CONNECTIONS.set(self.connection_count)
+        return client
+
+    def disconnect(self, websocket: WebSocket):
+        client = self.active_connections.pop(websocket, None)
+        if client is None:
+            return
+        if client.task is not None and client.task is not asyncio.current_task():
+            client.task.cancel()
+        for fence_id in client.fences:
+            self.geofences.remove(fence_id)
+        client.fences.clear()
+        GEOFENCES_ACTIVE.set(len(self.geofences))
+        WEBSOCKET_CONNECTIONS.set(self.connection_count)
+        logger.info("WebSocket connection closed", extra={
+            "total_connections": self.connection_count
+        })
+
+    async def _writer(self, client: ClientConnection):
+        send = self._send_batch if client.protocol.binary else self._send_one
+        try:
+            while True:
+                await send(client)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Error sending WebSocket message", extra={
+                "error": str(e)
+            })
+            WEBSOCKET_EVICTIONS.labels(reason="send_error").inc()
+            self.disconnect(client.websocket)
+
+    async def _send_one(self, client: ClientConnection):
+        await client.send(await client.queue.get())
+        _TEXT_FRAMES.inc()
+        _TEXT_MESSAGES.inc()
+
+    async def _send_batch(self, client: ClientConnection):
+        queue = client.queue
+        batch = [await queue.get()]
+        if client.protocol.batch_delay:
+            # Let more messages arrive to share the frame
+            await asyncio.sleep(client.protocol.batch_delay)
+        size = len(batch[0])
+        while size < WS_BATCH_MAX_BYTES and not queue.empty():
+            message = queue.get_nowait()
+            batch.append(message)
+            size += len(message)
+        # MessagePack values are self-delimiting, so a frame is simply the
+        # batched messages back to back
+        await client.websocket.send_bytes(batch[0] if len(batch) == 1 else b"".join(batch))
+        _MSGPACK_FRAMES.inc()
+        _MSGPACK_MESSAGES.inc(len(batch))
+
+    def _enqueue(self, client: ClientConnection, message) -> bool:
+        """Queue ``message`` for ``client``; False means the client must go."""
+        try:
+            client.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            pass
+        self._dropped.inc()
+        if self.overflow_policy == "drop_newest":
+            return True
+        if self.overflow_policy == "drop_oldest":
+            client.queue.get_nowait()
+            client.queue.put_nowait(message)
+            return True
+        return False
+
+    async def send_to(self, websocket: WebSocket, message):
+        client = self.active_connections.get(websocket)
+        if client is not None and not self._enqueue(client, message):
+            self._evict(client)
+
+    async def send_json(self, websocket: WebSocket, payload):
+        """Send ``payload`` encoded for the client's protocol."""
+        client = self.active_connections.get(websocket)
+        if client is not None and not self._enqueue(client, encode(client.protocol, payload)):
+            self._evict(client)
+
+    async def broadcast(self, message):
+        """Send ``message`` to every client, on every replica if there is a backplane."""
+        logger.debug("Broadcasting message", extra={
+            "message": message,
+            "recipients": self.connection_count
+        })
+        if self.backplane is not None:
+            await self.backplane.publish(message)
+        else:
+            self.deliver(message)
+
+    def deliver(self, message):
+        """Queue ``message`` (str or bytes) for every client of this replica.
+
+        Location events (dicts) only go to clients with a matching geofence.
+        """
+        if isinstance(message, dict):
+            self.deliver_location(message)
+            return
+        # Packed once for every msgpack client, and only if there is one
+        packed = None
+        slow = []
+        for client in self.active_connections.values():
+            if client.protocol.binary:
+                if packed is None:
+                    packed = encode_message(client.protocol, message)
+                queued = self._enqueue(client, packed)
+            else:
+                queued = self._enqueue(client, message)
+            if not queued:
+                slow.append(client)
+        for client in slow:
+            self._evict(client)
+
+    async def broadcast_json(self, payload):
+        # Serialize once, every client gets the same string object
+        await self.broadcast(json.dumps(payload))
+
+    async def publish_location(self, event: dict):
+        """Notify geofence subscribers of a stored location, on every replica."""
+        if self.backplane is not None:
+            await self.backplane.publish(event)
+        else:
+            self.deliver_location(event)
+
+    def deliver_location(self, event: dict):
+        matches = {}
+        for fence in self.geofences.match(event["latitude"], event["longitude"]):
+            matches.setdefault(fence.owner, []).append(fence.fence_id)
+        slow = []
+        for client, fence_ids in matches.items():
+            message = encode(client.protocol, {"event": "location", "fence_ids": sorted(fence_ids), **event})
+            if self._enqueue(client, message):
+                GEOFENCE_NOTIFICATIONS.inc()
+            else:
+                slow.append(client)
+        for client in slow:
+            self._evict(client)
+
+    def subscribe(self, websocket: WebSocket, spec) -> int:
+        """Add a geofence for ``websocket``, raising ValueError if it is invalid."""
+        client = self.active_connections.get(websocket)
+        if client is None:
+            raise ValueError("not connected")
+        if len(client.fences) >= GEOFENCE_MAX_PER_CLIENT:
+            raise ValueError(f"at most {GEOFENCE_MAX_PER_CLIENT} fences per connection")
+        fence_id = self.geofences.add(parse_fence(spec), owner=client)
+        client.fences.add(fence_id)
+        GEOFENCES_ACTIVE.set(len(self.geofences))
+        return fence_id
+
+    def unsubscribe(self, websocket: WebSocket, fence_id) -> bool:
+        client = self.active_connections.get(websocket)
+        if client is None or fence_id not in client.fences:
+            return False
+        client.fences.discard(fence_id)
+        self.geofences.remove(fence_id)
+        GEOFENCES_ACTIVE.set(len(self.geofences))
+        return True
+
+    async def handle_command(self, websocket: WebSocket, command: dict):
+        """Apply a subscribe / unsubscribe message and reply to the sender."""
+        action = command.get("action")
+        if action == "subscribe":
+            try:
+                fence_id = self.subscribe(websocket, command.get("fence"))
+            except ValueError as e:
+                reply = {"event": "error", "action": action, "detail": str(e)}
+            else:
+                reply = {"event": "subscribed", "fence_id": fence_id,
+                         "fence": self.geofences.get(fence_id).describe()}
+        elif action == "unsubscribe":
+            fence_id = command.get("fence_id")
+            if self.unsubscribe(websocket, fence_id):
+                reply = {"event": "unsubscribed", "fence_id": fence_id}
+            else:
+                reply = {"event": "error", "action": action, "detail": "unknown fence_id"}
+        else:
+            reply = {"event": "error", "detail": f"unknown action: {action}"}
+        await self.send_json(websocket, reply)
+
+    def _evict(self, client: ClientConnection):
+        WEBSOCKET_EVICTIONS.labels(reason="slow_consumer").inc()
+        logger.warning("Disconnecting slow WebSocket consumer", extra={
+            "queue_size": self.queue_size
+        })
+        self.disconnect(client.websocket)
+        asyncio.create_task(self._close(client.websocket))
+
+    async def _close(self, websocket: WebSocket, code: int = SLOW_CONSUMER_CLOSE_CODE):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
+
+    async def close(self):
+        """Disconnect every client, used on shutdown."""
+        if self.backplane is not None:
+            await self.backplane.close()
+        websockets = list(self.active_connections)
+        for websocket in websockets:
+            self.disconnect(websocket)
+        # 1001 = "going away"
+        await asyncio.gather(*(self._close(websocket, code=1001) for websocket in websockets))
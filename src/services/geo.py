@@ -0,0 +1,160 @@
+import math
+import os
+import re
+
+# Precision of the stored geohash; 9 characters is a ~5 m cell
+GEOHASH_PRECISION = int(os.getenv("GEOHASH_PRECISION", "9"))
+# Upper bound on the index ranges one nearby query may scan
+NEARBY_MAX_CELLS = int(os.getenv("NEARBY_MAX_CELLS", "16"))
+NEARBY_MAX_RADIUS_M = float(os.getenv("NEARBY_MAX_RADIUS_M", "50000"))
+NEARBY_MAX_LIMIT = int(os.getenv("NEARBY_MAX_LIMIT", "1000"))
+
+EARTH_RADIUS_M = 6371008.8
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_BASE32_INDEX = {char: i for i, char in enumerate(_BASE32)}
+
+# Legacy requests.location format: "City (lat, lon)"
+_LOCATION_PATTERN = re.compile(r"^(.*) \(([-+0-9.eE]+), ([-+0-9.eE]+)\)$")
+
+def format_location(city: str, latitude: float, longitude: float) -> str:
+    return f"{city} ({latitude}, {longitude})"
+
+def parse_location(location: str):
+    """Split a legacy location string into (city, latitude, longitude)."""
+    match = _LOCATION_PATTERN.match(location or "")
+    if match is None:
+        return None
+    try:
+        latitude, longitude = float(match.group(2)), float(match.group(3))
+    except ValueError:
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    return match.group(1), latitude, longitude
+
+def geohash_encode(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if longitude >= mid:
+                value = (value << 1) | 1
+                lon_lo = mid
+            else:
+                value <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if latitude >= mid:
+                value = (value << 1) | 1
+                lat_lo = mid
+            else:
+                value <<= 1
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits = value = 0
+    return "".join(chars)
+
+def geohash_decode(geohash: str) -> tuple:
+    """Bounding box of ``geohash`` as (lat_lo, lat_hi, lon_lo, lon_hi)."""
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    even = True
+    for char in geohash:
+        value = _BASE32_INDEX[char]
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            if even:
+                mid = (lon_lo + lon_hi) / 2
+                lon_lo, lon_hi = (mid, lon_hi) if bit else (lon_lo, mid)
+            else:
+                mid = (lat_lo + lat_hi) / 2
+                lat_lo, lat_hi = (mid, lat_hi) if bit else (lat_lo, mid)
+            even = not even
+    return lat_lo, lat_hi, lon_lo, lon_hi
+
+def cell_size(precision: int) -> tuple:
+    """(height, width) in degrees of a geohash cell of ``precision`` characters."""
+    bits = 5 * precision
+    lon_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+def bounding_box(latitude: float, longitude: float, radius_m: float) -> tuple:
+    """Lat/lon box around the circle as (lat_lo, lat_hi, lon_lo, lon_hi).
+
+    Longitudes are not normalized, so the box may extend past +/-180; a box
+    touching a pole spans every longitude.
+    """
+    d_lat = math.degrees(radius_m / EARTH_RADIUS_M)
+    lat_lo, lat_hi = latitude - d_lat, latitude + d_lat
+    if lat_lo <= -90 or lat_hi >= 90:
+        return max(lat_lo, -90.0), min(lat_hi, 90.0), -180.0, 180.0
+    # Widest point of the circle is at the latitude farthest from the equator
+    widest = max(abs(lat_lo), abs(lat_hi))
+    d_lon = math.degrees(radius_m / (EARTH_RADIUS_M * math.cos(math.radians(widest))))
+    if d_lon >= 180:
+        return lat_lo, lat_hi, -180.0, 180.0
+    return lat_lo, lat_hi, longitude - d_lon, longitude + d_lon
+
+def _cells(box: tuple, precision: int, limit: int):
+    lat_lo, lat_hi, lon_lo, lon_hi = box
+    height, width = cell_size(precision)
+    rows = math.floor((lat_hi + 90) / height) - math.floor((lat_lo + 90) / height) + 1
+    columns = min(math.floor((lon_hi + 180) / width) - math.floor((lon_lo + 180) / width) + 1,
+                  1 << ((5 * precision + 1) // 2))
+    if rows * columns > limit:
+        return None
+    first_row = math.floor((lat_lo + 90) / height)
+    first_column = math.floor((lon_lo + 180) / width)
+    cells = set()
+    for row in range(rows):
+        latitude = min((first_row + row + 0.5) * height - 90, 90.0)
+        for column in range(columns):
+            longitude = (first_column + column + 0.5) * width - 180
+            # Wrap across the antimeridian
+            longitude = (longitude + 180) % 360 - 180
+            cells.add(geohash_encode(latitude, longitude, precision))
+    return cells
+
+def covering_prefixes(latitude: float, longitude: float, radius_m: float,
+                      max_cells: int = None) -> list:
+    """Sorted geohash prefixes whose cells together cover the search circle.
+
+    Uses the longest prefix length (smallest cells) for which the circle's
+    bounding box needs at most ``max_cells`` cells, so each prefix becomes one
+    narrow index range scan.
+    """
+    max_cells = max_cells or NEARBY_MAX_CELLS
+    box = bounding_box(latitude, longitude, radius_m)
+    best = [""]
+    for precision in range(1, GEOHASH_PRECISION + 1):
+        cells = _cells(box, precision, max_cells)
+        if cells is None:
+            break
+        best = sorted(cells)
+    return best
+
+def prefix_ranges(prefixes: list) -> list:
+    """[lo, hi) string bounds matching every geohash starting with each prefix.
+
+    Valid under byte-wise (COLLATE "C") ordering, where "~" sorts after every
+    base32 character.
+    """
+    return [(prefix, prefix + "~") for prefix in prefixes]
@@ -0,0 +1,139 @@
+import csv
+import hashlib
+import logging
+import os
+import tempfile
+from .geo import EARTH_RADIUS_M
+
+logger = logging.getLogger(__name__)
+
+# "offline" resolves every submission to the nearest gazetteer city,
+# "none" disables the enrichment stage
+GEOCODER = os.getenv("GEOCODER", "none")
+# CSV with a name,country,latitude,longitude header
+GAZETTEER_PATH = os.getenv(
+    "GAZETTEER_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "gazetteer.csv")
+)
+# Where the parsed coordinates are cached as .npy files for memory-mapping
+GAZETTEER_CACHE_DIR = os.getenv("GAZETTEER_CACHE_DIR", os.path.join(tempfile.gettempdir(), "gazetteer"))
+
+# numpy is imported inside the functions that use it, so that importing the
+# service does not pay for it when the geocoder is disabled
+
+# Rows of the brute-force fallback's distance matrix computed at a time
+_FALLBACK_CHUNK = 256
+
+def _cache_path(path: str, cache_dir: str) -> str:
+    stat = os.stat(path)
+    key = hashlib.sha1(f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f"gazetteer-{key}.npy")
+
+def load_gazetteer(path: str = None, cache_dir: str = None):
+    """Read the gazetteer as (names, countries, coordinates).
+
+    ``coordinates`` is an (n, 2) float64 array of latitude/longitude in
+    degrees, memory-mapped from a .npy cache so that every worker process
+    shares the same pages; the cache is rebuilt when the CSV changes.
+    """
+    import numpy as np
+
+    path = path or GAZETTEER_PATH
+    cache_dir = cache_dir or GAZETTEER_CACHE_DIR
+    names, countries, rows = [], [], []
+    with open(path, newline="", encoding="utf-8") as f:
+        for record in csv.DictReader(f):
+            names.append(record["name"])
+            countries.append(record["country"])
+            rows.append((float(record["latitude"]), float(record["longitude"])))
+    if not rows:
+        raise ValueError(f"Gazetteer {path} is empty")
+
+    cache = _cache_path(path, cache_dir)
+    if not os.path.exists(cache):
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write to a private file first so concurrent workers never map a
+        # half-written cache
+        partial = f"{cache}.{os.getpid()}.tmp"
+        with open(partial, "wb") as f:
+            np.save(f, np.array(rows, dtype=np.float64))
+        os.replace(partial, cache)
+    return names, countries, np.load(cache, mmap_mode="r")
+
+def to_unit_vectors(latitudes, longitudes):
+    """Points on the unit sphere; chord length grows with great-circle distance."""
+    import numpy as np
+
+    phi = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lam = np.radians(np.asarray(longitudes, dtype=np.float64))
+    cos_phi = np.cos(phi)
+    return np.stack((cos_phi * np.cos(lam), cos_phi * np.sin(lam), np.sin(phi)), axis=-1)
+
+def chord_to_metres(chord):
+    import numpy as np
+
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.minimum(1.0, np.asarray(chord) / 2))
+
+class ReverseGeocoder:
+    """Nearest known city for a coordinate, from an offline gazetteer.
+
+    Cities are indexed as 3-D unit vectors in a KD-tree (scipy's cKDTree), so
+    the Euclidean nearest neighbour is also the great-circle nearest one and
+    nothing special happens at the antimeridian or the poles. Without scipy
+    the same search runs as a vectorized NumPy scan.
+    """
+
+    def __init__(self, names: list, countries: list, coordinates):
+        self.names = names
+        self.countries = countries
+        self.coordinates = coordinates
+        self._points = to_unit_vectors(coordinates[:, 0], coordinates[:, 1])
+        try:
+            from scipy.spatial import cKDTree
+        except ImportError:
+            logger.warning("scipy is not installed, reverse geocoding falls back to a linear scan")
+            self._tree = None
+        else:
+            self._tree = cKDTree(self._points)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _nearest(self, points):
+        if self._tree is not None:
+            chords, indices = self._tree.query(points)
+            return chords, indices
+        import numpy as np
+
+        indices = np.empty(len(points), dtype=np.intp)
+        for start in range(0, len(points), _FALLBACK_CHUNK):
+            # Largest dot product = smallest angle
+            dots = points[start:start + _FALLBACK_CHUNK] @ self._points.T
+            indices[start:start + _FALLBACK_CHUNK] = np.argmax(dots, axis=1)
+        chords = np.linalg.norm(points - self._points[indices], axis=1)
+        return chords, indices
+
+    def lookup(self, latitude: float, longitude: float) -> tuple:
+        """(city, country, distance in metres) of the nearest city."""
+        return self.lookup_many([latitude], [longitude])[0]
+
+    def lookup_many(self, latitudes, longitudes) -> list:
+        """Batch ``lookup``, one tree query for all points."""
+        if len(latitudes) == 0:
+            return []
+        chords, indices = self._nearest(to_unit_vectors(latitudes, longitudes))
+        distances = chord_to_metres(chords)
+        return [
+            (self.names[index], self.countries[index], float(distance))
+            for index, distance in zip(indices.tolist(), distances.tolist())
+        ]
+
+def create_geocoder(backend: str = None):
+    backend = backend or GEOCODER
+    if backend == "none":
+        return None
+    if backend == "offline":
+        names, countries, coordinates = load_gazetteer()
+        logger.info(f"Loaded {len(names)} gazetteer entries from {GAZETTEER_PATH}")
+        return ReverseGeocoder(names, countries, coordinates)
+    raise ValueError(f"Unknown GEOCODER: {backend}")
@@ -0,0 +1,165 @@
+import itertools
+import math
+import os
+from .geo import bounding_box, haversine_m, NEARBY_MAX_RADIUS_M
+
+# Upper bound on the finest grid cell edge in degrees (~1 km at the equator)
+GEOFENCE_CELL_DEG = float(os.getenv("GEOFENCE_CELL_DEG", "0.01"))
+GEOFENCE_MAX_PER_CLIENT = int(os.getenv("GEOFENCE_MAX_PER_CLIENT", "100"))
+
+class Fence:
+    """A radius ("circle") or bounding box ("box") fence owned by one client."""
+
+    __slots__ = ("fence_id", "owner", "kind", "params", "bbox", "placement")
+
+    def __init__(self, kind: str, params: tuple, bbox: tuple):
+        self.fence_id = None
+        self.owner = None
+        self.kind = kind
+        self.params = params
+        # (lat_lo, lat_hi, lon_lo, lon_hi), lon_hi may exceed 180
+        self.bbox = bbox
+        self.placement = None
+
+    def contains(self, latitude: float, longitude: float) -> bool:
+        if self.kind == "circle":
+            center_lat, center_lon, radius_m = self.params
+            return haversine_m(center_lat, center_lon, latitude, longitude) <= radius_m
+        min_lat, min_lon, max_lat, max_lon = self.params
+        if not min_lat <= latitude <= max_lat:
+            return False
+        if min_lon <= max_lon:
+            return min_lon <= longitude <= max_lon
+        # Box crossing the antimeridian
+        return longitude >= min_lon or longitude <= max_lon
+
+    def describe(self) -> dict:
+        if self.kind == "circle":
+            lat, lon, radius = self.params
+            return {"type": "circle", "lat": lat, "lon": lon, "radius": radius}
+        min_lat, min_lon, max_lat, max_lon = self.params
+        return {"type": "box", "min_lat": min_lat, "min_lon": min_lon,
+                "max_lat": max_lat, "max_lon": max_lon}
+
+def _number(spec: dict, key: str, low: float, high: float) -> float:
+    value = spec.get(key)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"{key} must be a number")
+    if not (low <= value <= high):
+        raise ValueError(f"{key} must be between {low} and {high}")
+    return float(value)
+
+def parse_fence(spec) -> Fence:
+    """Build a Fence from a client subscription, raising ValueError if invalid.
+
+    ``{"type": "circle", "lat": .., "lon": .., "radius": metres}`` or
+    ``{"type": "box", "min_lat": .., "min_lon": .., "max_lat": .., "max_lon": ..}``;
+    a box with min_lon > max_lon wraps across the antimeridian.
+    """
+    if not isinstance(spec, dict):
+        raise ValueError("fence must be an object")
+    kind = spec.get("type")
+    if kind == "circle":
+        lat = _number(spec, "lat", -90, 90)
+        lon = _number(spec, "lon", -180, 180)
+        radius = _number(spec, "radius", 0, NEARBY_MAX_RADIUS_M)
+        return Fence(kind, (lat, lon, radius), bounding_box(lat, lon, radius))
+    if kind == "box":
+        min_lat = _number(spec, "min_lat", -90, 90)
+        max_lat = _number(spec, "max_lat", -90, 90)
+        min_lon = _number(spec, "min_lon", -180, 180)
+        max_lon = _number(spec, "max_lon", -180, 180)
+        if min_lat > max_lat:
+            raise ValueError("min_lat must not exceed max_lat")
+        lon_hi = max_lon if min_lon <= max_lon else max_lon + 360
+        return Fence(kind, (min_lat, min_lon, max_lat, max_lon), (min_lat, max_lat, min_lon, lon_hi))
+    raise ValueError("fence type must be 'circle' or 'box'")
+
+class GeofenceIndex:
+    """Multi-level grid of fences for point-in-fence lookups.
+
+    Level ``k`` is a grid of cells ``2**k`` times the finest cell size. A
+    fence is stored at the finest level where its bounding box spans at most
+    2x2 cells, in each of those cells. A lookup visits one cell per occupied
+    level, and every fence in that cell has a bounding box comparable to the
+    cell, so the work grows with the fences near the point rather than with
+    the total number of fences.
+    """
+
+    def __init__(self, cell_deg: float = None):
+        # Cells must tile 360 degrees exactly for columns to wrap at the
+        # antimeridian, so the finest level is rounded to 360 / 2**n degrees
+        finest = max(0, math.ceil(math.log2(360 / (cell_deg or GEOFENCE_CELL_DEG))))
+        self.levels = finest + 1
+        self._columns = [1 << (finest - level) for level in range(self.levels)]
+        self._sizes = [360 / columns for columns in self._columns]
+        self.cell_deg = self._sizes[0]
+        # (level, row, column) -> {fence_id: Fence}
+        self._buckets = {}
+        # level -> number of fences stored there, only occupied levels are probed
+        self._occupied = {}
+        self._fences = {}
+        self._ids = itertools.count(1)
+
+    def __len__(self) -> int:
+        return len(self._fences)
+
+    def get(self, fence_id: int):
+        return self._fences.get(fence_id)
+
+    def _row(self, level: int, latitude: float) -> int:
+        return math.floor((latitude + 90) / self._sizes[level])
+
+    def _column(self, level: int, longitude: float) -> int:
+        return math.floor((longitude + 180) / self._sizes[level]) % self._columns[level]
+
+    def _place(self, bbox: tuple):
+        lat_lo, lat_hi, lon_lo, lon_hi = bbox
+        for level, size in enumerate(self._sizes):
+            rows = self._row(level, lat_hi) - self._row(level, lat_lo) + 1
+            first_column = math.floor((lon_lo + 180) / size)
+            columns = math.floor((lon_hi + 180) / size) - first_column + 1
+            if (rows <= 2 and columns <= 2) or level == self.levels - 1:
+                columns = min(columns, self._columns[level])
+                first_row = self._row(level, lat_lo)
+                return level, [
+                    (level, first_row + row, (first_column + column) % self._columns[level])
+                    for row in range(rows)
+                    for column in range(columns)
+                ]
+
+    def add(self, fence: Fence, owner=None) -> int:
+        fence.fence_id = next(self._ids)
+        fence.owner = owner
+        level, keys = self._place(fence.bbox)
+        fence.placement = (level, keys)
+        for key in keys:
+            self._buckets.setdefault(key, {})[fence.fence_id] = fence
+        self._occupied[level] = self._occupied.get(level, 0) + 1
+        self._fences[fence.fence_id] = fence
+        return fence.fence_id
+
+    def remove(self, fence_id: int):
+        fence = self._fences.pop(fence_id, None)
+        if fence is None:
+            return None
+        level, keys = fence.placement
+        for key in keys:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.pop(fence_id, None)
+                if not bucket:
+                    del self._buckets[key]
+        self._occupied[level] -= 1
+        if not self._occupied[level]:
+            del self._occupied[level]
+        return fence
+
+    def match(self, latitude: float, longitude: float) -> list:
+        """Fences containing the point."""
+        matches = []
+        for level in self._occupied:
+            bucket = self._buckets.get((level, self._row(level, latitude), self._column(level, longitude)))
+            if bucket:
+                matches.extend(fence for fence in bucket.values() if fence.contains(latitude, longitude))
+        return matches
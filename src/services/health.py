@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from time import monotonic
+from prometheus_client import Gauge
+
+logger = logging.getLogger(__name__)
+
+HEALTH_PROBE_SECONDS = float(os.getenv("HEALTH_PROBE_SECONDS", "5"))
+# A database round trip slower than the timeout counts as down, slower than
+# HEALTH_DB_SLOW_SECONDS as degraded
+HEALTH_PROBE_TIMEOUT = float(os.getenv("HEALTH_PROBE_TIMEOUT", "2"))
+HEALTH_DB_SLOW_SECONDS = float(os.getenv("HEALTH_DB_SLOW_SECONDS", "0.25"))
+# Share of the pool checked out from which it counts as saturated
+HEALTH_POOL_SATURATION = float(os.getenv("HEALTH_POOL_SATURATION", "0.9"))
+# Fill level of the fullest WebSocket client queue from which the subsystem
+# counts as backed up
+HEALTH_WS_BACKLOG = float(os.getenv("HEALTH_WS_BACKLOG", "0.8"))
+# Probe results older than this many intervals mean the prober is stuck
+HEALTH_STALE_INTERVALS = 3
+
+OK = "ok"
+DEGRADED = "degraded"
+DOWN = "down"
+STARTING = "starting"
+_SEVERITY = {OK: 0, DEGRADED: 1, DOWN: 2}
+GAUGE_VALUES = {OK: 1, DEGRADED: 0.5, DOWN: 0}
+
+SYSTEM_HEALTH = Gauge(
+    'system_health',
+    'System health status (1=healthy, 0.5=degraded, 0=unhealthy)',
+    ['component'],
+    multiprocess_mode='livemin'
+)
+
+class HealthProber:
+    """Checks the service's dependencies in the background and caches the result.
+
+    Every ``interval`` seconds it measures a database round trip, pool
+    saturation, the worst event loop lag since the last probe and the
+    WebSocket send backlog, and updates the ``system_health`` gauge. Readers
+    (``/service``, the probes, the devops endpoints) only look at the cached
+    ``status``, so answering them never touches the database.
+    """
+
+    def __init__(self, repository=None, manager=None, loop_lag=None, interval: float = None,
+                 timeout: float = None):
+        self.repository = repository
+        self.manager = manager
+        self.loop_lag = loop_lag
+        self.interval = HEALTH_PROBE_SECONDS if interval is None else interval
+        self.timeout = HEALTH_PROBE_TIMEOUT if timeout is None else timeout
+        self.status = {"status": STARTING, "checked_at": None, "components": {}}
+        self.checked_at = None
+        self._task = None
+        self._ping = None
+
+    @property
+    def database_ok(self) -> bool:
+        return self.status["components"].get("database", {}).get("status") in (OK, DEGRADED)
+
+    def alive(self) -> bool:
+        """False once the prober stopped producing results, e.g. it crashed."""
+        if self._task is None or self.checked_at is None:
+            # Not started yet, or still on its first probe
+            return self._task is None or not self._task.done()
+        return monotonic() - self.checked_at < HEALTH_STALE_INTERVALS * self.interval + self.timeout
+
+    async def start(self):
+        """Probe once, then keep probing in the background."""
+        if self._task is None:
+            await self._probe_logged()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self._probe_logged()
+
+    async def _probe_logged(self):
+        try:
+            await self.probe()
+        except Exception as error:
+            logger.error(f"Error probing health: {error}")
+
+    async def probe(self) -> dict:
+        components = {
+            "database": await self._check_database(),
+            "database_pool": self._check_pool(),
+            "event_loop": self._check_event_loop(),
+            "websocket": self._check_websocket(),
+        }
+        components = {name: check for name, check in components.items() if check is not None}
+        overall = max((check["status"] for check in components.values()), key=_SEVERITY.get, default=OK)
+        for name, check in components.items():
+            previous = self.status["components"].get(name, {}).get("status")
+            if previous not in (None, check["status"]):
+                log = logger.info if check["status"] == OK else logger.warning
+                log(f"Health of {name} changed from {previous} to {check['status']}", extra=check)
+            SYSTEM_HEALTH.labels(component=name).set(GAUGE_VALUES[check["status"]])
+        self.status = {
+            "status": overall,
+            "checked_at": datetime.now(timezone.utc),
+            "components": components
+        }
+        self.checked_at = monotonic()
+        return self.status
+
+    async def _timed_ping(self) -> float:
+        start = monotonic()
+        await self.repository.ping()
+        return monotonic() - start
+
+    async def _check_database(self):
+        if self.repository is None:
+            return None
+        # A ping that is still hanging is waited on again rather than piling
+        # up another one behind it
+        if self._ping is None or self._ping.done():
+            self._ping = asyncio.ensure_future(self._timed_ping())
+        try:
+            round_trip = await asyncio.wait_for(asyncio.shield(self._ping), self.timeout)
+        except asyncio.TimeoutError:
+            return {"status": DOWN, "error": f"No answer within {self.timeout:g}s"}
+        except Exception as error:
+            return {"status": DOWN, "error": str(error) or type(error).__name__}
+        return {"status": DEGRADED if round_trip >= HEALTH_DB_SLOW_SECONDS else OK, "round_trip_seconds": round_trip}
+
+    def _check_pool(self):
+        if self.repository is None:
+            return None
+        stats = self.repository.pool_stats()
+        saturation = stats["in_use"] / stats["max_size"] if stats["max_size"] else 0.0
+        saturated = saturation >= HEALTH_POOL_SATURATION or bool(stats.get("waiters"))
+        return dict(stats, status=DEGRADED if saturated else OK, saturation=saturation)
+
+    def _check_event_loop(self):
+        if self.loop_lag is None:
+            return None
+        lag = self.loop_lag.take_peak()
+        return {"status": DEGRADED if lag >= self.loop_lag.warn_after else OK, "lag_seconds": lag}
+
+    def _check_websocket(self):
+        if self.manager is None:
+            return None
+        queued, fullest = self.manager.backlog()
+        return {
+            "status": DEGRADED if fullest >= HEALTH_WS_BACKLOG else OK,
+            "connections": self.manager.connection_count,
+            "queued_messages": queued,
+            "fullest_queue": fullest
+        }
+
+    async def close(self):
+        for task in (self._task, self._ping):
+            if task is not None:
+                task.cancel()
+        await asyncio.gather(*(task for task in (self._task, self._ping) if task is not None),
+                             return_exceptions=True)
+        self._task = None
+        self._ping = None
+
+prober = HealthProber()
@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from time import monotonic
+from prometheus_client import Counter
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+# How long a replica answers replays from memory; the database constraint
+# keeps deduplicating after that
+IDEMPOTENCY_CACHE_TTL = float(os.getenv("IDEMPOTENCY_CACHE_TTL", "86400"))
+IDEMPOTENCY_KEY_MAX_LENGTH = int(os.getenv("IDEMPOTENCY_KEY_MAX_LENGTH", "255"))
+
+IDEMPOTENCY_LOOKUPS = Counter(
+    'idempotency_cache_lookups_total',
+    'Idempotency-Key lookups in the in-process cache',
+    ['result']
+)
+
+IDEMPOTENT_REPLAYS = Counter(
+    'idempotent_replays_total',
+    'Keyed submissions answered with the response of an earlier one',
+    ['source']
+)
+
+class IdempotencyCache:
+    """Responses of keyed submissions, so retries replay instead of writing.
+
+    Finished responses are kept in a bounded LRU for ``ttl`` seconds.
+    Duplicates that arrive while the first submission is still running wait
+    for it rather than starting their own. The write itself runs as a
+    separate task, so a caller that goes away does not cancel it for the
+    others.
+    """
+
+    def __init__(self, max_size: int = None, ttl: float = None):
+        self.max_size = max_size or IDEMPOTENCY_CACHE_SIZE
+        self.ttl = ttl if ttl is not None else IDEMPOTENCY_CACHE_TTL
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._hits = IDEMPOTENCY_LOOKUPS.labels(result="hit")
+        self._misses = IDEMPOTENCY_LOOKUPS.labels(result="miss")
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] <= monotonic():
+            del self._entries[key]
+            entry = None
+        if entry is None:
+            self._misses.inc()
+            return None
+        self._entries.move_to_end(key)
+        self._hits.inc()
+        return entry[0]
+
+    def put(self, key: str, response: dict):
+        self._entries[key] = (response, monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def run(self, key: str, create) -> dict:
+        """Response of the first submission with ``key``.
+
+        ``create`` is an async callable doing the actual submission; it is
+        only called when neither the cache nor an in-flight submission has
+        the answer.
+        """
+        response = self.get(key)
+        if response is not None:
+            IDEMPOTENT_REPLAYS.labels(source="cache").inc()
+            return dict(response)
+        task = self._inflight.get(key)
+        if task is not None:
+            IDEMPOTENT_REPLAYS.labels(source="coalesced").inc()
+        else:
+            task = asyncio.ensure_future(create())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        return dict(await asyncio.shield(task))
+
+    def _finished(self, key: str, task):
+        self._inflight.pop(key, None)
+        # Failures are not cached, the next retry tries again
+        if not task.cancelled() and task.exception() is None:
+            self.put(key, task.result())
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import os
+from time import time
+from prometheus_client import Counter, Histogram, Gauge
+
+logger = logging.getLogger(__name__)
+
+# "direct" writes every submission on its own, "batched" goes through IngestBuffer
+INGEST_MODE = os.getenv("INGEST_MODE", "direct")
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+INGEST_FLUSH_INTERVAL_MS = float(os.getenv("INGEST_FLUSH_INTERVAL_MS", "50"))
+INGEST_MAX_BACKLOG = int(os.getenv("INGEST_MAX_BACKLOG", "10000"))
+
+# Callers either wait until their row is committed or return once it is queued
+ACK_FLUSH = "flush"
+ACK_ENQUEUE = "enqueue"
+INGEST_DEFAULT_ACK = os.getenv("INGEST_ACK", ACK_FLUSH)
+
+INGEST_FLUSH_SIZE = Histogram(
+    'ingest_flush_size',
+    'Number of submissions written per flush',
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+)
+
+INGEST_FLUSH_LATENCY = Histogram(
+    'ingest_flush_latency_seconds',
+    'Time spent writing one flush to the database'
+)
+
+INGEST_BACKLOG = Gauge(
+    'ingest_backlog',
+    'Submissions waiting in the ingest buffer',
+    multiprocess_mode='livesum'
+)
+
+INGEST_FLUSH_FAILURES = Counter(
+    'ingest_flush_failures_total',
+    'Flushes that failed to reach the database'
+)
+
+class IngestBuffer:
+    """Bounded in-process buffer that group-commits location submissions.
+
+    Rows are flushed with one multi-row write when ``batch_size`` rows are
+    queued or ``flush_interval`` seconds after the first queued row, whichever
+    comes first. A full buffer makes ``submit`` wait, which pushes back on
+    callers instead of growing memory.
+    """
+
+    def __init__(self, repository, batch_size: int = None,
+                 flush_interval: float = None, max_backlog: int = None):
+        self.repository = repository
+        self.batch_size = batch_size or INGEST_BATCH_SIZE
+        self.flush_interval = flush_interval if flush_interval is not None else INGEST_FLUSH_INTERVAL_MS / 1000
+        self.max_backlog = max_backlog or INGEST_MAX_BACKLOG
+        self._queue = None
+        self._task = None
+        self._filling = False
+        self._closing = False
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            if self._queue is None:
+                self._queue = asyncio.Queue(maxsize=self.max_backlog)
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, request_id: str, location: str, status: str,
+                     ack: str = None, coordinates: tuple = None) -> bool:
+        self._ensure_started()
+        ack = ack or INGEST_DEFAULT_ACK
+        future = asyncio.get_running_loop().create_future() if ack == ACK_FLUSH else None
+        await self._queue.put((request_id, location, status, coordinates or (), time(), future))
+        INGEST_BACKLOG.set(self._queue.qsize())
+        if future is None:
+            return True
+        return await future
+
+    async def _fill_batch(self, batch: list):
+        loop = asyncio.get_running_loop()
+        batch.append(await self._queue.get())
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - loop.time()
+            if remaining <= 0 or self._closing:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+    async def _run(self):
+        while not (self._closing and self._queue.empty()):
+            batch = []
+            self._filling = True
+            try:
+                await self._fill_batch(batch)
+            except asyncio.CancelledError:
+                # close() only cancels while we are waiting for rows, so
+                # whatever was collected so far still has to be written
+                if batch:
+                    await self._flush(batch)
+                raise
+            finally:
+                self._filling = False
+            await self._flush(batch)
+
+    async def _flush(self, batch: list):
+        INGEST_BACKLOG.set(self._queue.qsize())
+        start_time = time()
+        rows = [
+            (request_id, location, status, start_time - enqueued_at, *coordinates)
+            for request_id, location, status, coordinates, enqueued_at, _ in batch
+        ]
+        try:
+            ok = await self.repository.create_locations(rows)
+        except Exception as error:
+            logger.error(f"Error flushing ingest buffer: {error}")
+            ok = False
+
+        INGEST_FLUSH_SIZE.observe(len(batch))
+        INGEST_FLUSH_LATENCY.observe(time() - start_time)
+        if not ok:
+            INGEST_FLUSH_FAILURES.inc()
+            logger.error(f"Failed to flush {len(batch)} buffered submissions")
+
+        for *_, future in batch:
+            if future is not None and not future.done():
+                future.set_result(ok)
+
+    async def close(self):
+        """Stop the flusher after writing whatever is still queued."""
+        self._closing = True
+        if self._task is not None:
+            if self._filling:
+                self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._queue is None:
+            return
+        while not self._queue.empty():
+            batch = []
+            while not self._queue.empty() and len(batch) < self.batch_size:
+                batch.append(self._queue.get_nowait())
+            await self._flush(batch)
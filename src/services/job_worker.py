@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import os
+import random
+from prometheus_client import Counter, Histogram, Gauge
+
+logger = logging.getLogger(__name__)
+
+# Claim loops per process, 0 disables background processing
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+JOB_BATCH_SIZE = int(os.getenv("JOB_BATCH_SIZE", "100"))
+# Seconds a claim is held; unfinished jobs are picked up again after this
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "30"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "1"))
+JOB_RETRY_MAX_SECONDS = float(os.getenv("JOB_RETRY_MAX_SECONDS", "300"))
+# Idle wait when the queue was empty
+JOB_POLL_INTERVAL_MS = float(os.getenv("JOB_POLL_INTERVAL_MS", "500"))
+JOB_BACKLOG_INTERVAL = float(os.getenv("JOB_BACKLOG_INTERVAL", "5"))
+
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+STATUS_RETRY = "received"
+
+JOBS_PROCESSED = Counter(
+    'jobs_processed_total',
+    'Claimed jobs by outcome',
+    ['outcome']
+)
+
+JOB_CLAIM_SIZE = Histogram(
+    'job_claim_size',
+    'Jobs returned by one claim',
+    buckets=(0, 1, 5, 10, 25, 50, 100, 250, 500, 1000)
+)
+
+JOB_QUEUE_LAG = Histogram(
+    'job_queue_lag_seconds',
+    'Time from submission to a job being claimed',
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+)
+
+# Every worker reports the same table-wide numbers
+JOB_BACKLOG = Gauge(
+    'job_backlog',
+    'Unfinished jobs, ready to claim or held under a lease',
+    ['state'],
+    multiprocess_mode='livemax'
+)
+
+class Job:
+    __slots__ = ("request_id", "city", "latitude", "longitude", "attempts", "age")
+
+    def __init__(self, request_id, city, latitude, longitude, attempts, age):
+        self.request_id = request_id
+        self.city = city
+        self.latitude = latitude
+        self.longitude = longitude
+        self.attempts = attempts
+        self.age = age
+
+async def validate_locations(jobs: list) -> list:
+    """Default processor: a job fails when its stored coordinates are unusable.
+
+    Processors take a batch of jobs and return one error message (or None
+    for success) per job; raising fails the whole batch with that error.
+    """
+    errors = []
+    for job in jobs:
+        if job.latitude is None or job.longitude is None:
+            errors.append("location has no coordinates")
+        elif not (-90 <= job.latitude <= 90 and -180 <= job.longitude <= 180):
+            errors.append("coordinates out of range")
+        else:
+            errors.append(None)
+    return errors
+
+def retry_delay(attempts: int) -> float:
+    # Exponential backoff with full jitter
+    return random.uniform(0, min(JOB_RETRY_MAX_SECONDS, JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1)))
+
+class JobWorker:
+    """Moves submissions through received -> processing -> completed/failed.
+
+    Each loop claims up to ``batch_size`` jobs with ``FOR UPDATE SKIP LOCKED``,
+    so any number of loops on any number of replicas share the queue without
+    claiming the same row twice. A claim is a lease: if the worker dies the
+    row becomes claimable again after ``lease_seconds``, and the attempts
+    counter fences off late results from the worker that lost it. Failed
+    jobs are retried with backoff until ``max_attempts``.
+    """
+
+    def __init__(self, repository, processor=None, concurrency: int = None,
+                 batch_size: int = None, lease_seconds: float = None,
+                 max_attempts: int = None, poll_interval: float = None):
+        self.repository = repository
+        self.processor = processor or validate_locations
+        self.concurrency = concurrency if concurrency is not None else JOB_WORKERS
+        self.batch_size = batch_size or JOB_BATCH_SIZE
+        self.lease_seconds = lease_seconds or JOB_LEASE_SECONDS
+        self.max_attempts = max_attempts or JOB_MAX_ATTEMPTS
+        self.poll_interval = poll_interval if poll_interval is not None else JOB_POLL_INTERVAL_MS / 1000
+        self._tasks = []
+        self._stopping = None
+
+    def start(self):
+        if self._tasks or self.concurrency <= 0:
+            return
+        self._stopping = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._report_backlog()))
+        logger.info(f"Started {self.concurrency} job workers")
+
+    async def _sleep(self, seconds: float):
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                claimed = await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                logger.error(f"Job worker error: {error}")
+                claimed = 0
+            # A full batch means more is probably waiting
+            if claimed < self.batch_size:
+                await self._sleep(self.poll_interval * random.uniform(0.5, 1.5))
+
+    async def run_once(self) -> int:
+        """Claim and process one batch, returning how many jobs were claimed."""
+        rows = await self.repository.claim_jobs(self.batch_size, self.lease_seconds)
+        if not rows:
+            JOB_CLAIM_SIZE.observe(0)
+            return 0
+        jobs = [Job(*row) for row in rows]
+        JOB_CLAIM_SIZE.observe(len(jobs))
+        for job in jobs:
+            if job.attempts == 1:
+                JOB_QUEUE_LAG.observe(job.age)
+
+        try:
+            errors = await self.processor(jobs)
+        except Exception as error:
+            logger.error(f"Job processor failed on a batch of {len(jobs)}: {error}")
+            errors = [str(error)] * len(jobs)
+
+        outcomes = []
+        labels = {}
+        for job, error in zip(jobs, errors):
+            if error is None:
+                outcome = (job.request_id, job.attempts, STATUS_COMPLETED, 0.0, None)
+                labels[job.request_id] = "completed"
+            elif job.attempts >= self.max_attempts:
+                outcome = (job.request_id, job.attempts, STATUS_FAILED, 0.0, error)
+                labels[job.request_id] = "failed"
+            else:
+                outcome = (job.request_id, job.attempts, STATUS_RETRY, retry_delay(job.attempts), error)
+                labels[job.request_id] = "retried"
+            outcomes.append(outcome)
+
+        finished = await self.repository.finish_jobs(outcomes)
+        if finished is None:
+            # The leases expire and the jobs are claimed again
+            JOBS_PROCESSED.labels(outcome="unrecorded").inc(len(jobs))
+            return len(jobs)
+        finished = set(finished)
+        for request_id, label in labels.items():
+            JOBS_PROCESSED.labels(outcome=label if request_id in finished else "lost_lease").inc()
+        return len(jobs)
+
+    async def _report_backlog(self):
+        while not self._stopping.is_set():
+            backlog = await self.repository.job_backlog()
+            if backlog is not None:
+                ready, leased = backlog
+                JOB_BACKLOG.labels(state="ready").set(ready)
+                JOB_BACKLOG.labels(state="leased").set(leased)
+            await self._sleep(JOB_BACKLOG_INTERVAL)
+
+    async def close(self, timeout: float = 10):
+        """Stop claiming and give in-flight batches ``timeout`` seconds to finish."""
+        if not self._tasks:
+            return
+        self._stopping.set()
+        done, pending = await asyncio.wait(self._tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        self._tasks = []
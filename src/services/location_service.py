@@ -1,45 +1,427 @@
-import logging
-from uuid import uuid4
-from time import time
-from ..repositories.location_repository import LocationRepository
-from ..models.location_model import LocationData, LocationResponse
-
-logger = logging.getLogger(__name__)
-
-class LocationService:
-    def __init__(self):
-        self.repository = LocationRepository()
-
-    def submit_location(self, data: LocationData) -> dict:
-        start_time = time()
-        request_id = str(uuid4())
-        
-        location_str = f"{data.city} ({data.latitude}, {data.longitude})"
-        
-        if not self.repository.create_location(request_id, location_str, "received"):
-            raise Exception("Failed to create location record")
-
-        duration = time() - start_time
-        if not self.repository.update_response_time(request_id, duration):
-            logger.warning(f"Failed to update response time for request {request_id}")
-
-        logger.info(f"Location data processed: {data.city} at {data.latitude}, {data.longitude} (ID: {request_id})")
-        return {
-            "request_id": request_id,
-            "status": "received",
-            "response_time": f"{duration:.4f} sec"
-        }
-
-    def get_request_status(self, request_id: str) -> LocationResponse:
-        result = self.repository.get_location(request_id)
-        if not result:
-            raise Exception("Request not found")
-
-        return LocationResponse(
-            request_id=result[0],
-            location=result[1],
-            status=result[2],
-            created_at=result[3],
-            updated_at=result[4],
-            response_time=result[5]
-        ) 
\ No newline at end of file
+import asyncio
+import base64
+import csv
+import io
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from uuid import UUID
+from time import time, monotonic
+from pydantic import ValidationError
+from ..database.partitions import uuid7
+from ..repositories.async_location_repository import create_location_repository
+from ..repositories.location_repository import RECORD_COLUMNS, records_params
+from .ingest_buffer import IngestBuffer, INGEST_MODE
+from .record_stream import RecordSplitter
+from .status_cache import create_status_cache, StatusCache
+from .status_notifier import create_status_notifier
+from .idempotency import IdempotencyCache, IDEMPOTENT_REPLAYS
+from .startup import keep_trying
+from .geo import format_location, geohash_encode, covering_prefixes, prefix_ranges
+from .geocoder import create_geocoder
+from .job_worker import JobWorker, STATUS_COMPLETED, STATUS_FAILED
+from ..models.location_model import LocationData, LocationResponse, NearbyLocation, LocationRecord, LocationPage
+
+logger = logging.getLogger(__name__)
+
+# Valid records are written with one COPY per this many records
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "1000"))
+
+def _coordinates(data: LocationData) -> tuple:
+    # Typed columns stored next to the legacy location string
+    return (data.city, data.latitude, data.longitude, geohash_encode(data.latitude, data.longitude))
+
+# Statuses a request never leaves
+FINAL_STATUSES = (STATUS_COMPLETED, STATUS_FAILED)
+
+def status_etag(response: LocationResponse) -> str:
+    updated = response.updated_at.timestamp() if response.updated_at else 0
+    return f'"{response.status}-{updated:.6f}"'
+
+# Largest page GET /service/requests returns
+LIST_MAX_LIMIT = int(os.getenv("LIST_MAX_LIMIT", "1000"))
+# Rows fetched from the server-side cursor per round trip during an export
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "5000"))
+
+# RECORD_COLUMNS as named in responses and exports
+RECORD_FIELDS = ("request_id",) + RECORD_COLUMNS[1:]
+
+def encode_cursor(created_at: datetime, request_id: str) -> str:
+    """Opaque keyset position of a row, for ?cursor=."""
+    position = f"{created_at.isoformat()}|{request_id}"
+    return base64.urlsafe_b64encode(position.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple:
+    """(created_at, request_id) from encode_cursor, raising ValueError if malformed."""
+    try:
+        position = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, request_id = position.split("|")
+        return datetime.fromisoformat(created_at), str(UUID(request_id))
+    except (ValueError, UnicodeDecodeError) as error:
+        raise ValueError("Invalid cursor") from error
+
+def _database_time(value: datetime):
+    # created_at is a timestamp without time zone written in UTC
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def _export_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def format_export(rows: list, export_format: str, header: bool = False) -> str:
+    if export_format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if header:
+            writer.writerow(RECORD_FIELDS)
+        writer.writerows([_export_value(value) for value in row] for row in rows)
+        return buffer.getvalue()
+    return "".join(
+        json.dumps({field: _export_value(value) for field, value in zip(RECORD_FIELDS, row)}) + "\n"
+        for row in rows
+    )
+
+def _format_validation_error(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in err['loc']) or 'record'}: {err['msg']}"
+        for err in error.errors()
+    )
+
+class LocationService:
+    def __init__(self, repository=None, ingest_mode: str = None, status_cache=None, geocoder=None,
+                 status_notifier=None):
+        self.status_cache = status_cache if status_cache is not None else create_status_cache()
+        self.status_notifier = status_notifier if status_notifier is not None else create_status_notifier(
+            local_cache=self.status_cache if isinstance(self.status_cache, StatusCache) else None
+        )
+        # Optional enrichment stage, see GEOCODER; loaded by start() unless given
+        self.geocoder = geocoder
+        self.repository = repository or create_location_repository(cache=self.status_cache,
+                                                                   notifier=self.status_notifier)
+        self.ingest_buffer = None
+        if (ingest_mode or INGEST_MODE) == "batched":
+            self.ingest_buffer = IngestBuffer(self.repository)
+        # Async callables given a location event for every stored record
+        self.location_listeners = []
+        # Background processing of stored submissions, started by start()
+        self.job_worker = JobWorker(self.repository)
+        self.idempotency = IdempotencyCache()
+
+    async def start(self):
+        # Independent dependencies come up side by side, the job worker only
+        # once the pool is warm
+        await asyncio.gather(
+            keep_trying("status notifier", self.status_notifier.start),
+            keep_trying("database pool", self.repository.open),
+            keep_trying("geocoder", self._load_geocoder),
+        )
+        self.job_worker.start()
+
+    async def _load_geocoder(self):
+        if self.geocoder is None:
+            # Parsing the gazetteer and building the tree is CPU bound
+            self.geocoder = await asyncio.to_thread(create_geocoder)
+
+    def _enrich(self, data: LocationData) -> tuple:
+        coordinates = _coordinates(data)
+        if self.geocoder is None:
+            return coordinates
+        canonical_city, _, distance = self.geocoder.lookup(data.latitude, data.longitude)
+        return coordinates + (canonical_city, distance)
+
+    def _enrich_rows(self, rows: list) -> list:
+        # One batched tree query per bulk chunk
+        if self.geocoder is None or not rows:
+            return rows
+        matches = self.geocoder.lookup_many([row[5] for row in rows], [row[6] for row in rows])
+        return [row + (city, distance) for row, (city, _, distance) in zip(rows, matches)]
+
+    async def _notify(self, request_id: str, city: str, latitude: float, longitude: float):
+        if not self.location_listeners:
+            return
+        event = {"request_id": request_id, "city": city, "latitude": latitude, "longitude": longitude}
+        for listener in self.location_listeners:
+            try:
+                await listener(event)
+            except Exception as e:
+                logger.error(f"Error publishing location event: {str(e)}")
+
+    async def submit_location(self, data: LocationData, ack: str = None, idempotency_key: str = None) -> dict:
+        if idempotency_key is None:
+            return await self._submit_location(data, ack)
+        return await self.idempotency.run(
+            idempotency_key, lambda: self._submit_keyed_location(data, idempotency_key)
+        )
+
+    async def _submit_keyed_location(self, data: LocationData, idempotency_key: str) -> dict:
+        # Always written directly: the unique key has to be checked by the
+        # insert itself, which a group commit could not report per row
+        start_time = time()
+        request_id = uuid7()
+        location_str = format_location(data.city, data.latitude, data.longitude)
+        owner = await self.repository.create_location_once(request_id, location_str, "received",
+                                                           self._enrich(data), idempotency_key)
+        if owner is None:
+            raise Exception("Failed to create location record")
+        if owner[0] != request_id:
+            # Submitted before, through another replica or before a restart
+            IDEMPOTENT_REPLAYS.labels(source="database").inc()
+            logger.info(f"Replayed idempotent submission {owner[0]}")
+            return {
+                "request_id": owner[0],
+                "status": "received",
+                "response_time": f"{owner[1] or 0:.4f} sec"
+            }
+
+        duration = time() - start_time
+        if not await self.repository.update_response_time(request_id, duration):
+            logger.warning(f"Failed to update response time for request {request_id}")
+        await self._notify(request_id, data.city, data.latitude, data.longitude)
+
+        logger.info(f"Location data processed: {data.city} at {data.latitude}, {data.longitude} (ID: {request_id})")
+        return {
+            "request_id": request_id,
+            "status": "received",
+            "response_time": f"{duration:.4f} sec"
+        }
+
+    async def _submit_location(self, data: LocationData, ack: str = None) -> dict:
+        start_time = time()
+        request_id = uuid7()
+        
+        location_str = format_location(data.city, data.latitude, data.longitude)
+        coordinates = self._enrich(data)
+
+        if self.ingest_buffer is not None:
+            # Write-behind mode: the row is committed together with other
+            # submissions, response_time is filled in by the flush
+            if not await self.ingest_buffer.submit(request_id, location_str, "received", ack=ack,
+                                                   coordinates=coordinates):
+                raise Exception("Failed to create location record")
+            await self._notify(request_id, data.city, data.latitude, data.longitude)
+            duration = time() - start_time
+            logger.info(f"Location data queued: {data.city} at {data.latitude}, {data.longitude} (ID: {request_id})")
+            return {
+                "request_id": request_id,
+                "status": "received",
+                "response_time": f"{duration:.4f} sec"
+            }
+        
+        if not await self.repository.create_location(request_id, location_str, "received", coordinates):
+            raise Exception("Failed to create location record")
+
+        duration = time() - start_time
+        if not await self.repository.update_response_time(request_id, duration):
+            logger.warning(f"Failed to update response time for request {request_id}")
+        await self._notify(request_id, data.city, data.latitude, data.longitude)
+
+        logger.info(f"Location data processed: {data.city} at {data.latitude}, {data.longitude} (ID: {request_id})")
+        return {
+            "request_id": request_id,
+            "status": "received",
+            "response_time": f"{duration:.4f} sec"
+        }
+
+    async def submit_location_stream(self, chunks, chunk_size: int = None):
+        """Validate and store an NDJSON / JSON-array body chunk by chunk.
+
+        Yields a list of per-record results (in input order) after every COPY
+        of ``chunk_size`` valid records, then a final summary. Neither the body
+        nor the results are ever held in memory as a whole.
+        """
+        chunk_size = chunk_size or BULK_CHUNK_SIZE
+        splitter = RecordSplitter()
+        pending = []
+        valid = 0
+        index = 0
+        accepted = rejected = 0
+
+        try:
+            async for chunk in chunks:
+                for record in splitter.feed(chunk):
+                    result = self._prepare_bulk_record(index, record)
+                    pending.append(result)
+                    index += 1
+                    if "row" in result:
+                        valid += 1
+                    if valid >= chunk_size:
+                        results = await self._write_bulk_chunk(pending)
+                        accepted += valid
+                        rejected += len(results) - valid
+                        yield results
+                        pending, valid = [], 0
+            for record in splitter.close():
+                pending.append(self._prepare_bulk_record(index, record))
+                index += 1
+        except ValueError as error:
+            # The body itself is malformed; report what we have so far
+            pending.append({"index": index, "error": str(error)})
+
+        results = await self._write_bulk_chunk(pending)
+        accepted += sum(1 for result in results if "request_id" in result)
+        rejected += sum(1 for result in results if "error" in result)
+        logger.info(f"Bulk submission processed: {accepted} accepted, {rejected} rejected")
+        yield results + [{"summary": {"accepted": accepted, "rejected": rejected}}]
+
+    def _prepare_bulk_record(self, index: int, record) -> dict:
+        if isinstance(record, Exception):
+            return {"index": index, "error": str(record)}
+        try:
+            data = LocationData.model_validate_json(record)
+        except ValidationError as error:
+            return {"index": index, "error": _format_validation_error(error)}
+        request_id = uuid7()
+        location_str = format_location(data.city, data.latitude, data.longitude)
+        row = (request_id, location_str, "received", time(), _coordinates(data))
+        return {"index": index, "request_id": request_id, "row": row}
+
+    async def _write_bulk_chunk(self, pending: list) -> list:
+        rows = [result["row"] for result in pending if "row" in result]
+        ok = True
+        if rows:
+            start_time = time()
+            rows = self._enrich_rows([(request_id, location, status, start_time - parsed_at, *coordinates)
+                                      for request_id, location, status, parsed_at, coordinates in rows])
+            ok = await self.repository.copy_locations(rows)
+            if ok:
+                for row in rows:
+                    await self._notify(row[0], row[4], row[5], row[6])
+        results = []
+        for result in pending:
+            if "row" not in result:
+                results.append(result)
+            elif ok:
+                results.append({"index": result["index"], "request_id": result["request_id"], "status": "received"})
+            else:
+                results.append({"index": result["index"], "error": "Failed to create location record"})
+        return results
+
+    async def close(self):
+        await self.job_worker.close()
+        await self.status_notifier.close()
+        if self.ingest_buffer is not None:
+            await self.ingest_buffer.close()
+        if self.status_cache is not None:
+            await self.status_cache.close()
+
+    async def get_request_status(self, request_id: str) -> LocationResponse:
+        # Read-through: repository writes invalidate the cached entry
+        token = None
+        if self.status_cache is not None:
+            cached = await self.status_cache.get(request_id)
+            if cached is not None:
+                return cached
+            token = self.status_cache.fill_token()
+
+        result = await self.repository.get_location(request_id)
+        if not result:
+            raise Exception("Request not found")
+
+        response = LocationResponse(
+            request_id=result[0],
+            location=result[1],
+            status=result[2],
+            created_at=result[3],
+            updated_at=result[4],
+            response_time=result[5]
+        )
+        if self.status_cache is not None:
+            await self.status_cache.set(request_id, response, token)
+        return response
+
+    async def wait_for_status(self, request_id: str, timeout: float, etag: str = None) -> LocationResponse:
+        """Status of the request once it no longer matches ``etag``.
+
+        Without ``etag`` this waits for the next change after the current
+        state. Returns early for final statuses and returns the unchanged
+        status after ``timeout`` seconds. The database is only read again
+        when the request is reported as changed.
+        """
+        with self.status_notifier.watch(request_id) as watcher:
+            # Registered before the first read, so no change can slip past
+            response = await self.get_request_status(request_id)
+            baseline = etag or status_etag(response)
+            deadline = monotonic() + timeout
+            while status_etag(response) == baseline and response.status not in FINAL_STATUSES:
+                remaining = deadline - monotonic()
+                if remaining <= 0 or not await watcher.wait(remaining):
+                    break
+                response = await self.get_request_status(request_id)
+            return response
+
+    async def status_updates(self, request_id: str, heartbeat: float):
+        """Yield the request's status, then every change until a final status.
+
+        Yields None after ``heartbeat`` idle seconds so callers can keep the
+        connection alive.
+        """
+        with self.status_notifier.watch(request_id) as watcher:
+            response = await self.get_request_status(request_id)
+            yield response
+            etag = status_etag(response)
+            while response.status not in FINAL_STATUSES:
+                if not await watcher.wait(heartbeat):
+                    yield None
+                    continue
+                response = await self.get_request_status(request_id)
+                if status_etag(response) != etag:
+                    etag = status_etag(response)
+                    yield response
+
+    async def list_requests(self, status: str = None, since: datetime = None, until: datetime = None,
+                            limit: int = 100, cursor: str = None, descending: bool = False) -> LocationPage:
+        """One page of requests in (created_at, id) order.
+
+        Pages continue from the ``cursor`` of the previous one, so each page
+        costs an index range scan of ``limit`` rows however deep it is.
+        """
+        after = decode_cursor(cursor) if cursor else None
+        # One extra row tells whether another page follows
+        params = records_params(status, _database_time(since), _database_time(until), after, limit + 1)
+        rows = await self.repository.list_requests(params, descending)
+        if rows is None:
+            raise Exception("Listing requests failed")
+        items = [LocationRecord(**dict(zip(RECORD_FIELDS, row))) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = items[-1]
+            next_cursor = encode_cursor(last.created_at, last.request_id)
+        return LocationPage(items=items, next_cursor=next_cursor)
+
+    async def export_requests(self, export_format: str = "ndjson", status: str = None,
+                              since: datetime = None, until: datetime = None):
+        """Yield every matching request as NDJSON lines or CSV, one chunk at a time."""
+        params = records_params(status, _database_time(since), _database_time(until))
+        chunks = self.repository.export_requests(params, EXPORT_CHUNK_SIZE)
+        # The CSV header goes out with the first rows, after the query has
+        # succeeded
+        header = export_format == "csv"
+        try:
+            async for rows in chunks:
+                yield format_export(rows, export_format, header)
+                header = False
+            if header:
+                yield format_export([], export_format, header)
+        finally:
+            await chunks.aclose()
+
+    async def find_nearby(self, latitude: float, longitude: float, radius_m: float,
+                          limit: int) -> list:
+        # The geohash ranges prune candidates through the index, the
+        # haversine filter in the query makes the result exact
+        ranges = prefix_ranges(covering_prefixes(latitude, longitude, radius_m))
+        rows = await self.repository.find_nearby(latitude, longitude, radius_m, ranges, limit)
+        if rows is None:
+            raise Exception("Nearby lookup failed")
+        return [
+            NearbyLocation(
+                request_id=row[0],
+                city=row[1],
+                latitude=row[2],
+                longitude=row[3],
+                distance_m=row[4]
+            )
+            for row in rows
+        ]
@@ -0,0 +1,153 @@
+import os
+import re
+
+BULK_MAX_RECORD_BYTES = int(os.getenv("BULK_MAX_RECORD_BYTES", "65536"))
+
+_WHITESPACE = b" \t\r\n"
+_STRUCTURAL = re.compile(rb'[\\"{}\[\],]')
+
+class RecordTooLarge(ValueError):
+    pass
+
+class RecordSplitter:
+    """Incrementally splits an NDJSON or JSON-array body into raw records.
+
+    The format is detected from the first non-whitespace byte: ``[`` means a
+    JSON array, anything else is treated as newline-delimited JSON. Only the
+    record currently being parsed is buffered, so memory use is bounded by
+    ``max_record_bytes`` regardless of the body size.
+    """
+
+    def __init__(self, max_record_bytes: int = None):
+        self.max_record_bytes = max_record_bytes or BULK_MAX_RECORD_BYTES
+        self._mode = None
+        self._buffer = bytearray()
+        # JSON array scanner state
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._closed = False
+        # Set while the rest of an oversized record is being skipped
+        self._skip_line = False
+        self._skip_record = False
+
+    def feed(self, chunk: bytes) -> list:
+        """Return the records completed by ``chunk``.
+
+        Items are raw JSON bytes, or a ``RecordTooLarge`` instance in place of a
+        record that was skipped for exceeding the size limit.
+        """
+        if self._mode is None:
+            stripped = chunk.lstrip(_WHITESPACE)
+            if not stripped:
+                return []
+            if stripped[:1] == b"[":
+                self._mode = "array"
+                chunk = stripped[1:]
+            else:
+                self._mode = "ndjson"
+        if self._mode == "ndjson":
+            return self._feed_ndjson(chunk)
+        return self._feed_array(chunk)
+
+    def close(self) -> list:
+        records = []
+        if self._mode == "ndjson":
+            if len(self._buffer) > self.max_record_bytes:
+                records.append(self._too_large())
+            elif self._buffer.strip(_WHITESPACE) and not self._skip_line:
+                records.append(bytes(self._buffer))
+        elif self._mode == "array":
+            if not self._closed or self._buffer.strip(_WHITESPACE):
+                raise ValueError("Unterminated JSON array")
+        self._buffer = bytearray()
+        return records
+
+    def _feed_ndjson(self, chunk: bytes) -> list:
+        records = []
+        start = 0
+        while True:
+            end = chunk.find(b"\n", start)
+            if end == -1:
+                break
+            if self._skip_line:
+                self._skip_line = False
+            else:
+                self._buffer += chunk[start:end]
+                line = bytes(self._buffer)
+                if len(line) > self.max_record_bytes:
+                    records.append(self._too_large())
+                elif line.strip(_WHITESPACE):
+                    records.append(line)
+            self._buffer = bytearray()
+            start = end + 1
+        if not self._skip_line:
+            self._buffer += chunk[start:]
+            if len(self._buffer) > self.max_record_bytes:
+                # Drop the rest of this line, the next one is still usable
+                self._skip_line = True
+                self._buffer = bytearray()
+                records.append(self._too_large())
+        return records
+
+    def _feed_array(self, chunk: bytes) -> list:
+        records = []
+        if self._closed:
+            if chunk.strip(_WHITESPACE):
+                raise ValueError("Unexpected data after JSON array")
+            return records
+        record_start = 0
+        # A backslash at the end of the previous chunk escapes our first byte
+        escaped = 0 if self._escape else -1
+        self._escape = False
+        # Only structural bytes matter, so jump straight to them
+        for match in _STRUCTURAL.finditer(chunk):
+            i = match.start()
+            if i == escaped:
+                continue
+            byte = chunk[i]
+            if self._in_string:
+                if byte == 0x5C:  # backslash
+                    escaped = i + 1
+                    self._escape = escaped == len(chunk)
+                elif byte == 0x22:  # quote
+                    self._in_string = False
+                continue
+            if byte == 0x22:
+                self._in_string = True
+            elif byte in (0x7B, 0x5B):  # { [
+                self._depth += 1
+            elif self._depth > 0:
+                if byte in (0x7D, 0x5D):  # } ]
+                    self._depth -= 1
+            else:  # top-level "," or the closing "]"
+                records.append(self._end_record(chunk[record_start:i]))
+                record_start = i + 1
+                if byte == 0x5D:
+                    self._closed = True
+                    if chunk[i + 1:].strip(_WHITESPACE):
+                        raise ValueError("Unexpected data after JSON array")
+                    break
+        else:
+            if not self._skip_record:
+                self._buffer += chunk[record_start:]
+                if len(self._buffer) > self.max_record_bytes:
+                    # Keep scanning but stop buffering until the record ends
+                    self._skip_record = True
+                    self._buffer = bytearray()
+        return [record for record in records if record is not None]
+
+    def _end_record(self, tail: bytes):
+        if self._skip_record:
+            self._skip_record = False
+            self._buffer = bytearray()
+            return self._too_large()
+        self._buffer += tail
+        record = bytes(self._buffer).strip(_WHITESPACE)
+        self._buffer = bytearray()
+        if len(record) > self.max_record_bytes:
+            return self._too_large()
+        return record or None
+
+    def _too_large(self):
+        return RecordTooLarge(f"Record exceeds {self.max_record_bytes} bytes")
@@ -0,0 +1,33 @@
+import asyncio
+import logging
+import os
+from prometheus_client import Gauge
+
+logger = logging.getLogger(__name__)
+
+# Backoff between attempts while a dependency is unreachable at startup,
+# doubling up to the maximum
+STARTUP_RETRY_SECONDS = float(os.getenv("STARTUP_RETRY_SECONDS", "1"))
+STARTUP_RETRY_MAX_SECONDS = float(os.getenv("STARTUP_RETRY_MAX_SECONDS", "30"))
+
+STARTUP_SECONDS = Gauge(
+    'app_startup_seconds',
+    'Seconds from process start until the worker reported ready',
+    multiprocess_mode='liveall'
+)
+
+async def keep_trying(name: str, start, delay: float = None, max_delay: float = None):
+    """Await ``start()`` until it succeeds, backing off between failures.
+
+    A database that is still coming up then only delays readiness instead of
+    crashing the worker.
+    """
+    delay = STARTUP_RETRY_SECONDS if delay is None else delay
+    max_delay = STARTUP_RETRY_MAX_SECONDS if max_delay is None else max_delay
+    while True:
+        try:
+            return await start()
+        except Exception as error:
+            logger.warning(f"Starting {name} failed, retrying in {delay:.1f}s: {error}")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, max_delay)
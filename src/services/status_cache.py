@@ -0,0 +1,164 @@
+import logging
+import os
+from collections import OrderedDict
+from time import monotonic
+from prometheus_client import Counter
+from ..models.location_model import LocationResponse
+
+logger = logging.getLogger(__name__)
+
+# "memory" keeps a per-process LRU, "redis" shares entries across replicas,
+# "none" disables caching
+STATUS_CACHE_BACKEND = os.getenv("STATUS_CACHE_BACKEND", "memory")
+STATUS_CACHE_SIZE = int(os.getenv("STATUS_CACHE_SIZE", "10000"))
+STATUS_CACHE_TTL = float(os.getenv("STATUS_CACHE_TTL", "5"))
+STATUS_CACHE_REDIS_URL = os.getenv("STATUS_CACHE_REDIS_URL", "redis://redis-service:6379/0")
+
+CACHE_HITS = Counter(
+    'status_cache_hits_total',
+    'Request status lookups answered from the cache',
+    ['backend']
+)
+
+CACHE_MISSES = Counter(
+    'status_cache_misses_total',
+    'Request status lookups that went to the database',
+    ['backend']
+)
+
+CACHE_EVICTIONS = Counter(
+    'status_cache_evictions_total',
+    'Entries removed from the status cache',
+    ['backend', 'reason']
+)
+
+class StatusCache:
+    """Bounded in-process LRU cache of LocationResponse objects with a TTL.
+
+    Readers take a ``fill_token()`` before loading from the database and pass
+    it to ``set``; if the entry was invalidated in the meantime the load may
+    be stale and is not cached.
+    """
+
+    backend = "memory"
+
+    def __init__(self, max_size: int = None, ttl: float = None):
+        self.max_size = max_size or STATUS_CACHE_SIZE
+        self.ttl = ttl if ttl is not None else STATUS_CACHE_TTL
+        self._entries = OrderedDict()
+        # Generation of the latest invalidation per key, bounded like _entries
+        self._invalidated = OrderedDict()
+        self._generation = 0
+        self._hits = CACHE_HITS.labels(backend=self.backend)
+        self._misses = CACHE_MISSES.labels(backend=self.backend)
+        self._evicted_size = CACHE_EVICTIONS.labels(backend=self.backend, reason="size")
+        self._evicted_ttl = CACHE_EVICTIONS.labels(backend=self.backend, reason="ttl")
+
+    def __len__(self):
+        return len(self._entries)
+
+    def fill_token(self) -> int:
+        return self._generation
+
+    async def get(self, request_id: str):
+        entry = self._entries.get(request_id)
+        if entry is None:
+            self._misses.inc()
+            return None
+        value, expires_at = entry
+        if expires_at <= monotonic():
+            del self._entries[request_id]
+            self._evicted_ttl.inc()
+            self._misses.inc()
+            return None
+        self._entries.move_to_end(request_id)
+        self._hits.inc()
+        return value
+
+    async def set(self, request_id: str, value: LocationResponse, token: int = None):
+        if token is not None and self._invalidated.get(request_id, -1) > token:
+            return
+        self._entries[request_id] = (value, monotonic() + self.ttl)
+        self._entries.move_to_end(request_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._evicted_size.inc()
+
+    async def invalidate(self, *request_ids: str):
+        self.discard(*request_ids)
+
+    def discard(self, *request_ids: str):
+        # Synchronous invalidate, for callers outside a coroutine
+        self._generation += 1
+        for request_id in request_ids:
+            self._entries.pop(request_id, None)
+            self._invalidated[request_id] = self._generation
+            self._invalidated.move_to_end(request_id)
+        while len(self._invalidated) > self.max_size:
+            self._invalidated.popitem(last=False)
+
+    async def close(self):
+        self._entries.clear()
+
+class RedisStatusCache:
+    """Status cache shared by all replicas through Redis.
+
+    Entries expire through Redis' own TTL and eviction policy, so only hits
+    and misses are counted here.
+    """
+
+    backend = "redis"
+
+    def __init__(self, url: str = None, ttl: float = None, prefix: str = "request-status:"):
+        try:
+            import redis.asyncio as aioredis
+        except ImportError as error:
+            raise RuntimeError("STATUS_CACHE_BACKEND=redis requires the redis package") from error
+        self.client = aioredis.from_url(url or STATUS_CACHE_REDIS_URL)
+        self.ttl = ttl if ttl is not None else STATUS_CACHE_TTL
+        self.prefix = prefix
+        self._hits = CACHE_HITS.labels(backend=self.backend)
+        self._misses = CACHE_MISSES.labels(backend=self.backend)
+
+    def fill_token(self):
+        return None
+
+    async def get(self, request_id: str):
+        try:
+            payload = await self.client.get(self.prefix + request_id)
+        except Exception as error:
+            logger.warning(f"Status cache lookup failed: {error}")
+            payload = None
+        if payload is None:
+            self._misses.inc()
+            return None
+        self._hits.inc()
+        return LocationResponse.model_validate_json(payload)
+
+    async def set(self, request_id: str, value: LocationResponse, token=None):
+        try:
+            await self.client.set(self.prefix + request_id, value.model_dump_json(),
+                                  px=int(self.ttl * 1000))
+        except Exception as error:
+            logger.warning(f"Status cache store failed: {error}")
+
+    async def invalidate(self, *request_ids: str):
+        if not request_ids:
+            return
+        try:
+            await self.client.delete(*(self.prefix + request_id for request_id in request_ids))
+        except Exception as error:
+            logger.warning(f"Status cache invalidation failed: {error}")
+
+    async def close(self):
+        await self.client.close()
+
+def create_status_cache(backend: str = None):
+    backend = backend or STATUS_CACHE_BACKEND
+    if backend == "memory":
+        return StatusCache()
+    if backend == "redis":
+        return RedisStatusCache()
+    if backend == "none":
+        return None
+    raise ValueError(f"Unknown STATUS_CACHE_BACKEND: {backend}")
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import os
+from prometheus_client import Counter, Gauge
+from .backplane import create_backplane, WS_BACKPLANE
+
+logger = logging.getLogger(__name__)
+
+# Status change notifications between replicas use their own backplane
+# channel; the backend defaults to the WebSocket one
+STATUS_BACKPLANE = os.getenv("STATUS_BACKPLANE", WS_BACKPLANE)
+STATUS_BACKPLANE_CHANNEL = os.getenv("STATUS_BACKPLANE_CHANNEL", "request_status")
+# Longest ?wait= a long-poll may ask for, keep below load balancer idle timeouts
+STATUS_MAX_WAIT_SECONDS = float(os.getenv("STATUS_MAX_WAIT_SECONDS", "30"))
+# Comment lines sent on idle SSE streams so proxies keep them open
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+
+STATUS_WATCHERS = Gauge(
+    'status_watchers_active',
+    'Long-poll and SSE clients waiting for a request status change',
+    multiprocess_mode='livesum'
+)
+
+STATUS_WAKEUPS = Counter(
+    'status_watcher_wakeups_total',
+    'Waiting clients woken by a status change'
+)
+
+class Watcher:
+    """Interest in one request id; changes while registered are never missed."""
+
+    __slots__ = ("request_id", "_changed")
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        self._changed.set()
+
+    async def wait(self, timeout: float) -> bool:
+        """True if the request changed since the last wait, False on timeout."""
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return False
+        self._changed.clear()
+        return True
+
+class StatusNotifier:
+    """Wakes clients waiting on a request when the repository changes its status.
+
+    Writers call ``publish`` with the request ids they changed; with a
+    backplane every replica (the writer included) hears about it and wakes
+    its own watchers. Waiting clients therefore read the database once per
+    change rather than once per poll. Ids received from the backplane are
+    also dropped from the per-process ``local_cache``, whose entries would
+    otherwise hide a change made on another replica until they expire.
+    """
+
+    def __init__(self, backplane=None, local_cache=None):
+        self.backplane = backplane
+        self.local_cache = local_cache
+        self._watchers = {}
+
+    async def start(self):
+        if self.backplane is not None:
+            await self.backplane.start(self.notify)
+
+    @property
+    def watcher_count(self) -> int:
+        return sum(len(watchers) for watchers in self._watchers.values())
+
+    def watch(self, request_id: str) -> "_Registration":
+        return _Registration(self, request_id)
+
+    def _add(self, watcher: Watcher):
+        self._watchers.setdefault(watcher.request_id, set()).add(watcher)
+        STATUS_WATCHERS.inc()
+
+    def _remove(self, watcher: Watcher):
+        watchers = self._watchers.get(watcher.request_id)
+        if watchers is None or watcher not in watchers:
+            return
+        watchers.discard(watcher)
+        if not watchers:
+            del self._watchers[watcher.request_id]
+        STATUS_WATCHERS.dec()
+
+    async def publish(self, *request_ids: str):
+        """Announce changed requests to every replica."""
+        if self.backplane is None:
+            self.notify(*request_ids)
+            return
+        for request_id in request_ids:
+            await self.backplane.publish(request_id)
+
+    def notify(self, *request_ids: str):
+        """Wake this replica's watchers of ``request_ids``."""
+        if self.local_cache is not None and self.backplane is not None:
+            self.local_cache.discard(*request_ids)
+        for request_id in request_ids:
+            watchers = self._watchers.get(request_id)
+            if not watchers:
+                continue
+            STATUS_WAKEUPS.inc(len(watchers))
+            for watcher in watchers:
+                watcher._notify()
+
+    async def close(self):
+        if self.backplane is not None:
+            await self.backplane.close()
+
+class _Registration:
+    def __init__(self, notifier: StatusNotifier, request_id: str):
+        self.notifier = notifier
+        self.watcher = Watcher(request_id)
+
+    def __enter__(self) -> Watcher:
+        self.notifier._add(self.watcher)
+        return self.watcher
+
+    def __exit__(self, *exc_info):
+        self.notifier._remove(self.watcher)
+
+def create_status_notifier(local_cache=None):
+    return StatusNotifier(
+        backplane=create_backplane(STATUS_BACKPLANE, channel=STATUS_BACKPLANE_CHANNEL),
+        local_cache=local_cache
+    )
@@ -0,0 +1,61 @@
+import json
+import os
+from typing import NamedTuple, Optional
+import msgpack
+
+# Subprotocol (Sec-WebSocket-Protocol) that opts a /service/stream client into
+# MessagePack frames; ?protocol=msgpack does the same for clients that cannot
+# set subprotocols
+MSGPACK_SUBPROTOCOL = "msgpack.v1"
+# How long a msgpack client's writer waits for more messages to pack into the
+# frame after the first one; clients can lower or raise it with ?max_delay_ms=
+WS_BATCH_DELAY_MS = float(os.getenv("WS_BATCH_DELAY_MS", "5"))
+WS_BATCH_MAX_DELAY_MS = 1000
+# Frames stop growing once they reach this many bytes
+WS_BATCH_MAX_BYTES = int(os.getenv("WS_BATCH_MAX_BYTES", "65536"))
+
+class WireProtocol(NamedTuple):
+    """How messages are framed for one WebSocket client."""
+    binary: bool = False
+    subprotocol: Optional[str] = None
+    batch_delay: float = 0.0
+
+TEXT = WireProtocol()
+
+def negotiate(scope: dict, query_params) -> WireProtocol:
+    """Pick the wire protocol a client asked for, raising ValueError if it is unknown."""
+    requested = query_params.get("protocol")
+    if requested not in (None, "text", "msgpack"):
+        raise ValueError(f"unknown protocol: {requested}")
+    subprotocol = MSGPACK_SUBPROTOCOL if MSGPACK_SUBPROTOCOL in scope.get("subprotocols", ()) else None
+    if subprotocol is None and requested != "msgpack":
+        return TEXT
+    delay = query_params.get("max_delay_ms")
+    try:
+        delay = WS_BATCH_DELAY_MS if delay is None else float(delay)
+    except ValueError:
+        raise ValueError(f"invalid max_delay_ms: {delay}") from None
+    if not 0 <= delay <= WS_BATCH_MAX_DELAY_MS:
+        raise ValueError(f"max_delay_ms must be between 0 and {WS_BATCH_MAX_DELAY_MS}")
+    return WireProtocol(binary=True, subprotocol=subprotocol, batch_delay=delay / 1000)
+
+def encode(protocol: WireProtocol, payload):
+    """Serialize a JSON-compatible payload for ``protocol``."""
+    return msgpack.packb(payload) if protocol.binary else json.dumps(payload)
+
+def encode_message(protocol: WireProtocol, message):
+    """Frame a broadcast message (already a str or bytes) for ``protocol``."""
+    return msgpack.packb(message) if protocol.binary else message
+
+def decode_frame(message: dict):
+    """Payload of a received ASGI websocket message.
+
+    Text frames are returned as they are; binary frames hold one MessagePack
+    value and are unpacked, raising ValueError if they do not.
+    """
+    if message.get("text") is not None:
+        return message["text"]
+    try:
+        return msgpack.unpackb(message.get("bytes") or b"")
+    except Exception as e:
+        raise ValueError(f"invalid MessagePack frame: {e}") from None
@@ -1,24 +1,26 @@
-import pytest
-from unittest.mock import MagicMock, patch
-import psycopg2
-from psycopg2.pool import SimpleConnectionPool
-
-@pytest.fixture(autouse=True)
-def mock_db_connection():
-    """Mock database connection for all tests"""
-    with patch('psycopg2.pool.SimpleConnectionPool') as mock_pool:
-        # Create a mock connection
-        mock_conn = MagicMock()
-        mock_cursor = MagicMock()
-        mock_conn.cursor.return_value = mock_cursor
-        
-        # Configure pool mock
-        mock_pool.return_value = MagicMock(spec=SimpleConnectionPool)
-        mock_pool.return_value.getconn.return_value = mock_conn
-        
-        yield mock_pool
-
-@pytest.fixture(autouse=True)
-def mock_env_vars(monkeypatch):
-    """Set test environment variables"""
+import pytest
+from unittest.mock import MagicMock, patch
+import psycopg2
+from psycopg2 import extensions
+
+def make_mock_connection():
+    """Mock psycopg2 connection that the connection pool accepts"""
+    mock_conn = MagicMock()
+    mock_cursor = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_conn.closed = 0
+    mock_conn.info.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+    return mock_conn
+
+@pytest.fixture(autouse=True)
+def mock_db_connection():
+    """Mock database connection for all tests"""
+    with patch('psycopg2.connect') as mock_connect:
+        # Every new pooled connection is a fresh mock
+        mock_connect.side_effect = lambda *args, **kwargs: make_mock_connection()
+        yield mock_connect
+
+@pytest.fixture(autouse=True)
+def mock_env_vars(monkeypatch):
+    """Set test environment variables"""
     monkeypatch.setenv('TESTING', 'true') 
\ No newline at end of file
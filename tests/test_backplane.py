@@ -0,0 +1,94 @@
+import asyncio
+import json
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from src.services.backplane import InMemoryBackplane, PostgresBackplane, NOTIFY_MAX_PAYLOAD, create_backplane
+from src.services.connection_manager import ConnectionManager
+from tests.test_connection_manager import FakeWebSocket, settle
+
+@pytest.mark.unit
+async def test_broadcast_reaches_clients_on_other_replicas():
+    replicas = [ConnectionManager(backplane=InMemoryBackplane(channel="test-replicas")) for _ in range(2)]
+    clients = [FakeWebSocket(), FakeWebSocket()]
+    for manager, client in zip(replicas, clients):
+        await manager.start()
+        await manager.connect(client)
+
+    await replicas[0].broadcast("hello")
+    await settle()
+
+    assert [client.sent for client in clients] == [["hello"], ["hello"]]
+    for manager in replicas:
+        await manager.close()
+
+def make_postgres_backplane(handler, **kwargs):
+    backplane = PostgresBackplane(channel="ws_test", batch_interval=0, **kwargs)
+    backplane._handler = handler
+    backplane._conn = MagicMock()
+    backplane._conn.execute = AsyncMock()
+    return backplane
+
+@pytest.mark.unit
+async def test_postgres_backplane_batches_messages_into_one_notify():
+    backplane = make_postgres_backplane(MagicMock())
+    for i in range(50):
+        await backplane.publish(f"message {i}")
+
+    await backplane._flush()
+
+    backplane._conn.execute.assert_awaited_once()
+    channel, payload = backplane._conn.execute.await_args.args[1:]
+    assert channel == "ws_test"
+    assert json.loads(payload) == [f"message {i}" for i in range(50)]
+
+@pytest.mark.unit
+async def test_postgres_backplane_splits_batches_at_payload_limit():
+    backplane = make_postgres_backplane(MagicMock())
+    message = "x" * 1000
+    for _ in range(20):
+        await backplane.publish(message)
+
+    await backplane._flush()
+
+    payloads = [call.args[2] for call in backplane._conn.execute.await_args_list]
+    assert len(payloads) == 3
+    assert all(len(payload.encode()) <= NOTIFY_MAX_PAYLOAD for payload in payloads)
+    assert sum(len(json.loads(payload)) for payload in payloads) == 20
+
+@pytest.mark.unit
+async def test_oversized_message_is_delivered_locally():
+    handler = MagicMock()
+    backplane = make_postgres_backplane(handler)
+    await backplane.publish("x" * (NOTIFY_MAX_PAYLOAD + 1))
+
+    await backplane._flush()
+
+    backplane._conn.execute.assert_not_awaited()
+    handler.assert_called_once()
+
+@pytest.mark.unit
+async def test_failed_notify_keeps_messages_pending():
+    backplane = make_postgres_backplane(MagicMock())
+    backplane._conn.execute.side_effect = ConnectionError("gone")
+    await backplane.publish("a")
+    await backplane.publish("b")
+
+    with pytest.raises(ConnectionError):
+        await backplane._flush()
+
+    assert list(backplane._pending) == ["a", "b"]
+
+@pytest.mark.unit
+def test_notifications_are_fanned_out_to_handler():
+    handler = MagicMock()
+    backplane = make_postgres_backplane(handler)
+
+    backplane._on_notify(None, 1, "ws_test", json.dumps(["a", "b"]))
+
+    assert [call.args[0] for call in handler.call_args_list] == ["a", "b"]
+
+@pytest.mark.unit
+def test_create_backplane_none_disables_it():
+    assert create_backplane("none") is None
+    with pytest.raises(ValueError):
+        create_backplane("kafka")
@@ -0,0 +1,78 @@
+import json
+import pytest
+from unittest.mock import AsyncMock
+from src.services.location_service import LocationService
+from src.services.record_stream import RecordSplitter, RecordTooLarge
+
+RECORDS = [
+    {"city": "Istanbul", "latitude": 41.0082, "longitude": 28.9784},
+    {"city": "Ankara, \"TR\" [capital]", "latitude": 39.9334, "longitude": 32.8597},
+    {"city": "Izmir", "latitude": 38.4237, "longitude": 27.1428},
+]
+
+def split(body: bytes, size: int, **kwargs):
+    splitter = RecordSplitter(**kwargs)
+    records = []
+    for i in range(0, len(body), size):
+        records += splitter.feed(body[i:i + size])
+    return records + splitter.close()
+
+async def chunked(body: bytes, size: int = 7):
+    for i in range(0, len(body), size):
+        yield body[i:i + size]
+
+@pytest.mark.unit
+@pytest.mark.parametrize("size", [1, 3, 64])
+def test_splitter_handles_json_array_across_chunk_boundaries(size):
+    body = json.dumps(RECORDS).encode()
+    assert [json.loads(r) for r in split(body, size)] == RECORDS
+
+@pytest.mark.unit
+@pytest.mark.parametrize("size", [1, 5, 64])
+def test_splitter_handles_ndjson(size):
+    body = b"\n".join(json.dumps(r).encode() for r in RECORDS) + b"\n\n"
+    assert [json.loads(r) for r in split(body, size)] == RECORDS
+
+@pytest.mark.unit
+def test_splitter_skips_oversized_records():
+    body = b'[{"a": 1}, {"city": "' + b"x" * 200 + b'"}, {"b": 2}]'
+    records = split(body, 16, max_record_bytes=64)
+    assert records[0] == b'{"a": 1}'
+    assert isinstance(records[1], RecordTooLarge)
+    assert records[2] == b'{"b": 2}'
+
+@pytest.mark.unit
+def test_splitter_rejects_unterminated_array():
+    with pytest.raises(ValueError):
+        split(b'[{"a": 1}, {"b"', 4)
+
+@pytest.mark.unit
+async def test_stream_writes_valid_records_in_copy_chunks():
+    repo = AsyncMock()
+    repo.copy_locations.return_value = True
+    service = LocationService(repository=repo)
+    body = json.dumps(RECORDS[:2] + [{"city": "", "latitude": 1, "longitude": 2}] + RECORDS[2:]).encode()
+
+    results = []
+    async for batch in service.submit_location_stream(chunked(body), chunk_size=2):
+        results += batch
+
+    assert repo.copy_locations.await_count == 2
+    assert [len(call.args[0]) for call in repo.copy_locations.await_args_list] == [2, 1]
+    assert [r.get("index") for r in results[:-1]] == [0, 1, 2, 3]
+    assert "request_id" in results[0] and "error" in results[2]
+    assert results[-1] == {"summary": {"accepted": 3, "rejected": 1}}
+
+@pytest.mark.unit
+async def test_stream_reports_failed_copy_per_record():
+    repo = AsyncMock()
+    repo.copy_locations.return_value = False
+    service = LocationService(repository=repo)
+    body = b"\n".join(json.dumps(r).encode() for r in RECORDS)
+
+    results = []
+    async for batch in service.submit_location_stream(chunked(body)):
+        results += batch
+
+    assert all("error" in r for r in results[:-1])
+    assert results[-1] == {"summary": {"accepted": 0, "rejected": 3}}
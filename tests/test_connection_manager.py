@@ -0,0 +1,115 @@
+import asyncio
+import pytest
+from src.services.connection_manager import ConnectionManager, SLOW_CONSUMER_CLOSE_CODE
+
+class FakeWebSocket:
+    def __init__(self, block: asyncio.Event = None, fail: bool = False):
+        self.block = block
+        self.fail = fail
+        self.sent = []
+        self.closed_with = None
+
+    async def accept(self, subprotocol=None):
+        self.subprotocol = subprotocol
+
+    async def send_text(self, message):
+        if self.fail:
+            raise RuntimeError("connection reset")
+        if self.block is not None:
+            await self.block.wait()
+        self.sent.append(message)
+
+    async def send_bytes(self, message):
+        await self.send_text(message)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+@pytest.mark.unit
+async def test_slow_client_does_not_delay_others():
+    manager = ConnectionManager(queue_size=8)
+    fast, slow = FakeWebSocket(), FakeWebSocket(block=asyncio.Event())
+    await manager.connect(fast)
+    await manager.connect(slow)
+
+    await asyncio.wait_for(manager.broadcast("hello"), timeout=0.1)
+    await settle()
+
+    assert fast.sent == ["hello"]
+    assert slow.sent == []
+    slow.block.set()
+    await settle()
+    assert slow.sent == ["hello"]
+    await manager.close()
+
+@pytest.mark.unit
+async def test_payload_is_shared_between_recipients():
+    manager = ConnectionManager()
+    clients = [FakeWebSocket() for _ in range(3)]
+    for client in clients:
+        await manager.connect(client)
+
+    await manager.broadcast_json({"city": "Istanbul"})
+    await settle()
+
+    assert clients[0].sent[0] == '{"city": "Istanbul"}'
+    assert clients[0].sent[0] is clients[1].sent[0] is clients[2].sent[0]
+    await manager.close()
+
+@pytest.mark.unit
+async def test_overflowing_client_is_evicted():
+    manager = ConnectionManager(queue_size=2, overflow_policy="disconnect")
+    fast, slow = FakeWebSocket(), FakeWebSocket(block=asyncio.Event())
+    await manager.connect(fast)
+    await manager.connect(slow)
+
+    for i in range(5):
+        await manager.broadcast(f"m{i}")
+        await settle()
+
+    assert manager.connection_count == 1
+    assert slow not in manager.active_connections
+    assert slow.closed_with == SLOW_CONSUMER_CLOSE_CODE
+    assert fast.sent == [f"m{i}" for i in range(5)]
+    await manager.close()
+
+@pytest.mark.unit
+async def test_drop_oldest_keeps_latest_messages():
+    manager = ConnectionManager(queue_size=2, overflow_policy="drop_oldest")
+    block = asyncio.Event()
+    slow = FakeWebSocket(block=block)
+    await manager.connect(slow)
+    await manager.broadcast("m0")
+    await settle()  # writer is now stuck sending m0
+
+    for i in range(1, 5):
+        await manager.broadcast(f"m{i}")
+    block.set()
+    await settle()
+
+    assert manager.connection_count == 1
+    assert slow.sent == ["m0", "m3", "m4"]
+    await manager.close()
+
+@pytest.mark.unit
+async def test_failed_send_disconnects_client():
+    manager = ConnectionManager()
+    broken = FakeWebSocket(fail=True)
+    await manager.connect(broken)
+
+    await manager.broadcast("hello")
+    await settle()
+
+    assert manager.connection_count == 0
+    # Disconnecting again, e.g. from the endpoint handler, is a no-op
+    manager.disconnect(broken)
+    assert manager.connection_count == 0
+
+@pytest.mark.unit
+def test_unknown_overflow_policy_is_rejected():
+    with pytest.raises(ValueError):
+        ConnectionManager(overflow_policy="block")
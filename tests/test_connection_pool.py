@@ -0,0 +1,131 @@
+import os
+import threading
+import time
+import pytest
+from unittest.mock import patch
+from src.database.pool import ConnectionPool, PoolTimeout, PoolExhausted
+
+def make_pool(**kwargs):
+    options = dict(name="test", min_size=0, max_size=2, timeout=0.05, max_waiters=10,
+                   max_lifetime=60, healthcheck_after=60)
+    options.update(kwargs)
+    return ConnectionPool(**options)
+
+@pytest.mark.unit
+def test_prewarm_opens_min_size_connections(mock_db_connection):
+    pool = make_pool(min_size=2)
+    pool.prewarm()
+    assert mock_db_connection.call_count == 2
+    assert pool.stats()["idle"] == 2
+
+@pytest.mark.unit
+def test_saturated_pool_waits_then_times_out():
+    pool = make_pool()
+    pool.getconn()
+    pool.getconn()
+
+    start = time.monotonic()
+    with pytest.raises(PoolTimeout):
+        pool.getconn()
+    assert time.monotonic() - start >= 0.05
+
+@pytest.mark.unit
+def test_waiter_gets_returned_connection():
+    pool = make_pool(max_size=1, timeout=2)
+    conn = pool.getconn()
+    threading.Timer(0.05, pool.putconn, args=(conn,)).start()
+
+    assert pool.getconn(timeout=2) is conn
+    assert pool.stats()["waiters"] == 0
+
+@pytest.mark.unit
+def test_full_wait_queue_rejects_immediately():
+    pool = make_pool(max_size=1, max_waiters=0)
+    pool.getconn()
+    with pytest.raises(PoolExhausted):
+        pool.getconn()
+
+@pytest.mark.unit
+def test_connections_are_recycled_by_age_and_health(mock_db_connection):
+    pool = make_pool(max_size=1, max_lifetime=0)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    assert conn.close.called
+    assert pool.stats()["size"] == 0
+
+    pool = make_pool(max_size=1, healthcheck_after=0)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    conn.cursor.return_value.__enter__.return_value.execute.side_effect = Exception("server closed")
+    assert pool.getconn() is not conn
+
+@pytest.mark.unit
+def test_concurrent_checkouts_never_exceed_max_size():
+    pool = make_pool(max_size=3, timeout=5, max_waiters=50)
+    peak = []
+    lock = threading.Lock()
+
+    def worker():
+        for _ in range(20):
+            conn = pool.getconn()
+            with lock:
+                peak.append(pool.stats()["in_use"])
+            pool.putconn(conn)
+
+    threads = [threading.Thread(target=worker) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert max(peak) <= 3
+    assert pool.stats()["in_use"] == 0
+
+@pytest.mark.unit
+def test_pool_discards_connections_inherited_across_fork(mock_db_connection):
+    pool = make_pool(min_size=2)
+    pool.prewarm()
+    inherited = pool.getconn()
+
+    with patch("os.getpid", return_value=os.getpid() + 1):
+        conn = pool.getconn()
+        assert conn is not inherited
+        assert pool.stats() == {"size": 1, "max_size": 2, "in_use": 1, "idle": 0, "waiters": 0}
+    inherited.close.assert_not_called()
+
+@pytest.mark.unit
+def test_prewarm_opens_connections_concurrently(mock_db_connection):
+    connect = mock_db_connection.side_effect
+    # Opened one after another, the first connect would never get past this
+    all_connecting = threading.Barrier(4, timeout=5)
+
+    def slow_connect(*args, **kwargs):
+        all_connecting.wait()
+        return connect(*args, **kwargs)
+
+    mock_db_connection.side_effect = slow_connect
+    pool = make_pool(min_size=4, max_size=4)
+
+    pool.prewarm()
+
+    assert not all_connecting.broken
+    assert pool.stats()["idle"] == 4
+
+@pytest.mark.unit
+def test_failed_prewarm_keeps_the_connections_it_opened(mock_db_connection):
+    connect = mock_db_connection.side_effect
+    results = iter([None, ConnectionError("refused"), None])
+
+    def flaky_connect(*args, **kwargs):
+        error = next(results)
+        if error is not None:
+            raise error
+        return connect(*args, **kwargs)
+
+    mock_db_connection.side_effect = flaky_connect
+    pool = make_pool(min_size=3, max_size=3)
+
+    with pytest.raises(ConnectionError):
+        pool.prewarm()
+
+    assert pool.stats()["size"] == pool.stats()["idle"] == 2
@@ -0,0 +1,95 @@
+import math
+import random
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from src.database.migrations import migrate
+from src.services.geo import (
+    covering_prefixes,
+    geohash_decode,
+    geohash_encode,
+    haversine_m,
+    parse_location,
+    prefix_ranges,
+    EARTH_RADIUS_M,
+)
+from src.services.location_service import LocationService
+
+def destination(lat, lon, bearing, distance):
+    """Point ``distance`` metres from (lat, lon) along ``bearing`` degrees."""
+    phi, lam, delta, theta = math.radians(lat), math.radians(lon), distance / EARTH_RADIUS_M, math.radians(bearing)
+    phi2 = math.asin(math.sin(phi) * math.cos(delta) + math.cos(phi) * math.sin(delta) * math.cos(theta))
+    lam2 = lam + math.atan2(math.sin(theta) * math.sin(delta) * math.cos(phi),
+                            math.cos(delta) - math.sin(phi) * math.sin(phi2))
+    return math.degrees(phi2), (math.degrees(lam2) + 180) % 360 - 180
+
+@pytest.mark.unit
+def test_geohash_matches_reference_values():
+    assert geohash_encode(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    lat_lo, lat_hi, lon_lo, lon_hi = geohash_decode("u4pruydqqvj")
+    assert lat_lo <= 57.64911 <= lat_hi and lon_lo <= 10.40744 <= lon_hi
+
+@pytest.mark.unit
+def test_parse_legacy_location_string():
+    assert parse_location("New York (40.7128, -74.006)") == ("New York", 40.7128, -74.006)
+    assert parse_location("Ankara (Capital) (39.9, 32.8)") == ("Ankara (Capital)", 39.9, 32.8)
+    assert parse_location("garbage") is None
+    assert parse_location("Nowhere (123.0, 0.0)") is None
+
+@pytest.mark.unit
+@pytest.mark.parametrize("lat,lon", [(41.0082, 28.9784), (0.0, 179.999), (-33.9, -0.001), (89.9, 10.0)])
+@pytest.mark.parametrize("radius", [50, 2000, 50000])
+def test_covering_prefixes_contain_every_point_in_radius(lat, lon, radius):
+    rng = random.Random(1)
+    prefixes = covering_prefixes(lat, lon, radius)
+    assert len(prefixes) <= 16
+    for _ in range(200):
+        point = destination(lat, lon, rng.uniform(0, 360), rng.uniform(0, radius * 0.999))
+        geohash = geohash_encode(*point)
+        assert any(lo <= geohash < hi for lo, hi in prefix_ranges(prefixes))
+
+@pytest.mark.unit
+def test_small_radius_uses_narrow_prefixes():
+    assert min(len(prefix) for prefix in covering_prefixes(41.0, 29.0, 100)) >= 6
+
+@pytest.mark.unit
+async def test_find_nearby_passes_index_ranges_to_repository():
+    repo = AsyncMock()
+    repo.find_nearby.return_value = [("id-1", "Istanbul", 41.0, 29.0, 12.5)]
+    service = LocationService(repository=repo, status_cache=None)
+
+    results = await service.find_nearby(41.0, 29.0, 1000, 10)
+
+    assert results[0].request_id == "id-1"
+    assert results[0].distance_m == 12.5
+    latitude, longitude, radius, ranges, limit = repo.find_nearby.await_args.args
+    assert (latitude, longitude, radius, limit) == (41.0, 29.0, 1000, 10)
+    assert any(lo <= geohash_encode(41.0, 29.0) < hi for lo, hi in ranges)
+
+@pytest.mark.unit
+async def test_submit_stores_typed_coordinates():
+    from src.models.location_model import LocationData
+
+    repo = AsyncMock()
+    repo.create_location.return_value = True
+    service = LocationService(repository=repo, status_cache=None)
+
+    await service.submit_location(LocationData(city="Istanbul", latitude=41.0082, longitude=28.9784))
+
+    request_id, location, status, coordinates = repo.create_location.await_args.args
+    assert location == "Istanbul (41.0082, 28.9784)"
+    assert coordinates == ("Istanbul", 41.0082, 28.9784, geohash_encode(41.0082, 28.9784))
+
+@pytest.mark.unit
+def test_migrate_applies_only_pending_versions():
+    conn = MagicMock()
+    cursor = conn.cursor.return_value.__enter__.return_value
+    cursor.fetchall.return_value = [(1,)]
+    post = MagicMock()
+    migrations = [(1, "one", ["SELECT 1"], None), (2, "two", ["SELECT 2"], post)]
+
+    assert migrate(conn, migrations) == [2]
+
+    executed = [c.args[0] for c in cursor.execute.call_args_list]
+    assert "SELECT 1" not in executed
+    assert "SELECT 2" in executed
+    post.assert_called_once_with(conn)
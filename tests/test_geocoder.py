@@ -0,0 +1,85 @@
+import random
+import numpy as np
+import pytest
+from unittest.mock import AsyncMock
+from src.models.location_model import LocationData
+from src.services.geo import haversine_m
+from src.services.geocoder import ReverseGeocoder, load_gazetteer
+from src.services.location_service import LocationService
+
+@pytest.fixture(scope="module")
+def gazetteer(tmp_path_factory):
+    return load_gazetteer(cache_dir=str(tmp_path_factory.mktemp("gazetteer")))
+
+def brute_force(gazetteer, latitude, longitude):
+    names, _, coordinates = gazetteer
+    distances = [haversine_m(latitude, longitude, lat, lon) for lat, lon in coordinates]
+    best = min(range(len(distances)), key=distances.__getitem__)
+    return names[best], distances[best]
+
+@pytest.mark.unit
+def test_bundled_gazetteer_is_memory_mapped(gazetteer):
+    names, countries, coordinates = gazetteer
+    assert isinstance(coordinates, np.memmap)
+    assert coordinates.shape == (len(names), 2)
+    assert "Istanbul" in names and len(countries) == len(names)
+
+@pytest.mark.unit
+@pytest.mark.parametrize("use_tree", [True, False])
+def test_lookup_matches_brute_force(gazetteer, use_tree):
+    geocoder = ReverseGeocoder(*gazetteer)
+    if not use_tree:
+        geocoder._tree = None
+    rng = random.Random(3)
+    latitudes = [rng.uniform(-90, 90) for _ in range(300)]
+    longitudes = [rng.uniform(-180, 180) for _ in range(300)]
+
+    results = geocoder.lookup_many(latitudes, longitudes)
+
+    for latitude, longitude, (city, _, distance) in zip(latitudes, longitudes, results):
+        expected_city, expected_distance = brute_force(gazetteer, latitude, longitude)
+        assert distance == pytest.approx(expected_distance, rel=1e-6, abs=1e-3)
+        assert city == expected_city
+
+@pytest.mark.unit
+def test_lookup_across_the_antimeridian(gazetteer):
+    geocoder = ReverseGeocoder(*gazetteer)
+    # Closer to Suva (178.45) than to anything west of the antimeridian
+    city, country, distance = geocoder.lookup(-18.2, -179.9)
+    assert (city, country) == ("Suva", "FJ")
+    assert distance < 200000
+
+@pytest.mark.unit
+async def test_submissions_store_canonical_city(gazetteer):
+    repo = AsyncMock()
+    repo.create_location.return_value = True
+    service = LocationService(repository=repo, status_cache=None, geocoder=ReverseGeocoder(*gazetteer))
+
+    # Client claims a different city than the coordinates say
+    await service.submit_location(LocationData(city="Ankara", latitude=41.01, longitude=28.97))
+
+    coordinates = repo.create_location.await_args.args[3]
+    assert coordinates[0] == "Ankara"
+    assert coordinates[4] == "Istanbul"
+    assert coordinates[5] == pytest.approx(haversine_m(41.01, 28.97, 41.0082, 28.9784), rel=1e-6)
+
+@pytest.mark.unit
+async def test_bulk_chunks_are_geocoded_in_one_batch(gazetteer):
+    repo = AsyncMock()
+    repo.copy_locations.return_value = True
+    geocoder = ReverseGeocoder(*gazetteer)
+    service = LocationService(repository=repo, status_cache=None, geocoder=geocoder)
+    body = (b'{"city": "a", "latitude": 41.0, "longitude": 29.0}\n'
+            b'{"city": "b", "latitude": 39.9, "longitude": 32.8}\n')
+
+    async def chunks():
+        yield body
+
+    async for _ in service.submit_location_stream(chunks()):
+        pass
+
+    rows = repo.copy_locations.await_args.args[0]
+    assert [(row[8], round(row[9])) for row in rows] == [
+        (city, round(distance)) for city, _, distance in geocoder.lookup_many([41.0, 39.9], [29.0, 32.8])
+    ]
+    assert [row[8] for row in rows] == ["Istanbul", "Ankara"]
@@ -0,0 +1,154 @@
+import json
+import random
+import pytest
+from unittest.mock import AsyncMock
+from src.services.backplane import InMemoryBackplane
+from src.services.connection_manager import ConnectionManager
+from src.services.geofence import GeofenceIndex, parse_fence
+from src.services.location_service import LocationService
+from src.models.location_model import LocationData
+from tests.test_connection_manager import FakeWebSocket, settle
+
+def random_fence(rng):
+    if rng.random() < 0.5:
+        return parse_fence({"type": "circle", "lat": rng.uniform(-80, 80), "lon": rng.uniform(-180, 180),
+                            "radius": rng.uniform(10, 50000)})
+    lat, lon = rng.uniform(-80, 79), rng.uniform(-180, 180)
+    max_lon = lon + rng.uniform(0.001, 2)
+    if max_lon > 180:
+        max_lon -= 360
+    return parse_fence({"type": "box", "min_lat": lat, "min_lon": lon,
+                        "max_lat": lat + rng.uniform(0.001, 1), "max_lon": max_lon})
+
+@pytest.mark.unit
+def test_index_matches_brute_force():
+    rng = random.Random(7)
+    index = GeofenceIndex()
+    fences = [random_fence(rng) for _ in range(2000)]
+    for fence in fences:
+        index.add(fence)
+    for fence in fences[::3]:
+        index.remove(fence.fence_id)
+    remaining = fences[1::3] + fences[2::3]
+
+    for _ in range(2000):
+        # Points near fences, so most lookups have matches
+        lat_lo, lat_hi, lon_lo, lon_hi = rng.choice(fences).bbox
+        lat = rng.uniform(lat_lo, lat_hi)
+        lon = (rng.uniform(lon_lo, lon_hi) + 180) % 360 - 180
+        expected = {fence.fence_id for fence in remaining if fence.contains(lat, lon)}
+        assert {fence.fence_id for fence in index.match(lat, lon)} == expected
+
+@pytest.mark.unit
+def test_fences_across_the_antimeridian():
+    index = GeofenceIndex()
+    box = index.add(parse_fence({"type": "box", "min_lat": -20, "min_lon": 179, "max_lat": -10, "max_lon": -179}))
+    circle = index.add(parse_fence({"type": "circle", "lat": 0, "lon": 180, "radius": 5000}))
+
+    assert [fence.fence_id for fence in index.match(-15, -179.5)] == [box]
+    assert [fence.fence_id for fence in index.match(-15, 179.5)] == [box]
+    assert index.match(-15, 0) == []
+    assert [fence.fence_id for fence in index.match(0.01, -179.99)] == [circle]
+
+@pytest.mark.unit
+@pytest.mark.parametrize("spec", [
+    {"type": "circle", "lat": 91, "lon": 0, "radius": 10},
+    {"type": "circle", "lat": 0, "lon": 0, "radius": -1},
+    {"type": "box", "min_lat": 10, "min_lon": 0, "max_lat": 0, "max_lon": 1},
+    {"type": "polygon"},
+    "not a fence",
+])
+def test_invalid_fences_are_rejected(spec):
+    with pytest.raises(ValueError):
+        parse_fence(spec)
+
+EVENT = {"request_id": "r1", "city": "Istanbul", "latitude": 41.01, "longitude": 28.98}
+
+@pytest.mark.unit
+async def test_location_events_reach_only_matching_subscribers():
+    manager = ConnectionManager()
+    inside, outside, unsubscribed = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+    for websocket in (inside, outside, unsubscribed):
+        await manager.connect(websocket)
+    await manager.handle_command(inside, {"action": "subscribe",
+                                          "fence": {"type": "circle", "lat": 41.0, "lon": 29.0, "radius": 5000}})
+    await manager.handle_command(outside, {"action": "subscribe",
+                                           "fence": {"type": "box", "min_lat": 39, "min_lon": 32,
+                                                     "max_lat": 40, "max_lon": 33}})
+    await settle()
+    fence_id = json.loads(inside.sent[0])["fence_id"]
+
+    await manager.publish_location(EVENT)
+    await settle()
+
+    assert json.loads(inside.sent[-1]) == {"event": "location", "fence_ids": [fence_id], **EVENT}
+    assert len(outside.sent) == 1
+    assert unsubscribed.sent == []
+
+    await manager.handle_command(inside, {"action": "unsubscribe", "fence_id": fence_id})
+    await manager.publish_location(EVENT)
+    await settle()
+    assert json.loads(inside.sent[-1]) == {"event": "unsubscribed", "fence_id": fence_id}
+    await manager.close()
+
+@pytest.mark.unit
+async def test_bad_commands_get_an_error_reply():
+    manager = ConnectionManager()
+    websocket, other = FakeWebSocket(), FakeWebSocket()
+    await manager.connect(websocket)
+    await manager.connect(other)
+    await manager.handle_command(other, {"action": "subscribe",
+                                         "fence": {"type": "circle", "lat": 0, "lon": 0, "radius": 10}})
+
+    await manager.handle_command(websocket, {"action": "subscribe", "fence": {"type": "circle"}})
+    # Fences of other clients cannot be removed
+    await manager.handle_command(websocket, {"action": "unsubscribe", "fence_id": 1})
+    await manager.handle_command(websocket, {"action": "watch"})
+    await settle()
+
+    assert [json.loads(message)["event"] for message in websocket.sent] == ["error"] * 3
+    assert len(manager.geofences) == 1
+    await manager.close()
+
+@pytest.mark.unit
+async def test_disconnect_drops_fences():
+    manager = ConnectionManager()
+    websocket = FakeWebSocket()
+    await manager.connect(websocket)
+    for radius in (100, 200):
+        manager.subscribe(websocket, {"type": "circle", "lat": 0, "lon": 0, "radius": radius})
+
+    manager.disconnect(websocket)
+
+    assert len(manager.geofences) == 0
+    assert manager.geofences.match(0, 0) == []
+
+@pytest.mark.unit
+async def test_location_events_are_matched_on_every_replica():
+    replicas = [ConnectionManager(backplane=InMemoryBackplane(channel="test-geofence")) for _ in range(2)]
+    clients = [FakeWebSocket(), FakeWebSocket()]
+    for manager, client in zip(replicas, clients):
+        await manager.start()
+        await manager.connect(client)
+    replicas[1].subscribe(clients[1], {"type": "circle", "lat": 41.0, "lon": 29.0, "radius": 5000})
+
+    await replicas[0].publish_location(EVENT)
+    await settle()
+
+    assert clients[0].sent == []
+    assert json.loads(clients[1].sent[0])["request_id"] == "r1"
+    for manager in replicas:
+        await manager.close()
+
+@pytest.mark.unit
+async def test_submit_location_publishes_event():
+    repository = AsyncMock()
+    repository.create_location.return_value = True
+    service = LocationService(repository=repository, ingest_mode="direct", status_cache=None)
+    listener = AsyncMock()
+    service.location_listeners.append(listener)
+
+    result = await service.submit_location(LocationData(city="Istanbul", latitude=41.01, longitude=28.98))
+
+    listener.assert_awaited_once_with({"request_id": result["request_id"], "city": "Istanbul",
+                                       "latitude": 41.01, "longitude": 28.98})
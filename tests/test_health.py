@@ -0,0 +1,103 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from fastapi.testclient import TestClient
+from src.main import app
+from src.observability.loop_lag import LoopLagMonitor
+from src.services.connection_manager import ConnectionManager, ClientConnection
+from src.services.health import HealthProber, SYSTEM_HEALTH, OK, DEGRADED, DOWN
+from src.services import health as health_module
+
+def repository(in_use: int = 0, waiters: int = 0, ping=None) -> MagicMock:
+    repo = MagicMock()
+    repo.ping = ping or AsyncMock(return_value=True)
+    repo.pool_stats.return_value = {"size": 10, "max_size": 10, "in_use": in_use, "idle": 10 - in_use,
+                                    "waiters": waiters}
+    return repo
+
+def gauge(component: str) -> float:
+    return SYSTEM_HEALTH.labels(component=component)._value.get()
+
+@pytest.mark.unit
+async def test_probe_caches_component_health_and_updates_the_gauge():
+    loop_lag = LoopLagMonitor(warn_after=0.25)
+    loop_lag.peak = 0.4
+    manager = ConnectionManager(queue_size=10)
+    for depth in (2, 9):
+        client = ClientConnection(MagicMock(), manager.queue_size)
+        for i in range(depth):
+            client.queue.put_nowait(f"message {i}")
+        manager.active_connections[MagicMock()] = client
+    prober = HealthProber(repository=repository(in_use=9), manager=manager, loop_lag=loop_lag)
+
+    status = await prober.probe()
+
+    components = status["components"]
+    assert components["database"]["status"] == OK
+    assert components["database_pool"]["status"] == DEGRADED and components["database_pool"]["saturation"] == 0.9
+    assert components["event_loop"] == {"status": DEGRADED, "lag_seconds": 0.4}
+    assert components["websocket"] == {"status": DEGRADED, "connections": 2, "queued_messages": 11,
+                                       "fullest_queue": 0.9}
+    assert status["status"] == DEGRADED
+    assert gauge("database") == 1 and gauge("event_loop") == 0.5
+    # The peak is per probe interval
+    assert (await prober.probe())["components"]["event_loop"]["status"] == OK
+
+@pytest.mark.unit
+async def test_database_down_or_hanging():
+    failing = repository(ping=AsyncMock(side_effect=ConnectionError("connection refused")))
+    status = await HealthProber(repository=failing).probe()
+    assert status["status"] == DOWN
+    assert status["components"]["database"] == {"status": DOWN, "error": "connection refused"}
+    assert gauge("database") == 0
+
+    answered = asyncio.Event()
+
+    async def hang():
+        await answered.wait()
+        return True
+
+    hanging = repository(ping=AsyncMock(side_effect=hang))
+    prober = HealthProber(repository=hanging, timeout=0.01)
+    assert (await prober.probe())["components"]["database"]["status"] == DOWN
+    assert not prober.database_ok
+    await prober.probe()
+    # The hanging ping is waited on again, not piled up behind
+    assert hanging.ping.await_count == 1
+    answered.set()
+    assert (await prober.probe())["components"]["database"]["status"] == OK
+    assert prober.database_ok
+    await prober.close()
+
+@pytest.mark.unit
+async def test_prober_is_alive_while_probes_keep_coming(monkeypatch):
+    prober = HealthProber(repository=repository(), interval=0.01)
+    assert prober.alive()
+    await prober.start()
+    assert prober.alive() and prober.status["status"] == OK
+
+    monkeypatch.setattr(health_module, "monotonic", lambda: prober.checked_at + 60)
+    assert not prober.alive()
+    await prober.close()
+
+@pytest.mark.unit
+def test_probes_and_endpoints_answer_from_the_cache(monkeypatch):
+    prober = HealthProber()
+    prober.status = {"status": DOWN, "checked_at": None, "components": {
+        "database": {"status": DOWN, "error": "connection refused"},
+        "event_loop": {"status": OK, "lag_seconds": 0.001}
+    }}
+    monkeypatch.setattr("src.main.prober", prober)
+    monkeypatch.setattr("src.controllers.devops_controller.prober", prober)
+    monkeypatch.setattr(app.state, "ready", True, raising=False)
+    client = TestClient(app)
+
+    assert client.get("/service/live").json() == {"status": "alive"}
+    response = client.get("/service/ready")
+    assert response.status_code == 503 and response.json()["status"] == "unavailable"
+    assert client.get("/service").json()["health"] == DOWN
+
+    response = client.get("/service/devops/health", headers={"X-API-Key": "secure-api-key"})
+    assert response.json()["components"]["database"]["error"] == "connection refused"
+    from src.controllers.devops_controller import controller
+    assert controller.system_status == {"database": 0, "event_loop": 1}
@@ -0,0 +1,130 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from src.models.location_model import LocationData
+from src.services.idempotency import IdempotencyCache, IDEMPOTENT_REPLAYS
+from src.services.location_service import LocationService
+from src.services.status_cache import StatusCache
+
+DATA = LocationData(city="Istanbul", latitude=41.0082, longitude=28.9784)
+
+def make_service(repo=None, **kwargs):
+    if repo is None:
+        repo = AsyncMock()
+        # The key is free: the row holding it is the one just inserted
+        repo.create_location_once.side_effect = lambda request_id, *args: (request_id, None)
+        repo.update_response_time.return_value = True
+    service = LocationService(repository=repo, status_cache=StatusCache(), status_notifier=MagicMock(), **kwargs)
+    return service, repo
+
+@pytest.mark.unit
+async def test_retry_replays_the_original_response_without_writing():
+    service, repo = make_service()
+    hits = IDEMPOTENT_REPLAYS.labels(source="cache")
+    before = hits._value.get()
+
+    first = await service.submit_location(DATA, idempotency_key="key-1")
+    retry = await service.submit_location(DATA, idempotency_key="key-1")
+    other = await service.submit_location(DATA, idempotency_key="key-2")
+
+    assert retry == first
+    assert other["request_id"] != first["request_id"]
+    assert repo.create_location_once.await_count == 2
+    assert hits._value.get() == before + 1
+
+@pytest.mark.unit
+async def test_concurrent_duplicates_share_one_insert():
+    service, repo = make_service()
+    inserted = asyncio.Event()
+
+    async def slow_insert(request_id, *args):
+        await inserted.wait()
+        return (request_id, None)
+
+    repo.create_location_once.side_effect = slow_insert
+
+    submissions = [asyncio.create_task(service.submit_location(DATA, idempotency_key="key"))
+                   for _ in range(20)]
+    await asyncio.sleep(0)
+    inserted.set()
+    responses = await asyncio.gather(*submissions)
+
+    repo.create_location_once.assert_awaited_once()
+    assert len({response["request_id"] for response in responses}) == 1
+
+@pytest.mark.unit
+async def test_key_taken_in_the_database_returns_the_earlier_request():
+    service, repo = make_service()
+    repo.create_location_once.side_effect = None
+    repo.create_location_once.return_value = ("earlier-id", 0.0123)
+    listener = AsyncMock()
+    service.location_listeners.append(listener)
+
+    response = await service.submit_location(DATA, idempotency_key="key")
+
+    assert response == {"request_id": "earlier-id", "status": "received", "response_time": "0.0123 sec"}
+    repo.update_response_time.assert_not_awaited()
+    listener.assert_not_awaited()
+
+@pytest.mark.unit
+async def test_failed_submissions_are_not_cached():
+    service, repo = make_service()
+    failures = [None]
+
+    async def insert(request_id, *args):
+        return failures.pop() if failures else (request_id, None)
+
+    repo.create_location_once.side_effect = insert
+
+    with pytest.raises(Exception, match="Failed to create location record"):
+        await service.submit_location(DATA, idempotency_key="key")
+    response = await service.submit_location(DATA, idempotency_key="key")
+
+    assert repo.create_location_once.await_count == 2
+    assert response["status"] == "received"
+
+@pytest.mark.unit
+async def test_disconnecting_first_caller_does_not_cancel_the_write():
+    cache = IdempotencyCache()
+    release = asyncio.Event()
+    calls = []
+
+    async def create():
+        calls.append(1)
+        await release.wait()
+        return {"request_id": "a"}
+
+    first = asyncio.create_task(cache.run("key", create))
+    await asyncio.sleep(0)
+    second = asyncio.create_task(cache.run("key", create))
+    await asyncio.sleep(0)
+    first.cancel()
+    release.set()
+
+    assert await second == {"request_id": "a"}
+    assert calls == [1]
+    assert cache.get("key") == {"request_id": "a"}
+
+@pytest.mark.unit
+def test_cache_is_bounded_and_expires():
+    cache = IdempotencyCache(max_size=2, ttl=60)
+    cache.put("a", {"request_id": "a"})
+    cache.put("b", {"request_id": "b"})
+    assert cache.get("a") is not None
+    cache.put("c", {"request_id": "c"})
+
+    assert cache.get("b") is None
+    assert len(cache) == 2
+
+    expired = IdempotencyCache(ttl=0)
+    expired.put("a", {"request_id": "a"})
+    assert expired.get("a") is None
+
+@pytest.mark.unit
+async def test_keyed_submissions_bypass_the_ingest_buffer():
+    service, repo = make_service(ingest_mode="batched")
+
+    await service.submit_location(DATA, idempotency_key="key")
+
+    repo.create_location_once.assert_awaited_once()
+    repo.create_locations.assert_not_awaited()
@@ -0,0 +1,62 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+from src.models.location_model import LocationData
+from src.services.ingest_buffer import IngestBuffer, ACK_ENQUEUE, ACK_FLUSH
+from src.services.location_service import LocationService
+
+@pytest.fixture
+def repo():
+    repo = AsyncMock()
+    repo.create_locations.return_value = True
+    return repo
+
+@pytest.mark.unit
+async def test_concurrent_submissions_are_group_committed(repo):
+    buffer = IngestBuffer(repo, batch_size=100, flush_interval=0.05)
+
+    results = await asyncio.gather(*(
+        buffer.submit(f"id-{i}", "Istanbul (41.0, 28.9)", "received", ack=ACK_FLUSH)
+        for i in range(20)
+    ))
+
+    assert all(results)
+    repo.create_locations.assert_awaited_once()
+    rows = repo.create_locations.await_args.args[0]
+    assert [row[0] for row in rows] == [f"id-{i}" for i in range(20)]
+    await buffer.close()
+
+@pytest.mark.unit
+async def test_flush_is_triggered_by_batch_size(repo):
+    buffer = IngestBuffer(repo, batch_size=5, flush_interval=10)
+
+    await asyncio.wait_for(asyncio.gather(*(
+        buffer.submit(f"id-{i}", "loc", "received", ack=ACK_FLUSH) for i in range(10)
+    )), timeout=1)
+
+    assert repo.create_locations.await_count == 2
+    await buffer.close()
+
+@pytest.mark.unit
+async def test_enqueue_ack_returns_before_flush_and_close_drains(repo):
+    buffer = IngestBuffer(repo, batch_size=100, flush_interval=10)
+
+    assert await buffer.submit("id-1", "loc", "received", ack=ACK_ENQUEUE)
+    repo.create_locations.assert_not_awaited()
+
+    await buffer.close()
+    repo.create_locations.assert_awaited_once()
+
+@pytest.mark.unit
+async def test_failed_flush_is_reported_to_waiting_callers(repo):
+    repo.create_locations.return_value = False
+    service = LocationService(repository=repo, ingest_mode="batched")
+    service.ingest_buffer.flush_interval = 0
+
+    with pytest.raises(Exception, match="Failed to create location record"):
+        await service.submit_location(
+            LocationData(city="Istanbul", latitude=41.0082, longitude=28.9784),
+            ack=ACK_FLUSH
+        )
+    repo.create_location.assert_not_awaited()
+    await service.close()
@@ -0,0 +1,107 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+from src.repositories.location_repository import CLAIM_JOBS_SQL, FINISH_JOBS_SQL
+from src.services.job_worker import JobWorker, validate_locations
+
+def claimed(request_id, attempts=1, latitude=41.0, longitude=29.0):
+    return (request_id, "Istanbul", latitude, longitude, attempts, 0.5)
+
+def make_repository(rows):
+    repo = AsyncMock()
+    repo.claim_jobs.return_value = rows
+    # Every claim is still held unless a test says otherwise
+    repo.finish_jobs.side_effect = lambda outcomes: [outcome[0] for outcome in outcomes]
+    return repo
+
+def outcomes_by_id(repo):
+    return {outcome[0]: outcome for outcome in repo.finish_jobs.await_args.args[0]}
+
+@pytest.mark.unit
+async def test_jobs_move_to_completed_retry_or_failed():
+    repo = make_repository([
+        claimed("ok"),
+        claimed("retry", attempts=1, latitude=None),
+        claimed("dead", attempts=3, latitude=None),
+    ])
+    worker = JobWorker(repo, batch_size=10, max_attempts=3)
+
+    assert await worker.run_once() == 3
+
+    outcomes = outcomes_by_id(repo)
+    assert outcomes["ok"] == ("ok", 1, "completed", 0.0, None)
+    request_id, attempts, status, delay, error = outcomes["retry"]
+    assert (status, error) == ("received", "location has no coordinates")
+    assert delay >= 0
+    assert outcomes["dead"][2] == "failed"
+
+@pytest.mark.unit
+async def test_processor_exception_retries_the_batch():
+    async def broken(jobs):
+        raise RuntimeError("downstream unavailable")
+
+    repo = make_repository([claimed("a"), claimed("b")])
+    worker = JobWorker(repo, processor=broken, max_attempts=3)
+
+    await worker.run_once()
+
+    assert {(outcome[2], outcome[4]) for outcome in outcomes_by_id(repo).values()} == {
+        ("received", "downstream unavailable")
+    }
+
+@pytest.mark.unit
+async def test_late_results_do_not_override_a_newer_claim():
+    repo = make_repository([claimed("a"), claimed("b")])
+    # "b" was reclaimed by another worker after our lease expired
+    repo.finish_jobs.side_effect = lambda outcomes: ["a"]
+    worker = JobWorker(repo)
+
+    assert await worker.run_once() == 2
+    # The fencing token is part of what gets written back
+    assert [outcome[:2] for outcome in repo.finish_jobs.await_args.args[0]] == [("a", 1), ("b", 1)]
+
+@pytest.mark.unit
+def test_claims_skip_rows_locked_by_other_workers():
+    assert "FOR UPDATE SKIP LOCKED" in CLAIM_JOBS_SQL
+    assert "r.attempts = v.attempts" in FINISH_JOBS_SQL
+
+@pytest.mark.unit
+async def test_concurrent_loops_share_the_queue():
+    pending = [claimed(str(i)) for i in range(250)]
+
+    async def claim_jobs(limit, lease_seconds):
+        await asyncio.sleep(0)
+        batch = pending[:limit]
+        del pending[:limit]
+        return batch
+
+    processed = []
+
+    async def processor(jobs):
+        processed.extend(job.request_id for job in jobs)
+        return await validate_locations(jobs)
+
+    repo = make_repository([])
+    repo.claim_jobs.side_effect = claim_jobs
+    repo.job_backlog.return_value = (0, 0)
+    worker = JobWorker(repo, processor=processor, concurrency=3, batch_size=20, poll_interval=0.01)
+
+    worker.start()
+    for _ in range(100):
+        if len(processed) == 250:
+            break
+        await asyncio.sleep(0.01)
+    await worker.close()
+
+    assert sorted(processed, key=int) == [str(i) for i in range(250)]
+
+@pytest.mark.unit
+async def test_disabled_worker_never_claims():
+    repo = make_repository([claimed("a")])
+    worker = JobWorker(repo, concurrency=0)
+
+    worker.start()
+    await asyncio.sleep(0.01)
+    await worker.close()
+
+    repo.claim_jobs.assert_not_awaited()
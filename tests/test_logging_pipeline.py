@@ -0,0 +1,123 @@
+import io
+import json
+import logging
+import queue
+import pytest
+from src.observability.logging_pipeline import (
+    LOG_BYTES_WRITTEN,
+    LOG_RECORDS_DROPPED,
+    NonBlockingQueueHandler,
+    OrjsonFormatter,
+    RateLimitedStreamHandler,
+    RequestSampler,
+    parse_sample_rates,
+)
+
+def make_record(msg="hello", level=logging.INFO, **extra):
+    record = logging.LogRecord("test", level, __file__, 1, msg, None, None)
+    record.__dict__.update(extra)
+    return record
+
+def dropped(reason):
+    return LOG_RECORDS_DROPPED.labels(reason=reason)._value.get()
+
+@pytest.fixture
+def pipeline():
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=100))
+    sampler = RequestSampler(rates=parse_sample_rates("/service/request-=0,/service=1"),
+                             default_rate=1.0, max_held=10)
+    sampler.handler = handler
+    handler.addFilter(sampler)
+    return handler, sampler
+
+@pytest.mark.unit
+def test_formatter_emits_json_with_extras():
+    formatter = OrjsonFormatter(fmt='%(levelname)s %(name)s %(message)s')
+    payload = json.loads(formatter.format(make_record(endpoint="/service", duration=0.5)))
+    assert payload["message"] == "hello"
+    assert payload["levelname"] == "INFO"
+    assert payload["endpoint"] == "/service"
+    assert payload["duration"] == 0.5
+
+@pytest.mark.unit
+def test_longest_prefix_wins():
+    rates = parse_sample_rates("/service=0.5,/service/request-=0.01")
+    sampler = RequestSampler(rates=rates, default_rate=1.0)
+    assert sampler.rate_for("/service/request-abc") == 0.01
+    assert sampler.rate_for("/service/submit") == 0.5
+    assert sampler.rate_for("/metrics") == 1.0
+
+@pytest.mark.unit
+def test_unsampled_request_drops_info_but_keeps_warnings(pipeline):
+    handler, sampler = pipeline
+    before = dropped("sampled")
+
+    token = sampler.begin("/service/request-123")
+    handler.handle(make_record("info"))
+    handler.handle(make_record("warn", level=logging.WARNING))
+    sampler.end(token)
+
+    assert [handler.queue.get_nowait().msg] == ["warn"]
+    assert handler.queue.empty()
+    assert dropped("sampled") == before + 1
+
+@pytest.mark.unit
+def test_unsampled_request_logs_everything_on_error(pipeline):
+    handler, sampler = pipeline
+
+    token = sampler.begin("/service/request-123")
+    handler.handle(make_record("step 1"))
+    handler.handle(make_record("failed", level=logging.ERROR))
+    sampler.end(token, error=True)
+
+    messages = [handler.queue.get_nowait().msg for _ in range(2)]
+    assert sorted(messages) == ["failed", "step 1"]
+
+@pytest.mark.unit
+def test_full_queue_drops_instead_of_blocking():
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    before = dropped("queue_full")
+    handler.handle(make_record("a"))
+    handler.handle(make_record("b"))
+    assert dropped("queue_full") == before + 1
+
+@pytest.mark.unit
+def test_queue_handler_does_not_format_on_caller_thread():
+    handler = NonBlockingQueueHandler(queue.Queue())
+    record = make_record("value %s", endpoint="/service")
+    record.args = (42,)
+    handler.handle(record)
+    queued = handler.queue.get_nowait()
+    assert queued.msg == "value 42"
+    assert queued.args is None
+    assert not hasattr(queued, "message")
+
+@pytest.mark.unit
+def test_byte_rate_cap():
+    now = [0.0]
+    stream = io.StringIO()
+    handler = RateLimitedStreamHandler(stream, max_bytes_per_sec=100, clock=lambda: now[0])
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    before = dropped("rate_limit")
+
+    for _ in range(5):
+        handler.handle(make_record("x" * 39))  # 40 bytes with the newline
+    assert stream.getvalue().count("\n") == 2
+    assert dropped("rate_limit") == before + 3
+
+    now[0] = 1.0
+    handler.handle(make_record("x" * 39))
+    assert stream.getvalue().count("\n") == 3
+
+@pytest.mark.unit
+def test_byte_rate_cap_counts_encoded_bytes():
+    stream = io.StringIO()
+    handler = RateLimitedStreamHandler(stream, max_bytes_per_sec=100, clock=lambda: 0.0)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    written = LOG_BYTES_WRITTEN._value.get()
+
+    # 31 characters but 61 bytes in UTF-8, so only one fits
+    for _ in range(2):
+        handler.handle(make_record("İ" * 30))
+    assert stream.getvalue().count("\n") == 1
+    assert LOG_BYTES_WRITTEN._value.get() == written + 61
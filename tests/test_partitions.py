@@ -0,0 +1,144 @@
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock
+from uuid import UUID, uuid4
+from src.database import migrations
+from src.database.partitions import (
+    uuid7, uuid7_time, partition_plan, parse_partition, Partition, PartitionMaintainer, PARTITION_HORIZON
+)
+from src.repositories.location_repository import (
+    id_condition, finish_statements, full_row, FINISH_JOBS_SQL, FINISH_UNTIMED_JOBS_SQL
+)
+
+NOW = datetime(2026, 10, 17, 15, 30)
+
+def day(n: int) -> datetime:
+    return datetime(2026, 10, 17) + timedelta(days=n)
+
+def partitions(*days: int, legacy_until: int = None) -> list:
+    existing = [Partition("requests_legacy", None, day(legacy_until))] if legacy_until is not None else []
+    return existing + [Partition(f"requests_p{day(n):%Y%m%d}", day(n), day(n + 1)) for n in days]
+
+@pytest.mark.unit
+def test_uuid7_ids_carry_their_creation_time():
+    request_id = uuid7(now=1792251000.123456)
+    value = UUID(request_id)
+    assert value.version == 7 and value.variant == "specified in RFC 4122"
+    assert uuid7_time(request_id) == datetime(2026, 10, 17, 15, 30, 0, 123000)
+    # Later ids sort after earlier ones
+    assert uuid7(now=1792251000.124) > request_id
+    assert uuid7_time(str(uuid4())) is None
+    assert uuid7_time("not-a-uuid") is None
+
+@pytest.mark.unit
+def test_lookups_match_created_at_only_for_uuid7_ids():
+    request_id = uuid7()
+    assert id_condition(request_id, ("%s", "%s")) == ("id = %s AND created_at = %s",
+                                                      (request_id, uuid7_time(request_id)))
+    legacy = str(uuid4())
+    assert id_condition(legacy, ("$1", "$2")) == ("id = $1", (legacy,))
+    assert full_row((request_id, "X (1, 2)", "received"))[-1] == uuid7_time(request_id)
+
+    statements = finish_statements([(request_id, 1, "completed", 0.0, None), (legacy, 2, "failed", 0.0, "boom")])
+    assert statements == [
+        (FINISH_JOBS_SQL, ([request_id], [1], ["completed"], [0.0], [None], [uuid7_time(request_id)])),
+        (FINISH_UNTIMED_JOBS_SQL, ([legacy], [2], ["failed"], [0.0], ["boom"], [None])),
+    ]
+
+@pytest.mark.unit
+def test_plan_creates_partitions_ahead_after_the_legacy_table():
+    create, drop = partition_plan(partitions(legacy_until=2), NOW, "day", ahead=3, retention_days=0)
+    assert [(p.name, p.lower, p.upper) for p in create] == [
+        ("requests_p20261019", day(2), day(3)),
+        ("requests_p20261020", day(3), day(4)),
+    ]
+    assert drop == []
+
+    # Nothing to do once the current day and three more exist
+    assert partition_plan(partitions(0, 1, 2, 3), NOW, "day", 3, 0) == ([], [])
+
+@pytest.mark.unit
+def test_plan_fills_gaps_and_follows_interval_changes():
+    # Maintenance stopped for a while: the missing days are created in order
+    create, _ = partition_plan(partitions(-3), NOW, "day", ahead=0, retention_days=0)
+    assert [p.name for p in create] == ["requests_p20261015", "requests_p20261016", "requests_p20261017"]
+
+    # Switched to monthly: the rest of October first, then whole months
+    create, _ = partition_plan(partitions(0), NOW, "month", ahead=1, retention_days=0)
+    assert [(p.lower, p.upper) for p in create] == [
+        (day(1), datetime(2026, 11, 1)),
+        (datetime(2026, 11, 1), datetime(2026, 12, 1)),
+    ]
+    create, _ = partition_plan(partitions(0), NOW, "week", ahead=1, retention_days=0)
+    # 2026-10-19 is a Monday
+    assert [(p.lower, p.upper) for p in create] == [(day(1), day(2)), (day(2), day(9))]
+
+@pytest.mark.unit
+def test_plan_drops_whole_partitions_past_retention():
+    existing = partitions(-9, -8, -7, 0, 1, legacy_until=-9)
+    existing.append(Partition("requests_p20260101", datetime(2026, 1, 1), datetime(2026, 1, 2), detach_pending=True))
+    _, drop = partition_plan(existing, NOW, "day", ahead=1, retention_days=8)
+
+    # The cutoff is 10-09 15:30, and requests_p20261009 still holds rows newer than that
+    assert [p.name for p in drop] == ["requests_p20260101", "requests_legacy", "requests_p20261008"]
+    # Partitions being detached are finished even without a retention period
+    _, drop = partition_plan(existing, NOW, "day", ahead=1, retention_days=0)
+    assert [p.name for p in drop] == ["requests_p20260101"]
+
+@pytest.mark.unit
+def test_parse_partition_bounds():
+    assert parse_partition("requests_legacy", "FOR VALUES FROM (MINVALUE) TO ('2026-10-19 00:00:00')") == \
+        Partition("requests_legacy", None, datetime(2026, 10, 19))
+    assert parse_partition("requests_p20261019",
+                           "FOR VALUES FROM ('2026-10-19 00:00:00') TO ('2026-10-20 00:00:00')", True) == \
+        Partition("requests_p20261019", datetime(2026, 10, 19), datetime(2026, 10, 20), True)
+    assert parse_partition("requests_default", "DEFAULT") is None
+
+def catalog(parts: list) -> list:
+    def bound(value):
+        return "MINVALUE" if value is None else f"'{value:%Y-%m-%d %H:%M:%S}'"
+    return [(p.name, f"FOR VALUES FROM ({bound(p.lower)}) TO ({bound(p.upper)})", p.detach_pending) for p in parts]
+
+@pytest.mark.unit
+async def test_maintainer_creates_then_drops_and_expires_keys():
+    repo = MagicMock()
+    repo.list_partitions = AsyncMock(return_value=catalog(partitions(-30, 0, legacy_until=-30)))
+    repo.create_partition = AsyncMock(return_value=True)
+    repo.drop_partition = AsyncMock(return_value=True)
+    repo.expire_request_keys = AsyncMock(return_value=True)
+    maintainer = PartitionMaintainer(repository=repo, partition_interval="day", ahead=2, retention_days=7)
+
+    result = await maintainer.run_once(NOW)
+
+    assert result == {"created": ["requests_p20261018", "requests_p20261019"],
+                      "dropped": ["requests_legacy", "requests_p20260917"]}
+    repo.create_partition.assert_any_await("requests_p20261018", day(1), day(2))
+    repo.drop_partition.assert_any_await("requests_legacy", False)
+    repo.expire_request_keys.assert_awaited_once_with(NOW - timedelta(days=7))
+    assert PARTITION_HORIZON._value.get() == (day(3) - NOW).total_seconds()
+
+@pytest.mark.unit
+async def test_maintainer_stops_at_a_failed_create_and_skips_unpartitioned_tables():
+    repo = MagicMock()
+    repo.list_partitions = AsyncMock(return_value=catalog(partitions(0)))
+    repo.create_partition = AsyncMock(side_effect=[True, False, True])
+    maintainer = PartitionMaintainer(repository=repo, partition_interval="day", ahead=3, retention_days=0)
+
+    # A gap would send inserts for the day after it nowhere
+    assert await maintainer.run_once(NOW) == {"created": ["requests_p20261018"], "dropped": []}
+    assert repo.create_partition.await_count == 2
+
+    repo.list_partitions = AsyncMock(return_value=[])
+    assert await maintainer.run_once(NOW) is None
+
+    with pytest.raises(ValueError):
+        PartitionMaintainer(partition_interval="hour")
+
+@pytest.mark.unit
+def test_migrations_stop_at_the_target_version():
+    conn = MagicMock()
+    cursor = conn.cursor.return_value.__enter__.return_value
+    cursor.fetchall.return_value = [(1,)]
+    steps = [(version, f"step {version}", [f"SELECT {version}"], None) for version in (1, 2, 3)]
+
+    assert migrations.migrate(conn, steps, target=2) == [2]
@@ -0,0 +1,98 @@
+import asyncio
+import threading
+import pytest
+from time import monotonic, sleep
+from types import SimpleNamespace
+from fastapi.testclient import TestClient
+from src.main import app
+from src.observability.loop_lag import LoopLagMonitor, EVENT_LOOP_LAG
+from src.observability.middleware import active_requests
+from src.observability.profiler import StackSampler, ProfilerBusy, NO_REQUEST
+
+def spin(seconds: float):
+    # Blocks whichever thread runs it, like a handler doing CPU work
+    end = monotonic() + seconds
+    while monotonic() < end:
+        pass
+
+def lines_with(collapsed: str, *parts) -> list:
+    return [line for line in collapsed.splitlines() if all(part in line for part in parts)]
+
+@pytest.mark.unit
+async def test_event_loop_stacks_are_tagged_with_the_active_route():
+    sampler = StackSampler(interval=0.005)
+
+    async def handler():
+        task = asyncio.current_task()
+        active_requests[task] = ("GET", {"route": SimpleNamespace(path_format="/busy/{item_id}")})
+        try:
+            spin(0.2)
+        finally:
+            active_requests.pop(task)
+
+    profile = asyncio.create_task(sampler.run(0.1))
+    await asyncio.sleep(0.01)
+    await handler()
+    collapsed = await profile
+
+    busy = lines_with(collapsed, "GET /busy/{item_id};", "spin (")
+    assert busy
+    # Outermost frame first, leaf last, then the sample count
+    stack, count = busy[0].rsplit(" ", 1)
+    assert stack.split(";")[-1].startswith("spin (") and int(count) > 0
+    assert "test_profiler.py:" in stack
+
+@pytest.mark.unit
+async def test_other_threads_are_sampled_under_their_name():
+    stop = threading.Event()
+    worker = threading.Thread(target=lambda: stop.wait(5), name="geocoder-loader")
+    worker.start()
+    try:
+        collapsed = await StackSampler(interval=0.005).run(0.05)
+    finally:
+        stop.set()
+        worker.join()
+
+    assert lines_with(collapsed, "geocoder-loader;")
+    # The idle event loop belongs to no request
+    assert lines_with(collapsed, f";{NO_REQUEST};")
+    assert not lines_with(collapsed, "stack-sampler")
+
+@pytest.mark.unit
+async def test_one_profile_at_a_time():
+    sampler = StackSampler(interval=0.005)
+    first = asyncio.create_task(sampler.run(0.1))
+    await asyncio.sleep(0)
+
+    with pytest.raises(ProfilerBusy):
+        await sampler.run(0.1)
+    await first
+    assert await sampler.run(0.01)
+
+@pytest.mark.unit
+async def test_loop_lag_monitor_records_blocked_loop():
+    before = EVENT_LOOP_LAG._sum.get()
+    monitor = LoopLagMonitor(interval=0.01)
+    await monitor.start()
+    await asyncio.sleep(0.02)
+
+    sleep(0.15)
+    await asyncio.sleep(0.03)
+    await monitor.close()
+
+    assert EVENT_LOOP_LAG._sum.get() - before >= 0.1
+
+@pytest.mark.unit
+def test_profile_endpoint():
+    client = TestClient(app)
+    headers = {"X-API-Key": "secure-api-key"}
+
+    response = client.post("/service/devops/profile?seconds=0.05&interval_ms=5", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    # The test thread is blocked in the client call meanwhile
+    assert lines_with(response.text, "MainThread;", "test_profile_endpoint (")
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in response.text.splitlines())
+
+    assert client.post("/service/devops/profile?seconds=0.05").status_code == 403
+    assert client.post("/service/devops/profile?seconds=3600", headers=headers).status_code == 422
@@ -0,0 +1,52 @@
+import pytest
+from unittest.mock import MagicMock, AsyncMock, patch
+from src.models.location_model import LocationData
+from src.services.location_service import LocationService
+from src.repositories.async_location_repository import (
+    AsyncLocationRepository,
+    ThreadedLocationRepository,
+    create_location_repository,
+)
+
+@pytest.mark.unit
+def test_create_location_repository_selects_backend():
+    assert isinstance(create_location_repository("asyncpg"), AsyncLocationRepository)
+    with patch('src.repositories.async_location_repository.LocationRepository'):
+        assert isinstance(create_location_repository("psycopg2"), ThreadedLocationRepository)
+    with pytest.raises(ValueError):
+        create_location_repository("sqlite")
+
+@pytest.mark.unit
+async def test_threaded_repository_delegates_to_psycopg2_repository():
+    sync_repo = MagicMock()
+    sync_repo.create_location.return_value = True
+    sync_repo.get_location.return_value = ("test-id", "Test Location", "test")
+    repo = ThreadedLocationRepository(sync_repo)
+
+    assert await repo.create_location("test-id", "Test Location", "test")
+    assert (await repo.get_location("test-id"))[0] == "test-id"
+    sync_repo.create_location.assert_called_once_with("test-id", "Test Location", "test", None)
+
+@pytest.mark.unit
+async def test_location_service_awaits_repository():
+    repo = AsyncMock()
+    repo.create_location.return_value = True
+    repo.update_response_time.return_value = True
+    service = LocationService(repository=repo)
+
+    result = await service.submit_location(
+        LocationData(city="Istanbul", latitude=41.0082, longitude=28.9784)
+    )
+
+    assert result["status"] == "received"
+    repo.create_location.assert_awaited_once()
+    repo.update_response_time.assert_awaited_once()
+
+@pytest.mark.unit
+async def test_location_service_raises_when_request_missing():
+    repo = AsyncMock()
+    repo.get_location.return_value = None
+    service = LocationService(repository=repo)
+
+    with pytest.raises(Exception, match="Request not found"):
+        await service.get_request_status("missing-id")
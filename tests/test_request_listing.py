@@ -0,0 +1,148 @@
+import csv
+import io
+import json
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+from src.repositories.location_repository import LocationRepository, records_query, records_params
+from src.services.location_service import LocationService, decode_cursor, encode_cursor
+from src.services.status_cache import StatusCache
+
+START = datetime(2024, 1, 1)
+
+def make_row(i: int, status: str = "completed"):
+    # Three rows share every timestamp, so the id has to break ties
+    return (f"00000000-0000-0000-0000-{i:012d}", "City (41.0, 29.0)", status, "City", 41.0, 29.0,
+            None, None, START + timedelta(seconds=i // 3), START + timedelta(seconds=i // 3), 0.1)
+
+class FakeRepository:
+    """Applies records_params the way records_query does."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.closed = 0
+
+    def _select(self, params, descending=False):
+        rows = sorted(self.rows, key=lambda row: (row[8], row[0]), reverse=descending)
+        if "status" in params:
+            rows = [row for row in rows if row[2] == params["status"]]
+        if "since" in params:
+            rows = [row for row in rows if row[8] >= params["since"]]
+        if "until" in params:
+            rows = [row for row in rows if row[8] < params["until"]]
+        if "after_created" in params:
+            after = (params["after_created"], params["after_id"])
+            rows = [row for row in rows if ((row[8], row[0]) < after if descending else (row[8], row[0]) > after)]
+        return rows[:params.get("limit")]
+
+    async def list_requests(self, params, descending=False):
+        return self._select(params, descending)
+
+    async def export_requests(self, params, chunk_size):
+        rows = self._select(params)
+        try:
+            for start in range(0, len(rows), chunk_size):
+                yield rows[start:start + chunk_size]
+        finally:
+            self.closed += 1
+
+def make_service(rows):
+    repo = FakeRepository(rows)
+    return LocationService(repository=repo, status_cache=StatusCache(), status_notifier=MagicMock()), repo
+
+async def all_pages(service, **filters):
+    seen, cursor = [], None
+    while True:
+        page = await service.list_requests(limit=4, cursor=cursor, **filters)
+        seen.extend(item.request_id for item in page.items)
+        if page.next_cursor is None:
+            return seen
+        cursor = page.next_cursor
+
+@pytest.mark.unit
+@pytest.mark.parametrize("descending", [False, True])
+async def test_pages_cover_every_row_once(descending):
+    rows = [make_row(i) for i in range(17)]
+    service, _ = make_service(rows)
+
+    seen = await all_pages(service, descending=descending)
+
+    expected = [row[0] for row in sorted(rows, key=lambda row: (row[8], row[0]), reverse=descending)]
+    assert seen == expected
+
+@pytest.mark.unit
+async def test_filters_apply_across_pages():
+    rows = [make_row(i, "failed" if i % 2 else "completed") for i in range(30)]
+    service, _ = make_service(rows)
+
+    seen = await all_pages(service, status="failed", since=START + timedelta(seconds=2),
+                           until=START + timedelta(seconds=8))
+
+    assert seen == [row[0] for row in rows if row[2] == "failed" and 2 <= (row[8] - START).seconds < 8]
+
+@pytest.mark.unit
+def test_cursor_round_trip_and_rejects_garbage():
+    created_at, request_id = START + timedelta(microseconds=5), make_row(1)[0]
+    assert decode_cursor(encode_cursor(created_at, request_id)) == (created_at, request_id)
+    for cursor in ("garbage", encode_cursor(created_at, "not-a-uuid")):
+        with pytest.raises(ValueError):
+            decode_cursor(cursor)
+
+@pytest.mark.unit
+def test_listing_query_seeks_instead_of_offsetting():
+    params = records_params("completed", START, None, (START, make_row(1)[0]), 10)
+    query = records_query(lambda name: f"%({name})s", params, descending=True)
+
+    assert "OFFSET" not in query
+    assert "(created_at, id) < (%(after_created)s, %(after_id)s::uuid)" in query
+    assert query.endswith("ORDER BY created_at DESC, id DESC LIMIT %(limit)s")
+    assert "until" not in params
+
+@pytest.mark.unit
+async def test_csv_export_streams_every_row_with_one_header(monkeypatch):
+    monkeypatch.setattr("src.services.location_service.EXPORT_CHUNK_SIZE", 3)
+    rows = [make_row(i) for i in range(7)]
+    service, repo = make_service(rows)
+
+    chunks = [chunk async for chunk in service.export_requests("csv")]
+
+    assert len(chunks) == 3
+    records = list(csv.DictReader(io.StringIO("".join(chunks))))
+    assert [record["request_id"] for record in records] == [row[0] for row in rows]
+    assert records[0]["created_at"] == START.isoformat()
+    assert repo.closed == 1
+
+@pytest.mark.unit
+async def test_empty_csv_export_still_has_a_header():
+    service, _ = make_service([])
+    assert [chunk async for chunk in service.export_requests("csv")] == [
+        "request_id,location,status,city,latitude,longitude,canonical_city,canonical_distance_m,"
+        "created_at,updated_at,response_time\r\n"
+    ]
+
+@pytest.mark.unit
+async def test_abandoned_export_releases_the_repository_cursor():
+    service, repo = make_service([make_row(i) for i in range(10)])
+    chunks = service.export_requests("ndjson")
+
+    first = await chunks.__anext__()
+    await chunks.aclose()
+
+    assert json.loads(first.splitlines()[0])["request_id"] == make_row(0)[0]
+    assert repo.closed == 1
+
+@pytest.mark.unit
+def test_psycopg2_export_uses_a_named_cursor_and_returns_the_connection():
+    conn = MagicMock()
+    cursor = conn.cursor.return_value.__enter__.return_value
+    cursor.fetchmany.side_effect = [[make_row(0), make_row(1)], [make_row(2)], []]
+    repo = LocationRepository.__new__(LocationRepository)
+    repo.db = MagicMock()
+    repo.db.get_connection.return_value = conn
+
+    chunks = list(repo.export_requests({}, 2))
+
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert conn.cursor.call_args.kwargs["name"].startswith("export_")
+    cursor.fetchmany.assert_called_with(2)
+    repo.db.return_connection.assert_called_once_with(conn)
@@ -0,0 +1,119 @@
+import logging
+import pytest
+from fastapi import FastAPI, WebSocket
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from src.observability.middleware import RequestLoggingMiddleware, REQUEST_COUNT, REQUEST_LATENCY, ERROR_COUNT
+
+def build_app(middleware=RequestLoggingMiddleware):
+    app = FastAPI()
+
+    @app.get("/ok")
+    async def ok():
+        return {"ok": True}
+
+    @app.get("/stream")
+    async def stream():
+        async def body():
+            for i in range(3):
+                yield f"{i}\n"
+        return StreamingResponse(body())
+
+    @app.get("/boom")
+    async def boom():
+        raise KeyError("boom")
+
+    @app.websocket("/ws")
+    async def ws(websocket: WebSocket):
+        await websocket.accept()
+        await websocket.send_text(await websocket.receive_text())
+        await websocket.close()
+
+    if middleware is not None:
+        app.add_middleware(middleware)
+    return app
+
+def count(method, endpoint, status):
+    return REQUEST_COUNT.labels(method=method, endpoint=endpoint, status=status)._value.get()
+
+@pytest.mark.unit
+def test_request_is_counted_and_logged(caplog):
+    client = TestClient(build_app())
+    before = count("GET", "/ok", 200)
+
+    with caplog.at_level(logging.INFO, logger="src.observability.middleware"):
+        response = client.get("/ok")
+
+    assert response.json() == {"ok": True}
+    assert count("GET", "/ok", 200) == before + 1
+    completed = [r for r in caplog.records if r.getMessage() == "Request completed"]
+    assert completed[-1].status_code == 200
+    assert completed[-1].endpoint == "/ok"
+
+@pytest.mark.unit
+def test_streaming_response_passes_through():
+    client = TestClient(build_app())
+    before = count("GET", "/stream", 200)
+
+    response = client.get("/stream")
+
+    assert response.text == "0\n1\n2\n"
+    assert count("GET", "/stream", 200) == before + 1
+
+@pytest.mark.unit
+def test_unhandled_error_is_counted():
+    client = TestClient(build_app(), raise_server_exceptions=False)
+    before = ERROR_COUNT.labels(type="KeyError")._value.get()
+
+    response = client.get("/boom")
+
+    assert response.status_code == 500
+    assert ERROR_COUNT.labels(type="KeyError")._value.get() == before + 1
+
+@pytest.mark.unit
+def test_websocket_session_is_counted():
+    client = TestClient(build_app())
+    before = count("WS", "/ws", 101)
+
+    with client.websocket_connect("/ws") as websocket:
+        websocket.send_text("ping")
+        assert websocket.receive_text() == "ping"
+
+    assert count("WS", "/ws", 101) == before + 1
+
+def series(metric):
+    return {
+        tuple(sorted(sample.labels.items()))
+        for family in metric.collect()
+        for sample in family.samples
+    }
+
+@pytest.mark.unit
+def test_series_count_is_constant_under_random_ids():
+    import uuid
+    app = build_app()
+
+    @app.get("/items/request-{item_id}")
+    async def item(item_id: str):
+        return {"id": item_id}
+
+    client = TestClient(app)
+    client.get(f"/items/request-{uuid.uuid4()}")
+    client.get(f"/missing/{uuid.uuid4()}")
+    count_series, latency_series = series(REQUEST_COUNT), series(REQUEST_LATENCY)
+
+    for _ in range(100):
+        assert client.get(f"/items/request-{uuid.uuid4()}").status_code == 200
+        assert client.get(f"/missing/{uuid.uuid4()}").status_code == 404
+
+    assert series(REQUEST_COUNT) == count_series
+    assert series(REQUEST_LATENCY) == latency_series
+    assert count("GET", "/items/request-{item_id}", 200) >= 101
+    assert count("GET", "<unmatched>", 404) >= 101
+
+@pytest.mark.unit
+def test_latency_buckets_are_parsed():
+    from prometheus_client import Histogram
+    from src.observability.middleware import parse_buckets
+    assert parse_buckets("0.5, 0.01,1") == (0.01, 0.5, 1.0)
+    assert parse_buckets("") == Histogram.DEFAULT_BUCKETS
@@ -0,0 +1,70 @@
+import os
+import pytest
+from unittest.mock import patch
+from uvicorn.workers import UvicornWorker
+from websockets import frames
+from websockets.extensions.permessage_deflate import PerMessageDeflate
+from src import server
+
+def write(root, name, content):
+    path = root / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+
+@pytest.mark.unit
+def test_cgroup_v2_quota(tmp_path):
+    write(tmp_path, "cpu.max", "150000 100000\n")
+    assert server.cgroup_cpu_limit(str(tmp_path)) == 1.5
+
+@pytest.mark.unit
+def test_cgroup_v2_unlimited(tmp_path):
+    write(tmp_path, "cpu.max", "max 100000\n")
+    assert server.cgroup_cpu_limit(str(tmp_path)) is None
+
+@pytest.mark.unit
+def test_cgroup_v1_quota(tmp_path):
+    write(tmp_path, "cpu/cpu.cfs_quota_us", "200000")
+    write(tmp_path, "cpu/cpu.cfs_period_us", "100000")
+    assert server.cgroup_cpu_limit(str(tmp_path)) == 2
+
+@pytest.mark.unit
+def test_cgroup_v1_unlimited(tmp_path):
+    write(tmp_path, "cpu/cpu.cfs_quota_us", "-1")
+    write(tmp_path, "cpu/cpu.cfs_period_us", "100000")
+    assert server.cgroup_cpu_limit(str(tmp_path)) is None
+
+@pytest.mark.unit
+def test_available_cpus_rounds_quota_up_and_respects_affinity(tmp_path):
+    write(tmp_path, "cpu.max", "150000 100000")
+    with patch("os.sched_getaffinity", return_value=set(range(8))):
+        assert server.available_cpus(str(tmp_path)) == 2
+    with patch("os.sched_getaffinity", return_value={0}):
+        assert server.available_cpus(str(tmp_path)) == 1
+
+@pytest.mark.unit
+def test_web_concurrency_overrides_detection():
+    with patch.dict(os.environ, {"WEB_CONCURRENCY": "3"}):
+        assert server.worker_count() == 3
+
+@pytest.mark.unit
+def test_workers_load_the_app_after_fork():
+    options = server.gunicorn_options(workers=2)
+    assert options["preload_app"] is False
+    assert options["worker_class"] == "src.server.Worker"
+    assert issubclass(server.Worker, UvicornWorker)
+    assert options["child_exit"] is server.child_exit
+
+@pytest.mark.unit
+def test_only_large_websocket_messages_are_deflated():
+    factory = server.SelectiveDeflateFactory(min_size=1024)
+    _, extension = factory.process_request_params([], [])
+    small = frames.Frame(frames.OP_TEXT, b"x" * 100)
+    large = frames.Frame(frames.OP_BINARY, b"x" * 4096)
+
+    assert extension.encode(small) == small
+    encoded = extension.encode(large)
+    assert encoded.rsv1 and len(encoded.data) < 100
+    # The client inflates what it got back to the original
+    client = PerMessageDeflate(False, False, 15, 15)
+    assert client.decode(encoded).data == large.data
+    assert extension.encode(frames.Frame(frames.OP_PING, b"")).rsv1 is False
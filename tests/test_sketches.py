@@ -0,0 +1,143 @@
+import random
+import pytest
+import numpy as np
+from unittest.mock import AsyncMock
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from src.main import app
+from src.observability.middleware import RequestLoggingMiddleware
+from src.observability.sketches import (
+    LatencyTracker, SlotRing, bucket_index, bucket_value, SKETCH_RELATIVE_ACCURACY, SKETCH_MAX_SECONDS
+)
+
+NOW = 1_700_000_005.0
+
+def published_rows(*trackers, now: float = NOW) -> list:
+    # Row shape read_sketches returns: SKETCH_COLUMNS without the track
+    return [row[1:] for tracker in trackers for row in tracker.snapshot(now)[0]]
+
+def worker(name: str) -> LatencyTracker:
+    tracker = LatencyTracker(track="stable")
+    tracker.worker = name
+    tracker.started_at = NOW - 100
+    return tracker
+
+@pytest.mark.unit
+def test_buckets_keep_the_relative_accuracy():
+    rng = random.Random(1)
+    for _ in range(1000):
+        seconds = 10 ** rng.uniform(-4, 2)
+        estimate = bucket_value(bucket_index(seconds))
+        assert abs(estimate - seconds) <= seconds * SKETCH_RELATIVE_ACCURACY * 1.0001
+    # Outliers are clamped instead of growing the sketch
+    assert bucket_value(bucket_index(3600)) == pytest.approx(SKETCH_MAX_SECONDS, rel=SKETCH_RELATIVE_ACCURACY)
+
+@pytest.mark.unit
+def test_slots_are_reused_as_the_ring_wraps():
+    ring = SlotRing(width=10, size=3)
+    ring.record(NOW, 5, error=True)
+    ring.record(NOW + 1, 5, error=False)
+    slot = int(NOW // 10) % 3
+    assert (ring.requests[slot], ring.errors[slot], ring.buckets[slot][5]) == (2, 1, 2)
+
+    ring.record(NOW + 30, 7, error=False)
+    assert (ring.requests[slot], ring.errors[slot], ring.buckets[slot][5], ring.buckets[slot][7]) == (1, 0, 0, 1)
+    # A request older than the whole ring does not wipe newer counts
+    ring.record(NOW, 5, error=False)
+    assert ring.requests[slot] == 1
+
+@pytest.mark.unit
+async def test_fleet_percentiles_merge_every_worker():
+    rng = random.Random(2)
+    latencies = []
+    workers = [worker("pod-a:1"), worker("pod-a:2"), worker("pod-b:1")]
+    for tracker in workers:
+        for _ in range(3000):
+            seconds = rng.lognormvariate(-4, 0.6)
+            latencies.append(seconds)
+            # Spread over the last 50 seconds, all inside the 1m window
+            tracker.route("GET", "/service/nearby").record(seconds, False, NOW - rng.random() * 50)
+        tracker.route("POST", "/service/submit").record(0.2, True, NOW)
+    repo = AsyncMock()
+    repo.read_sketches.return_value = published_rows(*workers)
+    tracker = LatencyTracker(repository=repo)
+
+    status = await tracker.track_status("stable", now=NOW)
+
+    assert (status["status"], status["replicas"], status["workers"]) == ("active", 2, 3)
+    window = status["windows"]["1m"]
+    assert window["requests"] == 9003
+    assert window["error_rate"] == pytest.approx(3 / 9003)
+    nearby = next(route for route in window["routes"] if route["route"] == "/service/nearby")
+    for name, fraction in (("p50", 50), ("p95", 95), ("p99", 99)):
+        exact = np.percentile(latencies, fraction)
+        assert nearby["latency"][name] == pytest.approx(exact, rel=SKETCH_RELATIVE_ACCURACY * 2)
+    # The current 10s slot is partial: 9003 requests over 55 covered seconds
+    assert window["throughput"] == pytest.approx(9003 / (NOW - (NOW // 10 - 5) * 10))
+    assert status["windows"]["1h"]["requests"] == 9003
+
+@pytest.mark.unit
+async def test_unknown_track_and_failed_publish():
+    repo = AsyncMock()
+    repo.read_sketches.return_value = []
+    tracker = worker("pod-a:1")
+    tracker.repository = repo
+    with pytest.raises(LookupError):
+        await tracker.track_status("canary", now=NOW)
+
+    tracker.route("GET", "/service").record(0.01, False, NOW)
+    repo.write_sketches.side_effect = [False, True, True]
+    assert await tracker.publish(NOW) == 0
+    # Kept for the next publish, one row per resolution
+    assert await tracker.publish(NOW) == 2
+    assert await tracker.publish(NOW) == 0
+    rows, retention = repo.write_sketches.await_args_list[1].args
+    assert {row[5] for row in rows} == {10, 60}
+    assert retention[0] == [10, 60]
+
+@pytest.mark.unit
+def test_middleware_records_every_request_including_failures(monkeypatch):
+    tracker = LatencyTracker()
+    monkeypatch.setattr("src.observability.middleware.latency_tracker", tracker)
+    inner = FastAPI()
+    inner.add_middleware(RequestLoggingMiddleware)
+
+    @inner.get("/items/{item_id}")
+    async def item(item_id: str):
+        return {"id": item_id}
+
+    @inner.get("/boom")
+    async def boom():
+        raise RuntimeError("boom")
+
+    client = TestClient(inner, raise_server_exceptions=False)
+    client.get("/items/1")
+    client.get("/items/2")
+    client.get("/boom")
+
+    fine = {key: sketch.rings[0] for key, sketch in tracker._routes.items()}
+    assert sum(fine[("GET", "/items/{item_id}")].requests) == 2
+    assert sum(fine[("GET", "/boom")].requests) == sum(fine[("GET", "/boom")].errors) == 1
+
+@pytest.mark.unit
+async def test_track_status_endpoint(monkeypatch):
+    from src.controllers import devops_controller
+    serving = worker("pod-a:1")
+    serving.route("GET", "/service").record(0.01, False, NOW)
+    repo = AsyncMock()
+    repo.read_sketches.return_value = published_rows(serving)
+    status = await LatencyTracker(repository=repo).track_status("stable", now=NOW)
+    tracker = AsyncMock()
+    tracker.track_status.side_effect = [status, LookupError("No requests on track canary in the last hour")]
+    monkeypatch.setattr(devops_controller, "latency_tracker", tracker)
+    client = TestClient(app)
+    headers = {"X-API-Key": "secure-api-key"}
+
+    response = client.get("/service/devops/track-stable", headers=headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["windows"]["5m"]["routes"][0]["route"] == "/service"
+    assert set(body["windows"]["1m"]["latency"]) == {"p50", "p95", "p99"}
+
+    assert client.get("/service/devops/track-canary", headers=headers).status_code == 404
+    assert tracker.track_status.await_args.args == ("canary",)
@@ -0,0 +1,113 @@
+import asyncio
+import threading
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from fastapi.testclient import TestClient
+from src.database import migrations
+from src.database.connection import DatabaseConnection
+from src.main import app, manager
+from src.controllers.location_controller import controller as location_controller
+from src.services.location_service import LocationService
+from src.services.startup import keep_trying
+from src.services.health import prober
+
+@pytest.fixture
+def db_env(monkeypatch):
+    for name, value in {"postgres-db": "test", "postgres-user": "test", "postgres-password": "test",
+                        "postgres-service": "localhost", "postgres-port": "5432"}.items():
+        monkeypatch.setenv(name, value)
+
+@pytest.mark.unit
+def test_database_connection_opens_the_pool_on_demand(db_env, mock_db_connection, monkeypatch):
+    monkeypatch.setattr("src.database.pool.DB_POOL_MIN", 3)
+    db = DatabaseConnection()
+    assert mock_db_connection.call_count == 0
+    assert db.pool_stats()["size"] == 0
+
+    db.open()
+    db.open()
+
+    assert mock_db_connection.call_count == 3
+    assert db.pool_stats()["idle"] == 3
+    db.return_connection(db.get_connection())
+    assert mock_db_connection.call_count == 3
+
+@pytest.mark.unit
+async def test_keep_trying_backs_off_until_the_dependency_is_up():
+    start = AsyncMock(side_effect=[ConnectionError("refused"), ConnectionError("refused"), "pool"])
+
+    assert await keep_trying("database pool", start, delay=0) == "pool"
+    assert start.await_count == 3
+
+@pytest.mark.unit
+async def test_service_start_retries_only_what_failed(monkeypatch):
+    monkeypatch.setattr("src.services.startup.STARTUP_RETRY_SECONDS", 0)
+    repo = AsyncMock()
+    repo.open.side_effect = [ConnectionError("refused"), None]
+    notifier = AsyncMock()
+    geocoder = MagicMock()
+    monkeypatch.setattr("src.services.location_service.create_geocoder", lambda: geocoder)
+    service = LocationService(repository=repo, status_cache=None, status_notifier=notifier)
+    service.job_worker = MagicMock()
+
+    await service.start()
+
+    assert repo.open.await_count == 2
+    notifier.start.assert_awaited_once()
+    service.job_worker.start.assert_called_once()
+    assert service.geocoder is geocoder
+
+@pytest.mark.unit
+def test_ready_only_after_warm_up(monkeypatch):
+    warm = threading.Event()
+
+    async def start():
+        await asyncio.to_thread(warm.wait, 5)
+
+    monkeypatch.setattr(location_controller.service, "start", start)
+    monkeypatch.setattr(location_controller.service, "close", AsyncMock())
+    monkeypatch.setattr(manager, "start", AsyncMock())
+    monkeypatch.setattr(manager, "close", AsyncMock())
+    # Readiness also needs the health prober to reach the database
+    healthy = MagicMock(ping=AsyncMock(return_value=True))
+    healthy.pool_stats.return_value = {"size": 1, "max_size": 10, "in_use": 0, "idle": 1, "waiters": 0}
+    monkeypatch.setattr(prober, "repository", healthy)
+
+    with TestClient(app) as client:
+        response = client.get("/service/ready")
+        assert response.status_code == 503
+        assert response.json() == {"status": "starting"}
+        # Everything else is served while warming up
+        assert client.get("/service").status_code == 200
+
+        warm.set()
+        for _ in range(100):
+            response = client.get("/service/ready")
+            if response.status_code == 200:
+                break
+            threading.Event().wait(0.01)
+        assert response.json() == {"status": "ready"}
+
+@pytest.mark.unit
+def test_migration_step_exits_nonzero_on_failure(monkeypatch):
+    monkeypatch.setattr(migrations, "run_migrations", MagicMock(return_value=[5, 6]))
+    assert migrations.main() == 0
+
+    monkeypatch.setattr(migrations, "run_migrations", MagicMock(side_effect=ConnectionError("refused")))
+    assert migrations.main() == 1
+
+@pytest.mark.unit
+def test_migrations_stop_at_the_configured_target(monkeypatch):
+    run = MagicMock(return_value=[9])
+    monkeypatch.setattr(migrations, "run_migrations", run)
+    monkeypatch.setattr(migrations, "DB_MIGRATION_TARGET", 9)
+    assert migrations.main() == 0
+    run.assert_called_once_with(9)
+    assert migrations.main(["--target", "10"]) == 0
+    run.assert_called_with(10)
+
+    monkeypatch.setattr("src.database.connection.DB_MIGRATION_TARGET", 9)
+    migrate = MagicMock()
+    monkeypatch.setattr("src.database.connection.migrate", migrate)
+    DatabaseConnection()._migrate(MagicMock())
+    assert migrate.call_args.kwargs == {"target": 9}
@@ -0,0 +1,71 @@
+import pytest
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock
+from src.models.location_model import LocationResponse
+from src.repositories.async_location_repository import ThreadedLocationRepository
+from src.services.location_service import LocationService
+from src.services.status_cache import StatusCache, CACHE_EVICTIONS
+
+ROW = ("test-id", "Istanbul (41.0082, 28.9784)", "received", datetime(2023, 1, 1), datetime(2023, 1, 1), 0.1)
+
+def make_response(request_id: str) -> LocationResponse:
+    return LocationResponse(
+        request_id=request_id,
+        location="Istanbul (41.0082, 28.9784)",
+        status="received",
+        created_at=datetime(2023, 1, 1),
+        updated_at=datetime(2023, 1, 1),
+        response_time=0.1
+    )
+
+@pytest.mark.unit
+async def test_lru_eviction_drops_least_recently_used():
+    cache = StatusCache(max_size=2, ttl=60)
+    evictions = CACHE_EVICTIONS.labels(backend="memory", reason="size")
+    before = evictions._value.get()
+
+    await cache.set("a", make_response("a"))
+    await cache.set("b", make_response("b"))
+    assert await cache.get("a") is not None
+    await cache.set("c", make_response("c"))
+
+    assert await cache.get("b") is None
+    assert await cache.get("a") is not None
+    assert len(cache) == 2
+    assert evictions._value.get() == before + 1
+
+@pytest.mark.unit
+async def test_entries_expire_after_ttl():
+    cache = StatusCache(max_size=10, ttl=0)
+    await cache.set("a", make_response("a"))
+    assert await cache.get("a") is None
+
+@pytest.mark.unit
+async def test_invalidation_during_load_prevents_stale_fill():
+    cache = StatusCache(max_size=10, ttl=60)
+    token = cache.fill_token()
+    await cache.invalidate("a")
+    await cache.set("a", make_response("a"), token)
+    assert await cache.get("a") is None
+
+    await cache.set("a", make_response("a"), cache.fill_token())
+    assert await cache.get("a") is not None
+
+@pytest.mark.unit
+async def test_service_reads_through_cache_and_writes_invalidate():
+    sync_repo = MagicMock()
+    sync_repo.get_location.return_value = ROW
+    sync_repo.update_response_time.return_value = True
+    cache = StatusCache(max_size=10, ttl=60)
+    service = LocationService(
+        repository=ThreadedLocationRepository(sync_repo, cache=cache),
+        status_cache=cache
+    )
+
+    await service.get_request_status("test-id")
+    await service.get_request_status("test-id")
+    assert sync_repo.get_location.call_count == 1
+
+    await service.repository.update_response_time("test-id", 0.2)
+    await service.get_request_status("test-id")
+    assert sync_repo.get_location.call_count == 2
@@ -0,0 +1,139 @@
+import asyncio
+import pytest
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock
+from src.repositories.async_location_repository import ThreadedLocationRepository
+from src.services.backplane import InMemoryBackplane
+from src.services.location_service import LocationService, status_etag
+from src.services.status_cache import StatusCache
+from src.services.status_notifier import StatusNotifier
+
+def row(status: str, updated: int = 0):
+    return ("test-id", "Istanbul (41.0082, 28.9784)", status,
+            datetime(2023, 1, 1), datetime(2023, 1, 1, 0, 0, updated), 0.1)
+
+def make_service(statuses, notifier=None):
+    """Service whose repository returns ``statuses`` in turn, one per read.
+
+    Repeated statuses are the same row, read again.
+    """
+    repo = AsyncMock()
+    repo.get_location.side_effect = [row(status, statuses.index(status)) for status in statuses]
+    notifier = notifier or StatusNotifier()
+    # Nothing invalidates the mock repository's reads, so they are never cached
+    service = LocationService(repository=repo, status_cache=StatusCache(ttl=0), status_notifier=notifier)
+    return service, repo, notifier
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+@pytest.mark.unit
+async def test_long_poll_reads_once_per_change():
+    service, repo, notifier = make_service(["received", "processing"])
+
+    waiting = asyncio.create_task(service.wait_for_status("test-id", timeout=5))
+    await settle()
+    assert notifier.watcher_count == 1
+    assert not waiting.done()
+
+    await notifier.publish("test-id")
+    response = await waiting
+
+    assert response.status == "processing"
+    assert repo.get_location.await_count == 2
+    assert notifier.watcher_count == 0
+
+@pytest.mark.unit
+async def test_long_poll_times_out_with_the_unchanged_status():
+    service, repo, _ = make_service(["received"])
+
+    response = await service.wait_for_status("test-id", timeout=0.05)
+
+    assert response.status == "received"
+    repo.get_location.assert_awaited_once()
+
+@pytest.mark.unit
+async def test_long_poll_returns_at_once_when_etag_is_stale_or_final():
+    service, _, _ = make_service(["processing", "completed"])
+    stale = status_etag((await service.get_request_status("test-id")).model_copy(update={"status": "received"}))
+
+    assert (await service.wait_for_status("test-id", timeout=5, etag=stale)).status == "completed"
+
+@pytest.mark.unit
+async def test_change_during_the_first_read_is_not_lost():
+    service, repo, notifier = make_service(["received", "completed"])
+    first_read = repo.get_location.side_effect
+
+    async def read_then_change(request_id):
+        result = next(first_read)
+        # Written by the worker after our read, before we start waiting
+        if result[2] == "received":
+            await notifier.publish(request_id)
+        return result
+
+    repo.get_location.side_effect = read_then_change
+
+    response = await service.wait_for_status("test-id", timeout=5)
+
+    assert response.status == "completed"
+
+@pytest.mark.unit
+async def test_status_stream_yields_changes_and_heartbeats_until_final():
+    service, repo, notifier = make_service([])
+    current = {"row": row("received")}
+    repo.get_location.side_effect = lambda request_id: current["row"]
+    updates = []
+
+    async def consume():
+        async for update in service.status_updates("test-id", heartbeat=0.01):
+            updates.append(update and update.status)
+
+    stream = asyncio.create_task(consume())
+    await asyncio.sleep(0.05)
+    # A wake that is not a change is not repeated to the client
+    await notifier.publish("test-id")
+    await settle()
+    current["row"] = row("completed", 1)
+    await notifier.publish("test-id")
+    await asyncio.wait_for(stream, timeout=1)
+
+    assert updates[0] == "received"
+    assert None in updates
+    assert [update for update in updates if update] == ["received", "completed"]
+    assert notifier.watcher_count == 0
+
+@pytest.mark.unit
+async def test_changes_on_another_replica_wake_watchers_and_drop_cached_status():
+    channel = "status-test-replicas"
+    local_cache = StatusCache()
+    writer = StatusNotifier(backplane=InMemoryBackplane(channel=channel))
+    reader = StatusNotifier(backplane=InMemoryBackplane(channel=channel), local_cache=local_cache)
+    await writer.start()
+    await reader.start()
+    service, _, _ = make_service(["received", "processing"], notifier=reader)
+    service.status_cache = local_cache
+
+    waiting = asyncio.create_task(service.wait_for_status("test-id", timeout=5))
+    await settle()
+    assert await local_cache.get("test-id") is not None
+
+    await writer.publish("test-id")
+    response = await asyncio.wait_for(waiting, timeout=1)
+
+    assert response.status == "processing"
+    await writer.close()
+    await reader.close()
+
+@pytest.mark.unit
+async def test_repository_writes_publish_status_changes():
+    notifier = AsyncMock()
+    sync_repo = MagicMock()
+    sync_repo.claim_jobs.return_value = [("a", "Istanbul", 41.0, 29.0, 1, 0.1)]
+    sync_repo.finish_jobs.return_value = ["a"]
+    repo = ThreadedLocationRepository(sync_repo, notifier=notifier)
+
+    await repo.claim_jobs(10, 30)
+    await repo.finish_jobs([("a", 1, "completed", 0.0, None)])
+
+    assert [call.args for call in notifier.publish.await_args_list] == [("a",), ("a",)]
@@ -0,0 +1,145 @@
+import asyncio
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from starlette.concurrency import run_in_threadpool
+from src.observability import telemetry as telemetry_module
+from src.observability.middleware import RequestLoggingMiddleware
+from src.observability.telemetry import TelemetryCollector, TELEMETRY_SAMPLES, add_db_time
+from src.repositories.location_repository import (
+    METRIC_COLUMNS, metric_percentiles_query, metric_percentiles_params
+)
+
+def finished_row(collector: TelemetryCollector, route: str = "/service/submit", status: int = 200):
+    sample = collector.begin("POST")
+    collector.finish(sample, route, status)
+
+@pytest.mark.unit
+def test_only_the_configured_share_of_requests_is_sampled():
+    draws = iter([0.05, 0.5, 0.09, 0.95])
+    collector = TelemetryCollector(sample_rate=0.1, rng=lambda: next(draws))
+
+    sampled = [collector.begin("GET") for _ in range(4)]
+    for sample in reversed(sampled):
+        if sample is not None:
+            collector.finish(sample, "/service", 200)
+
+    assert [sample is not None for sample in sampled] == [True, False, True, False]
+    assert TelemetryCollector(sample_rate=0).begin("GET") is None
+
+@pytest.mark.unit
+async def test_db_time_reaches_the_sample_from_the_threadpool():
+    collector = TelemetryCollector(sample_rate=1)
+    sample = collector.begin("GET", [(b"x-request-id", b"abc")])
+
+    await run_in_threadpool(add_db_time, 0.25)
+    add_db_time(0.5)
+    collector.finish(sample, "/service/request-{request_id}", 200)
+    add_db_time(1.0)
+
+    row = dict(zip(METRIC_COLUMNS, collector._buffer[0]))
+    assert row["request_id"] == "abc"
+    assert row["db_time"] == pytest.approx(0.75)
+    assert row["process_time"] >= 0
+    assert row["error_count"] == 0
+
+@pytest.mark.unit
+def test_ring_buffer_overwrites_the_oldest_samples():
+    collector = TelemetryCollector(sample_rate=1, buffer_size=3)
+    overwritten = TELEMETRY_SAMPLES.labels(outcome="overwritten")
+    before = overwritten._value.get()
+
+    for status in range(200, 205):
+        finished_row(collector, status=status)
+
+    assert [row[3] for row in collector._buffer] == [202, 203, 204]
+    assert overwritten._value.get() == before + 2
+
+@pytest.mark.unit
+async def test_flush_writes_in_batches_and_drops_a_failed_batch():
+    repo = AsyncMock()
+    repo.write_metrics.side_effect = [True, False]
+    collector = TelemetryCollector(repository=repo, sample_rate=1, batch_size=2)
+    for _ in range(5):
+        finished_row(collector)
+
+    assert await collector.flush() == 2
+    assert [len(call.args[0]) for call in repo.write_metrics.await_args_list] == [2, 2]
+    assert len(collector) == 1
+
+@pytest.mark.unit
+async def test_background_flush_runs_off_the_request_path():
+    repo = AsyncMock()
+    repo.write_metrics.return_value = True
+    collector = TelemetryCollector(repository=repo, sample_rate=1, flush_interval=0.01)
+    await collector.start()
+    finished_row(collector)
+
+    for _ in range(50):
+        if repo.write_metrics.await_count:
+            break
+        await asyncio.sleep(0.01)
+    await collector.close()
+
+    repo.write_metrics.assert_awaited_once()
+    assert len(collector) == 0
+
+@pytest.mark.unit
+def test_middleware_samples_route_templates_including_streaming_responses(monkeypatch):
+    collector = TelemetryCollector(sample_rate=1)
+    monkeypatch.setattr("src.observability.middleware.telemetry", collector)
+    app = FastAPI()
+    app.add_middleware(RequestLoggingMiddleware)
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: str):
+        add_db_time(0.1)
+        return {"id": item_id}
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            # Starlette sends streaming bodies from a child task
+            add_db_time(0.2)
+            yield "a"
+        return StreamingResponse(chunks())
+
+    @app.get("/boom")
+    async def boom():
+        raise RuntimeError("boom")
+
+    client = TestClient(app, raise_server_exceptions=False)
+    client.get("/items/1")
+    client.get("/stream")
+    client.get("/boom")
+
+    rows = [dict(zip(METRIC_COLUMNS, row)) for row in collector._buffer]
+    assert [(row["route"], row["status"], row["error_count"]) for row in rows] == [
+        ("/items/{item_id}", 200, 0), ("/stream", 200, 0), ("/boom", 500, 1)
+    ]
+    assert [row["db_time"] for row in rows[:2]] == [pytest.approx(0.1), pytest.approx(0.2)]
+
+@pytest.mark.unit
+async def test_percentiles_query_and_report():
+    until = datetime(2024, 1, 1, 12)
+    params = metric_percentiles_params(until - timedelta(hours=1), until, (0.5, 0.99), route="/service/submit")
+    query = metric_percentiles_query(lambda name: f"%({name})s", params)
+    assert "route = %(route)s" in query and "method =" not in query
+    assert "percentile_cont(%(fractions)s::float8[]) WITHIN GROUP (ORDER BY process_time)" in query
+
+    repo = AsyncMock()
+    repo.metric_percentiles.return_value = [
+        ("POST", "/service/submit", 40, 1, [0.01, 0.02, 0.03, 0.09], [0.005, 0.006, 0.007, 0.02], 1024.0, None)
+    ]
+    collector = TelemetryCollector(repository=repo, sample_rate=0.1)
+
+    report = await collector.percentiles(until=until)
+
+    assert repo.metric_percentiles.await_args.args[0]["since"] == until - telemetry_module.TELEMETRY_DEFAULT_WINDOW
+    route = report["routes"][0]
+    assert route["samples"] == 40 and route["errors"] == 1
+    assert route["process_time"] == {"p50": 0.01, "p90": 0.02, "p95": 0.03, "p99": 0.09}
+    assert report["sample_rate"] == 0.1
@@ -0,0 +1,92 @@
+import asyncio
+import json
+import msgpack
+import pytest
+from fastapi.testclient import TestClient
+from starlette.datastructures import QueryParams
+from starlette.websockets import WebSocketDisconnect
+from src.main import app
+from src.services.connection_manager import ConnectionManager
+from src.services.ws_protocol import negotiate, MSGPACK_SUBPROTOCOL, TEXT, WS_BATCH_DELAY_MS
+from tests.test_connection_manager import FakeWebSocket, settle
+
+EVENT = {"request_id": "r1", "city": "Istanbul", "latitude": 41.0082, "longitude": 28.9784}
+
+def unpack_frame(frame: bytes) -> list:
+    unpacker = msgpack.Unpacker()
+    unpacker.feed(frame)
+    return list(unpacker)
+
+@pytest.mark.unit
+def test_negotiation():
+    assert negotiate({}, QueryParams("")) == TEXT
+    assert negotiate({"subprotocols": ["chat"]}, QueryParams("protocol=text")) == TEXT
+    by_subprotocol = negotiate({"subprotocols": ["chat", MSGPACK_SUBPROTOCOL]}, QueryParams(""))
+    assert by_subprotocol.binary and by_subprotocol.subprotocol == MSGPACK_SUBPROTOCOL
+    assert by_subprotocol.batch_delay == WS_BATCH_DELAY_MS / 1000
+    by_query = negotiate({}, QueryParams("protocol=msgpack&max_delay_ms=0"))
+    assert by_query.binary and by_query.subprotocol is None and by_query.batch_delay == 0
+    for query in ("protocol=cbor", "protocol=msgpack&max_delay_ms=5000", "protocol=msgpack&max_delay_ms=soon"):
+        with pytest.raises(ValueError):
+            negotiate({}, QueryParams(query))
+
+@pytest.mark.unit
+async def test_msgpack_clients_get_coalesced_frames():
+    manager = ConnectionManager()
+    text, first, second = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+    await manager.connect(text)
+    await manager.connect(first, negotiate({"subprotocols": [MSGPACK_SUBPROTOCOL]}, QueryParams("")))
+    await manager.connect(second, negotiate({}, QueryParams("protocol=msgpack&max_delay_ms=20")))
+    assert first.subprotocol == MSGPACK_SUBPROTOCOL and second.subprotocol is None
+
+    for i in range(5):
+        await manager.broadcast(f"m{i}")
+    await settle()
+    # Text clients still get one frame per message, right away
+    assert text.sent == [f"m{i}" for i in range(5)]
+    assert second.sent == []
+    await asyncio.sleep(0.05)
+
+    for client in (first, second):
+        assert len(client.sent) == 1
+        assert unpack_frame(client.sent[0]) == [f"m{i}" for i in range(5)]
+    await manager.close()
+
+@pytest.mark.unit
+async def test_replies_and_location_events_are_encoded_per_client():
+    manager = ConnectionManager()
+    text, binary = FakeWebSocket(), FakeWebSocket()
+    await manager.connect(text)
+    await manager.connect(binary, negotiate({}, QueryParams("protocol=msgpack&max_delay_ms=0")))
+    fence = {"type": "circle", "lat": 41.0, "lon": 29.0, "radius": 5000}
+    for websocket in (text, binary):
+        await manager.handle_command(websocket, {"action": "subscribe", "fence": fence})
+    await settle()
+
+    await manager.publish_location(EVENT)
+    await settle()
+
+    subscribed, location = [json.loads(message) for message in text.sent]
+    assert [message for frame in binary.sent for message in unpack_frame(frame)] == [
+        dict(subscribed, fence_id=subscribed["fence_id"] + 1),
+        dict(location, fence_ids=[subscribed["fence_id"] + 1])
+    ]
+    await manager.close()
+
+@pytest.mark.unit
+def test_stream_endpoint_speaks_msgpack():
+    client = TestClient(app)
+    with client.websocket_connect("/service/stream", subprotocols=[MSGPACK_SUBPROTOCOL]) as websocket:
+        assert websocket.accepted_subprotocol == MSGPACK_SUBPROTOCOL
+        websocket.send_bytes(msgpack.packb({"action": "subscribe",
+                                            "fence": {"type": "circle", "lat": 0, "lon": 0, "radius": 10}}))
+        assert unpack_frame(websocket.receive_bytes())[0]["event"] == "subscribed"
+        websocket.send_bytes(b"\xc1")
+        assert unpack_frame(websocket.receive_bytes())[0]["event"] == "error"
+        websocket.send_bytes(msgpack.packb("hello"))
+        assert unpack_frame(websocket.receive_bytes()) == ["Received data: hello"]
+
+    with pytest.raises(WebSocketDisconnect) as rejected:
+        with client.websocket_connect("/service/stream?protocol=cbor"):
+            pass
+    assert rejected.value.code == 1008